@@ -2,16 +2,23 @@
 
 import os
 import sys
-from qgis.core import *
-from qgis.gui import *
-from qgis.utils import *
-from qgis.PyQt.QtCore import QMetaType, QVariant
+
+# with QGIS_HEADLESS=1, forms are compiled by the pure-Python form model,
+# which writes the project file directly (without a QGIS install)
+if os.environ.get("QGIS_HEADLESS", "0") not in ("", "0"):
+    from HeadlessForms import *
+else:
+    from qgis.core import *
+    from qgis.gui import *
+    from qgis.utils import *
+    from qgis.PyQt.QtCore import QMetaType, QVariant
 
 import pathlib as pl
-import atexit
+from itertools import accumulate
 
 # custom
 import QGISDecisionTrees as QGT
+from QgisSessions import QgisSession, QgisProject
 
 
 # TODO visibility by Question ( i.e. hide Question container if different outcome within same tab )
@@ -95,55 +102,7 @@ def AddInfoText(parent, text, label = ""):
     text_element.setText(text)
     parent.addChildElement(text_element)
 
-def GetTab(clidx):
-    return clidx.split(">>")[0]
-
-
-class QgisProject(object):
-
-    def __init__(self, filename):
-        self.filename = filename # "test.qgs"
-        self.InitQgisApplication()
-        self.CreateQgisProject()
-        self.Save()
-
-        atexit.register(self.Exit)
-
-    def InitQgisApplication(self):
-        # https://docs.qgis.org/3.40/en/docs/pyqgis_developer_cookbook/intro.html#using-pyqgis-in-standalone-scripts
-
-        # Supply path to qgis install location
-        # QgsApplication.prefixPath()
-        QgsApplication.setPrefixPath("/usr/bin/qgis", True)
-
-
-        # Create a reference to the QgsApplication.  Setting the
-        # second argument to False disables the GUI.
-        self.app = QgsApplication([], False)
-
-
-        # Load providers
-        self.app.initQgis()
-
-
-    def CreateQgisProject(self):
-        ### Project
-        self.project = QgsProject.instance()
-        self.path: pl._local.PosixPath = pl.Path(self.project.readPath("./"))
-        # print(project.fileName())
-
-        project_crs = QgsCoordinateReferenceSystem.fromEpsgId(31370)
-        self.project.setCrs(project_crs)
-
-
-    def Save(self):
-        # Read input parameters from GP dialog
-        self.save_filename = self.path/self.filename
-        check = self.project.write(str(self.save_filename))
-
-    def Exit(self):
-        self.app.exitQgis()
-
+GetTab = QGT.GetTab
 
 
 def AddDataLayers(project):
@@ -195,6 +154,7 @@ class QgisFormDecisionTree(QGT.DecisionTree):
                  project: QgisProject, \
                  name: str = "", \
                  provider: str = None, \
+                 compact_expressions: bool = False, \
                  verbose: bool = False
                  ):
 
@@ -216,6 +176,11 @@ class QgisFormDecisionTree(QGT.DecisionTree):
 
         self.verbose = verbose
 
+        # shorten the visibility expressions (see SetDynamicVisibilities)
+        # (off by default: this relies on the client recomputing
+        #  hidden virtual fields while a feature is edited)
+        self.compact_expressions = compact_expressions
+
         # (II) create answer fields
         self.AssembleAllFields()
 
@@ -244,14 +209,20 @@ class QgisFormDecisionTree(QGT.DecisionTree):
         ot = other_tree
 
         # bring in all the data variables
+        # (copies of what a Reload alters, so that the other tree stays as it is)
         self.meta = ot.meta
-        self.clades = ot.clades
-        self.steps = ot.steps
-        self.root = ot.root
+        self.clades = dict(ot.clades)
+        self.clade_index = ot.clade_index.Copy()
+        self.adjusted = dict(ot.adjusted)
+        self.fingerprints = dict(ot.fingerprints)
+        self.source = ot.source
+        self.steps = list(ot.steps)
 
         # copy nodes
+        # (the copies belong to this tree: they traverse and compile it)
         for idx, node in ot.items():
-            self[idx] = node
+            self[idx] = node.Copy(self)
+        self.root = self[ot.root.idx]
 
 
     def AssembleAllFields(self):
@@ -262,24 +233,26 @@ class QgisFormDecisionTree(QGT.DecisionTree):
         # all_fields = self.ApplyToNodes(AssembleField)
 
         # find all the tabs
-        self.tabs = list(sorted(set([GetTab(k) for k in self.clades.keys()])))
+        self.tabs = list(sorted(self.clade_index.tabs))
 
         if self.verbose:
             print("### Assembling fields for all questions and containers.")
 
-        self.data_provider.addAttributes(
+        # convenience function, see below
+        self.field_index_lookup = lambda field_label: \
+            self.layer.fields().indexFromName(field_label)
+
+        # (on reloading, only fields which do not exist yet are added)
+        self.data_provider.addAttributes([field for field in \
             [QgsField(f"classification", QMetaType.Type.QString)] \
             + [QgsField(f"showall_tab{tab}", QMetaType.Type.Bool) \
                for tab in self.tabs] \
             + [QgsField(f"Answer_{step}", QMetaType.Type.QString) \
                for step in self.steps] \
-            )
+            if self.field_index_lookup(field.name()) < 0 \
+            ])
         self.layer.updateFields()  # feed changes on the vector layer to the datasource
 
-        # convenience function, see below
-        self.field_index_lookup = lambda field_label: \
-            self.layer.fields().indexFromName(field_label)
-
         if self.verbose:
             print("\t...done.")
 
@@ -317,21 +290,7 @@ class QgisFormDecisionTree(QGT.DecisionTree):
             # self.containers[tab].setVerticalStretch(100)
 
             ## add a "show all" checkbox
-            showall_label = f"showall_tab{tab}"
-            showall_field_idx = self.field_index_lookup(showall_label)
-            parent = self.containers[tab]
-            self.layer.setEditorWidgetSetup( \
-                showall_field_idx, \
-                QgsEditorWidgetSetup( \
-                    'CheckBox', \
-                    {'AllowNullState': False, 'TextDisplayMethod': 0} \
-                ))
-            parent.addChildElement(QgsAttributeEditorField( \
-                name = showall_label, \
-                idx = showall_field_idx, \
-                parent = parent \
-            ))
-            self.form_config.setLabelOnTop(showall_field_idx, False)
+            self.ShowAllCheckbox(tab)
 
 
         for extra_tab in ["besluit"]:
@@ -346,18 +305,41 @@ class QgisFormDecisionTree(QGT.DecisionTree):
             print("\t...done.")
 
 
+    def ShowAllCheckbox(self, tab):
+        # a "show all" checkbox on top of a tab
+        showall_label = f"showall_tab{tab}"
+        showall_field_idx = self.field_index_lookup(showall_label)
+        parent = self.containers[tab]
+        self.layer.setEditorWidgetSetup( \
+            showall_field_idx, \
+            QgsEditorWidgetSetup( \
+                'CheckBox', \
+                {'AllowNullState': False, 'TextDisplayMethod': 0} \
+            ))
+        parent.addChildElement(QgsAttributeEditorField( \
+            name = showall_label, \
+            idx = showall_field_idx, \
+            parent = parent \
+        ))
+        self.form_config.setLabelOnTop(showall_field_idx, False)
+
+
 
-    def FormNodeForms(self):
+    def FormNodeForms(self, steps: list = None):
         # For each question, assemble a form in a container
         # and append it to the clade container
+        # (optionally only for some `steps`, e.g. those of a redeployed tab)
 
         if self.verbose:
             print("### Form blocks per question:")
 
         # store refs to the question elements
-        self.question_blocks = {}
+        if steps is None:
+            self.question_blocks = {}
+            steps = self.steps
 
-        for idx, node in self.GetAllNodes().items():
+        for idx in steps:
+            node = self[idx]
             # prepare question
 
             field_idx = self.field_index_lookup(f"Answer_{idx}")
@@ -383,15 +365,32 @@ class QgisFormDecisionTree(QGT.DecisionTree):
             print("\t...done.")
 
 
-    def SetDynamicVisibilities(self):
+    def SetDynamicVisibilities(self, tabs: list = None):
         # (1) hide CLADES/QUESTIONS if they were not reached yet
         # (2) hide if question in the same tab led to a different path
         # (3) add checkboxes to SHOW ALL clades in tab
         # (4) show decision if one was made
-
-        # store the expressions we gather on the way
+        # Optionally, question visibility is only set in some `tabs`
+        # (e.g. after a reload; see ApplyChanges);
+        # tab and classification visibility are set where they changed.
+        # With `compact_expressions`, equality chains become `IN (...)`,
+        # and the "IS NULL" chains of each tab, and whether a tab reached
+        # a classification, are computed once per edit, in hidden (virtual) fields,
+        # which the question containers and the classification tab refer to.
+
+        # terminal flags, labels and tabs are precompiled
+        compiled = self.Compile()
+        compact = self.compact_expressions
+
+        # the expressions set so far, by container
+        if tabs is None:
+            self.visibilities = {}
+        steps = self.steps if tabs is None \
+                else [idx for tab in tabs for idx in self.GetTabMembers(tab).keys()]
+
+        # store the (field, value) conditions we gather on the way
         tab_expressions = {tab: [] for tab in self.tabs}
-        question_expressions = {idx: [] for idx in self.GetAllNodes().keys()}
+        question_expressions = {}
 
         possible_solutions = {}
 
@@ -400,90 +399,139 @@ class QgisFormDecisionTree(QGT.DecisionTree):
         # which answers lead to which tab?
         for idx, node in self.GetAllNodes().items():
             # this_tab = GetTab(node.clade)
-            for answer_idx, answer in node["A"].items():
+            for answer_idx, aid in zip(node["A"].keys(), compiled.AnswerIds(idx)):
 
-                next_key = answer["next_step"]
-                if next_key not in self.keys():
-                    solution_candidate = QGT.get_classification(answer)
+                target = compiled.answer_target[aid]
+                if target < 0:
+                    solution_candidate = compiled.Label(aid)
                     if possible_solutions.get(solution_candidate, None) is None:
                         possible_solutions[solution_candidate] = []
 
                     # store possible determination solutions
                     possible_solutions[solution_candidate] \
-                        .append(f"(\"Answer_{idx}\" = {answer_idx})")
+                        .append((f"Answer_{idx}", answer_idx))
                     continue
 
                 # found a link to next tab
-                target_tab = GetTab(self[next_key].clade)
-                if GetTab(node.clade) >= target_tab:
+                target_tab = compiled.Tab(target)
+                if compiled.Tab(compiled.step_lookup[idx]) >= target_tab:
                     # only influence across different tabs
                     continue
 
-                tab_expressions[target_tab].append(f"(\"Answer_{idx}\" = {answer_idx})")
+                tab_expressions[target_tab].append((f"Answer_{idx}", answer_idx))
 
 
         # set visibility to be dynamically controlled
         for tab, express in tab_expressions.items():
+            expression_string = QGT.AnyEquals(express, compact)
+            if self.visibilities.get(f"tab{tab}", "") == expression_string:
+                continue
+            self.visibilities[f"tab{tab}"] = expression_string
+
             if len(express) == 0:
+                # (no longer) linked from other tabs
+                self.containers[tab].setVisibilityExpression(QgsOptionalExpression())
                 continue
 
-            visexp = QgsExpression(" OR ".join(tab_expressions[tab]))
-            self.containers[tab].setVisibilityExpression(QgsOptionalExpression(visexp))
+            self.containers[tab].setVisibilityExpression(self.Visibility(expression_string))
 
 
         ## (2) hide if question in the same tab led to an answer
         # prohibit a different question
         # i.e. a different question in the same tab leads to another tub
+        # The other questions of a tab are those of exactly the tab clade (no subclades).
+        # Who leads where is looked up in the predecessor index;
+        # the "IS NULL" chain is joined once per tab,
+        # and each question gets it without its own condition.
+        # (Compact: the questions refer to a hidden count
+        #  of the answered questions of their tab instead.)
+        predecessors = self.Predecessors()
+        tab_positions = {}
+        successor_indices = {}
+        null_users = {}
+        for idx in steps:
+            nid = compiled.step_lookup[idx]
+            this_tab = compiled.Tab(nid)
+            if this_tab not in tab_positions:
+                tab_positions[this_tab] = {idx2: nr for nr, idx2 \
+                                           in enumerate(self.clade_index.Members(this_tab))}
+            positions = tab_positions[this_tab]
+
+            # hide question if it is the successor of ANY other one
+            successor_indices[idx] = sorted((positions[compiled.steps[nid2]], compiled.steps[nid2], successor) \
+                                            for nid2, successor in predecessors[nid].items() \
+                                            if (nid2 != nid) and (compiled.steps[nid2] in positions))
+            if len(successor_indices[idx]) == 0:
+                null_users.setdefault(this_tab, []).append(idx)
+
+        tab_nulls = {}
+        for this_tab, positions in tab_positions.items():
+            if compact and (this_tab in null_users):
+                tab_nulls[this_tab] = self.AnsweredCountField(this_tab)
+                continue
 
-        # print([k for k in self.keys()])
-        for idx, node in self.GetAllNodes().items():
-            this_tab = GetTab(node.clade)
-            successor_indices = [] # qn in same tab which list idx as a successor
-            null_indices = [] # independent questions leading to different path
-            for idx2, node2 in self.GetCladeMembers(this_tab).items():
-                if idx2 == idx:
-                    continue # skip self
-
-
-                # hide question if it is the successor of ANY other one
-                new_successor = None
-                for answer_idx2, answer2 in node2["A"].items():
-                    next_key = answer2["next_step"]
-
-                    if (next_key == idx):
-                        new_successor = answer_idx2
+            terms = [f"(\"Answer_{idx2}\" IS NULL)" for idx2 in positions.keys()]
+            chain = " AND ".join(terms)
+            tab_nulls[this_tab] = (chain, list(accumulate([0, *[len(term) + 5 for term in terms]])))
 
-                # per default, other questions must be null
-                if new_successor is not None:
-                    successor_indices.append((idx2, new_successor))
-                else:
-                    null_indices.append(idx2)
+        for idx in steps:
+            this_tab = compiled.Tab(compiled.step_lookup[idx])
+            positions, nulls = tab_positions[this_tab], tab_nulls[this_tab]
 
             # after all others in the tab were checked
             # (A) no successors? -> display only if other qns are NULL
-            if len(successor_indices) == 0:
-                question_expressions[idx] \
-                    .append(" AND ".join([f"(\"Answer_{idx2}\" IS NULL)" \
-                                          for idx2 in null_indices]))
+            if len(successor_indices[idx]) == 0:
+                if isinstance(nulls, str):
+                    question_expressions[idx] = QGT.NoOtherAnswered(nulls, \
+                                                    f"Answer_{idx}" if idx in positions else None)
+                elif idx not in positions:
+                    question_expressions[idx] = nulls[0]
+                else:
+                    # cut out the own condition (and one " AND ")
+                    nr, (chain, offsets) = positions[idx], nulls
+                    if nr < len(positions) - 1:
+                        question_expressions[idx] = chain[:offsets[nr]] + chain[offsets[nr+1]:]
+                    else:
+                        question_expressions[idx] = chain[:max(offsets[nr] - 5, 0)]
+                # (no other questions in the tab: always shown)
+                question_expressions[idx] = question_expressions[idx] or "TRUE"
             else:
             # (B) yes this is a successor? -> display only when selected
-                question_expressions[idx] \
-                    .append(" OR ".join([f"(\"Answer_{idx2}\" = {successor})" \
-                                          for idx2, successor in successor_indices]))
+                question_expressions[idx] = QGT.AnyEquals([(f"Answer_{idx2}", successor) \
+                                                           for _, idx2, successor in successor_indices[idx]], \
+                                                          compact)
 
         ## hide excluded questions
-        for idx, node in self.GetAllNodes().items():
-            tab = GetTab(node.clade)
+        for idx in steps:
+            tab = compiled.Tab(compiled.step_lookup[idx])
 
-            expression_string = " AND ".join(question_expressions[idx])
-            expression_string = f"(showall_tab{tab} = TRUE) OR ({expression_string})"
-            visexp = QgsExpression( expression_string )
-            self.question_blocks[idx].container.setVisibilityExpression(QgsOptionalExpression(visexp))
+            expression_string = f"(showall_tab{tab} = TRUE) OR ({question_expressions[idx]})"
+            self.question_blocks[idx].container.setVisibilityExpression(self.Visibility(expression_string))
             # YOLO.
 
 
         ## show classification if reached
         print(possible_solutions)
+        if self.visibilities.get("besluit", None) == possible_solutions:
+            return
+        self.visibilities["besluit"] = possible_solutions
+        self.containers["besluit"].clear()
+
+        # the classification field follows the terminal answers
+        self.SetClassificationDefault()
+
+        # (compact: the classification tab refers to a hidden field per tab,
+        #  which tells whether a terminal answer of that tab was chosen,
+        #  rather than repeating the conditions of all classifications)
+        tab_terminals = {}
+        for express in possible_solutions.values():
+            for field, answer_idx in express:
+                tab = compiled.Tab(compiled.step_lookup[field[len("Answer_"):]])
+                tab_terminals.setdefault(tab, []).append((field, answer_idx))
+        decided = [(self.HiddenField(f"decided_tab{tab}", QGT.AnyEquals(conditions, compact), \
+                                     QMetaType.Type.Bool), "TRUE") \
+                   for tab, conditions in sorted(tab_terminals.items())] if compact else None
+
         for nr, (solution_key, express) in enumerate(possible_solutions.items()):
             solution_container = QgsAttributeEditorContainer( \
                 name = f"Classification {nr}",
@@ -493,39 +541,81 @@ class QgisFormDecisionTree(QGT.DecisionTree):
             AddInfoText(solution_container, solution_key, "classification: ")
 
             # visible
-            visexp = QgsExpression(" OR ".join(express))
-            solution_container.setVisibilityExpression(QgsOptionalExpression(visexp))
+            solution_container.setVisibilityExpression(self.Visibility( \
+                QGT.AnyEquals(express, compact)))
 
             # deploy container
             self.containers["besluit"].addChildElement(solution_container)
 
 
-        visexp = QgsExpression(" OR ".join([" OR ".join(express) \
-                              for express in possible_solutions.values()]) \
-                              )
-        self.containers["besluit"].setVisibilityExpression(QgsOptionalExpression(visexp))
+        self.containers["besluit"].setVisibilityExpression(self.Visibility( \
+            QGT.AnyEquals([condition for express in possible_solutions.values() \
+                           for condition in express], compact) if decided is None \
+            else QGT.AnyEquals(decided, compact) \
+            ))
 
-        # TODO dynamically set field `classification`
-        # e = QgsExpression( 'Column * 3' )
-        # e.prepare( vl.pendingFields() )
-        #
-        # for f in vl.getFeatures():
-        #     f[idx] = e.evaluate( f )
-        #     vl.updateFeature( f )
-        #
-        # vl.commitChanges()
 
+    def SetClassificationDefault(self):
+        # the `classification` field is set by a default value expression,
+        # which follows the path of the answers (see DecisionTree.ClassificationExpression),
+        # applied again on every update of a feature.
+        # For features recorded earlier, see Backfill.
+        self.layer.setDefaultValueDefinition(self.field_index_lookup("classification"), \
+            QgsDefaultValue(self.ClassificationExpression(), True))
 
 
-    def FinishFormCreation(self):
-        # update and save
+    def Backfill(self, layer: QgsVectorLayer = None, chunk_size: int = 10000):
+        # fill in the classification of existing features
+        # (of the form layer, or of another `layer` with the same answer fields)
+        # (this reads and edits features, which needs QGIS)
+        from BackfillClassification import BackfillClassification
+        return BackfillClassification(self.layer if layer is None else layer, \
+                                      self, chunk_size = chunk_size)
+
+
+    def AnsweredCountField(self, tab):
+        # a hidden field which counts the answered questions
+        # of exactly the tab clade (see SetDynamicVisibilities)
+        return self.HiddenField(f"answered_tab{tab}", \
+                                QGT.AnsweredCount(f"Answer_{step}" \
+                                                  for step in self.clade_index.Members(tab)), \
+                                QMetaType.Type.Int)
 
+
+    def HiddenField(self, label, expression, field_type):
+        # a hidden (virtual) field, computed once per edit from the answers;
+        # added on first use, and updated when its expression changed
+        field_idx = self.field_index_lookup(label)
+        if field_idx < 0:
+            self.layer.addExpressionField(expression, QgsField(label, field_type))
+            self.layer.setEditorWidgetSetup(self.field_index_lookup(label), \
+                                            QgsEditorWidgetSetup('Hidden', {}))
+        elif self.layer.expressionField(field_idx) != expression:
+            self.layer.updateExpressionField(field_idx, expression)
+
+        return label
+
+
+    def Visibility(self, expression_string):
+        # a visibility expression for a container
+        # (QGIS copies it into the container; each container evaluates its own)
+        return QgsOptionalExpression(QgsExpression(expression_string))
+
+
+
+    def AttachContainers(self):
         # add all tabs
         for tab in self.tabs:
             self.containers["root"].addChildElement(self.containers[tab])
 
         self.containers["root"].addChildElement(self.containers["besluit"])
 
+
+    def FinishFormCreation(self):
+        # update and save
+
+        self.AttachContainers()
+
         # connect the form configuration
         self.layer.updateFields()
         self.layer.setEditFormConfig(self.form_config)
@@ -536,9 +626,54 @@ class QgisFormDecisionTree(QGT.DecisionTree):
         self.project.Save()
 
 
+    def Reload(self, *args, **kwargs):
+        # reload the key file (see DecisionTree.Reload), and update the form
+        changes = super(QgisFormDecisionTree, self).Reload(*args, **kwargs)
+        self.ApplyChanges(changes)
+        return changes
+
+
+    def ApplyChanges(self, changes: QGT.ChangeSet):
+        # regenerate only the parts of the form which a reload affected:
+        # the question blocks of the tabs in `changes["tabs"]`,
+        # and the visibility expressions which changed.
+        # (e.g. `heidesleutel_form.Watch(print)` keeps the form in sync with the csv)
+        if changes.IsEmpty():
+            return
+
+        if self.verbose:
+            print("### Applying changes:", changes, sep = "\n")
+
+        # fields of new steps and tabs are appended;
+        # fields of removed steps are kept, with the answers recorded in them
+        # (removing them would also shift the index of all subsequent fields)
+        previous_tabs = self.tabs
+        self.AssembleAllFields()
+
+        if self.tabs != previous_tabs:
+            # tabs are numbered: rebuild all containers
+            self.CladeContainers()
+            self.FormNodeForms()
+            self.SetDynamicVisibilities()
+            self.AttachContainers()
+
+        else:
+            # the containers cannot drop single children;
+            # so the affected tabs are refilled
+            for step in changes["removed"]:
+                self.question_blocks.pop(step, None)
+            for tab in changes["tabs"]:
+                self.containers[tab].clear()
+                self.ShowAllCheckbox(tab)
+                self.FormNodeForms(steps = list(self.GetTabMembers(tab).keys()))
+
+            self.SetDynamicVisibilities(tabs = changes["tabs"])
+
+        # connect the form configuration, and save
+        self.layer.updateFields()
+        self.layer.setEditFormConfig(self.form_config)
+        self.project.Save()
 
-# provider and layer registries from memory
-# TODO atexit?
 
 
 class QuestionBlock(object):
@@ -625,24 +760,51 @@ class QuestionBlock(object):
 
 
 
+def AssembleKeyProjects(session: QgisSession, key_files: list, header: int = 4, \
+                        verbose: bool = False):
+    # one project per key ("<key>.qgs", with the data layers and the key form),
+    # all in the same session; each project is released once it is saved
+    project_files = []
+    for key_file in key_files:
+        name = pl.Path(key_file).stem
+        project = session.Project(f"{name}.qgs")
+        AddDataLayers(project)
+
+        tree = QGT.DecisionTree.from_csv(key_file, sep = ",", header = header, cache_dir = "./.tree_cache")
+        QgisFormDecisionTree(tree = tree, project = project, name = name, verbose = verbose)
+
+        project_files.append(project.save_filename)
+        project.Close()
+
+    return project_files
+
+
+
 if __name__ == "__main__":
-    project = QgisProject("heide.qgs")
-    data_layers = AddDataLayers(project)
+    with QgisSession() as session:
+        if len(sys.argv) > 1:
+            # batch: python AssembleMolenheide.py sleutels/*.csv
+            for project_file in AssembleKeyProjects(session, sys.argv[1:]):
+                print(project_file)
 
+        else:
+            project = session.Project("heide.qgs")
+            data_layers = AddDataLayers(project)
 
-    heidesleutel = QGT.DecisionTree.from_csv("./sleutels/Heidesleutel_digitaal_werkversie.csv", sep = ",", header = 4)
 
-    # AddRootButton(project, heidesleutel)
+            heidesleutel = QGT.DecisionTree.from_csv("./sleutels/Heidesleutel_digitaal_werkversie.csv", sep = ",", header = 4, cache_dir = "./.tree_cache")
+            print(heidesleutel.Validate())
 
+            # AddRootButton(project, heidesleutel)
 
-    heidesleutel_form = QgisFormDecisionTree( \
-        tree = heidesleutel,
-        project = project, \
-        name = "heidesleutel", \
-        verbose = True \
-        )
 
-    # heidesleutel_form.FinishFormCreation()
+            heidesleutel_form = QgisFormDecisionTree( \
+                tree = heidesleutel,
+                project = project, \
+                name = "heidesleutel", \
+                verbose = True \
+                )
 
-    # extent = (5.38128, 51.07422 , 5.40922, 51.08951) # EPSG:4326, WGS84?
+            # heidesleutel_form.FinishFormCreation()
 
+            # extent = (5.38128, 51.07422 , 5.40922, 51.08951) # EPSG:4326, WGS84?
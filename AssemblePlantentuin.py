@@ -2,11 +2,19 @@
 
 import os
 import sys
-from qgis.core import *
-from qgis.gui import *
-from qgis.utils import *
-from qgis.PyQt.QtCore import QMetaType, QVariant
+
+# with QGIS_HEADLESS=1, forms are compiled by the pure-Python form model,
+# which writes the project file directly (without a QGIS install)
+if os.environ.get("QGIS_HEADLESS", "0") not in ("", "0"):
+    from HeadlessForms import *
+else:
+    from qgis.core import *
+    from qgis.gui import *
+    from qgis.utils import *
+    from qgis.PyQt.QtCore import QMetaType, QVariant
 import pathlib as pl
+
+from QgisSessions import QgisSession, QgisProject
 # from PyQt4.QtCore import *
 # from PyQt4.QtGui import QApplication
 # from PyQt4.QtXml import *
@@ -77,47 +85,6 @@ widget_library["image"] = QgsEditorWidgetSetup(
  })
 
 
-class QgisProject(object):
-
-    def __init__(self, filename):
-        self.filename = filename # "test.qgs"
-        self.InitQgisApplication()
-        self.CreateQgisProject()
-        self.Save()
-
-    def InitQgisApplication(self):
-        # https://docs.qgis.org/3.40/en/docs/pyqgis_developer_cookbook/intro.html#using-pyqgis-in-standalone-scripts
-
-        # Supply path to qgis install location
-        # QgsApplication.prefixPath()
-        QgsApplication.setPrefixPath("/usr/bin/qgis", True)
-
-
-        # Create a reference to the QgsApplication.  Setting the
-        # second argument to False disables the GUI.
-        self.app = QgsApplication([], False)
-
-
-        # Load providers
-        self.app.initQgis()
-
-
-    def CreateQgisProject(self):
-        ### Project
-        self.project = QgsProject.instance()
-        self.path: pl._local.PosixPath = pl.Path(self.project.readPath("./"))
-        # print(project.fileName())
-
-        project_crs = QgsCoordinateReferenceSystem.fromEpsgId(31370)
-        self.project.setCrs(project_crs)
-
-
-    def Save(self):
-        # Read input parameters from GP dialog
-        self.save_filename = self.path/self.filename
-        check = self.project.write(str(self.save_filename))
-
-
 def AddDataLayers(project):
     layers = {}
     # gj = "woods"
@@ -286,11 +253,6 @@ class QgisFormLayer(object):
         self.layer.updateFields()
         self.project.project.addMapLayer(self.layer)
 
-# Finally, exitQgis() is called to remove the
-
-# provider and layer registries from memory
-# TODO atexit?
-
 
 class FormElement(dict):
     def __init__(self, label, dtype = None, parent = None,
@@ -347,58 +309,58 @@ def LinkElements(form):
 
 
 if __name__ == "__main__":
-    project = QgisProject("test.qgs")
-    data_layers = AddDataLayers(project)
-    # ZoomTo(data_layers["garden"])
-
-    form_structure = [
-        FormWidget("mycategory", dtype = QMetaType.Type.QString, \
-                    widget = QgsEditorWidgetSetup('ValueMap', {'map': {'Red': 'R', 'Green': 'G', 'Blue': 'B'}}) \
-                    ), \
-        \
-        FormContainer("Red habitat", condition = "\"mycategory\" = 'R'"), \
-        FormWidget("red subtype", dtype = QMetaType.Type.Bool, \
-                    widget = widget_library["checkbox"], \
-                    parent = "Red habitat"), \
-        FormContainer("Red A", condition = "\"red subtype\" = TRUE"), \
-        FormWidget("text A", dtype = QMetaType.Type.QString, \
-                    widget = widget_library["multiline"], \
-                    parent = "Red A"), \
-        FormContainer("Red B", condition = "\"red subtype\" = FALSE"), \
-        FormWidget("text B", dtype = QMetaType.Type.QString, \
-                    widget = widget_library["multiline"], \
-                    parent = "Red B"), \
-        \
-        FormContainer("Green habitat", condition = "\"mycategory\" = 'G'"), \
-        FormWidget("time", dtype = QMetaType.Type.Int, \
-                    widget = widget_library["date"], \
-                    parent = "Green habitat"), \
-        \
-        FormContainer("Blue habitat", condition = "\"mycategory\" = 'B'"), \
-        FormWidget("photo", dtype = QMetaType.Type.QString, \
-                    widget = widget_library["image"], \
-                    parent = "Blue habitat"), \
-        \
-        FormWidget("done", dtype = QMetaType.Type.Bool, \
-                    widget = widget_library["checkbox"], \
-                    ) \
-    ]
-
-    # LinkElements(form_structure)
-    # print([f"{(frm.parent_link['label']+'/') if frm.parent_link is not None else ""}{frm['label']}"
-    #        for frm in form_structure])
-
-
-    test_form = QgisFormLayer( \
-        project, \
-        name = "monuments", \
-        fields = form_structure, \
-        verbose = True \
-        )
-
-
-    check = project.Save()
-    project.app.exitQgis()
+    with QgisSession() as session:
+        project = session.Project("test.qgs")
+        data_layers = AddDataLayers(project)
+        # ZoomTo(data_layers["garden"])
+
+        form_structure = [
+            FormWidget("mycategory", dtype = QMetaType.Type.QString, \
+                        widget = QgsEditorWidgetSetup('ValueMap', {'map': {'Red': 'R', 'Green': 'G', 'Blue': 'B'}}) \
+                        ), \
+            \
+            FormContainer("Red habitat", condition = "\"mycategory\" = 'R'"), \
+            FormWidget("red subtype", dtype = QMetaType.Type.Bool, \
+                        widget = widget_library["checkbox"], \
+                        parent = "Red habitat"), \
+            FormContainer("Red A", condition = "\"red subtype\" = TRUE"), \
+            FormWidget("text A", dtype = QMetaType.Type.QString, \
+                        widget = widget_library["multiline"], \
+                        parent = "Red A"), \
+            FormContainer("Red B", condition = "\"red subtype\" = FALSE"), \
+            FormWidget("text B", dtype = QMetaType.Type.QString, \
+                        widget = widget_library["multiline"], \
+                        parent = "Red B"), \
+            \
+            FormContainer("Green habitat", condition = "\"mycategory\" = 'G'"), \
+            FormWidget("time", dtype = QMetaType.Type.Int, \
+                        widget = widget_library["date"], \
+                        parent = "Green habitat"), \
+            \
+            FormContainer("Blue habitat", condition = "\"mycategory\" = 'B'"), \
+            FormWidget("photo", dtype = QMetaType.Type.QString, \
+                        widget = widget_library["image"], \
+                        parent = "Blue habitat"), \
+            \
+            FormWidget("done", dtype = QMetaType.Type.Bool, \
+                        widget = widget_library["checkbox"], \
+                        ) \
+        ]
+
+        # LinkElements(form_structure)
+        # print([f"{(frm.parent_link['label']+'/') if frm.parent_link is not None else ""}{frm['label']}"
+        #        for frm in form_structure])
+
+
+        test_form = QgisFormLayer( \
+            project, \
+            name = "monuments", \
+            fields = form_structure, \
+            verbose = True \
+            )
+
+
+        check = project.Save()
 
 
 # TODO
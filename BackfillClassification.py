@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+Fill in the `classification` field of an existing layer of field records,
+from its answer fields (e.g. for features recorded before the form set it).
+
+    python BackfillClassification.py ./records.gpkg --key ./sleutels/Heidesleutel_digitaal_werkversie.csv
+
+Features are read without geometry, and changes are committed in chunks.
+"""
+
+#_______________________________________________________________________________
+#                 Libraries
+#_______________________________________________________________________________
+
+import argparse as ARG
+import time as TI
+
+# (always from QGIS itself: the headless form model holds no features)
+from qgis.core import QgsApplication, QgsVectorLayer, QgsExpression, QgsExpressionContext, \
+                      QgsExpressionContextUtils, QgsFeatureRequest, edit
+
+import QGISDecisionTrees as QGT
+from QgisSessions import QgisSession
+
+
+#_______________________________________________________________________________
+#                 Backfill
+#_______________________________________________________________________________
+
+def BackfillClassification(layer: QgsVectorLayer, tree: QGT.DecisionTree, \
+                           chunk_size: int = 10000, field: str = "classification", \
+                           answer_prefix: str = "Answer_"):
+    # (re-)compute the classification of all features of a layer, from the answer fields
+    # (see DecisionTree.ClassificationExpression). The expression is prepared once;
+    # features are read without geometry and with only the answer fields;
+    # changed values are committed in chunks of `chunk_size` features.
+    # returns the number of features which changed
+    expression = QgsExpression(tree.ClassificationExpression(answer_prefix))
+    context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+    expression.prepare(context)
+    if expression.hasParserError():
+        raise ValueError(expression.parserErrorString())
+
+    fields = layer.fields()
+    field_idx = fields.indexFromName(field)
+    if field_idx < 0:
+        raise KeyError(f"The layer {layer.name()} has no field {field}.")
+
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([name for name in fields.names() \
+                                   if name.startswith(answer_prefix)] + [field], \
+                                  fields)
+
+    changes = {}
+    for feature in layer.getFeatures(request):
+        context.setFeature(feature)
+        value = expression.evaluate(context)
+        if value != feature.attribute(field_idx):
+            changes[feature.id()] = value
+
+    feature_ids = list(changes.keys())
+    for start in range(0, len(feature_ids), chunk_size):
+        with edit(layer):
+            for feature_id in feature_ids[start:start+chunk_size]:
+                layer.changeAttributeValue(feature_id, field_idx, changes[feature_id])
+
+    return len(changes)
+
+
+#_______________________________________________________________________________
+#                 Mission Control
+#_______________________________________________________________________________
+
+if __name__ == "__main__":
+    parser = ARG.ArgumentParser(description = "fill in the classification of field records")
+    parser.add_argument("layer_path", help = "a vector layer, e.g. records.gpkg|layername=heidesleutel")
+    parser.add_argument("--key", default = "./sleutels/Heidesleutel_digitaal_werkversie.csv")
+    parser.add_argument("--header", type = int, default = 4)
+    parser.add_argument("--field", default = "classification")
+    parser.add_argument("--answer-prefix", default = "Answer_")
+    parser.add_argument("--chunk-size", type = int, default = 10000)
+    arguments = parser.parse_args()
+
+    tree = QGT.DecisionTree.from_csv(arguments.key, sep = ",", header = arguments.header, \
+                                     compact = True, cache_dir = "./.tree_cache")
+
+    with QgisSession(application = QgsApplication):
+        layer = QgsVectorLayer(arguments.layer_path, "records", "ogr")
+        assert layer.isValid(), f"Layer {arguments.layer_path} is not valid!"
+
+        start = TI.perf_counter()
+        n_changed = BackfillClassification(layer, tree, chunk_size = arguments.chunk_size, \
+                                           field = arguments.field, answer_prefix = arguments.answer_prefix)
+        print(f"{n_changed} of {layer.featureCount()} features changed ({TI.perf_counter() - start:.2f}s)")
@@ -0,0 +1,818 @@
+#!/usr/bin/env python3
+
+"""
+A pure-Python form model, which compiles forms into QGIS project files
+without a QGIS installation (i.e. without `QgsApplication.initQgis()`).
+
+It provides the few `qgis.core` classes which the form builders use
+(QgisFormDecisionTree in AssembleMolenheide.py, QgisFormLayer in AssemblePlantentuin.py),
+with the same names and methods; they only record the layers, fields, widgets
+and form elements. `QgsProject.write()` then streams the project xml
+(`maplayer`, `fieldConfiguration`, `editform`, `attributeEditorForm`, ...)
+directly into the .qgs file.
+
+The form builders use this model (only) if the environment variable
+QGIS_HEADLESS=1 is set:
+
+    QGIS_HEADLESS=1 python AssembleMolenheide.py
+
+Layers of this model hold no features: anything which reads or edits
+features (e.g. BackfillClassification) needs QGIS.
+
+The xml follows the structure QGIS 3.40 writes, and is deterministic.
+What is checked (test_headless_form_sections) are the form sections of a layer:
+`fieldConfiguration` (the widgets), `defaults`, `expressionfields`, `editform`,
+`editorlayout`, `attributeEditorForm` and `labelOnTop`. These equal those of
+a QGIS 3.40 project up to the order of attributes, indentation, and the label
+styles QGIS adds to every form element (when they override nothing).
+The rest of the file (layer ids, the datasource uri, symbols, CRS definitions,
+the sections QGIS writes with their defaults) is not compared, and differs.
+"""
+
+#_______________________________________________________________________________
+#                 Libraries
+#_______________________________________________________________________________
+
+import enum as EN
+import json as JSON
+import os as OS
+import uuid as UUID
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+__all__ = ["Qgis", "QMetaType", "QVariant", "QgsApplication", "QgsProject", \
+           "QgsCoordinateReferenceSystem", "QgsLayerDefinition", "QgsVectorLayer", \
+           "QgsField", "QgsFields", "QgsEditorWidgetSetup", "QgsEditFormConfig", \
+           "QgsAttributeEditorContainer", "QgsAttributeEditorField", "QgsAttributeEditorTextElement", \
+           "QgsExpression", "QgsOptionalExpression", "QgsDefaultValue"]
+
+# the QGIS version whose project files are mimicked
+QGIS_VERSION = "3.40.0-Bratislava"
+
+
+#_______________________________________________________________________________
+#                 Enums and Types
+#_______________________________________________________________________________
+# (values as in Qt and QGIS)
+
+class Qgis(object):
+    class AttributeFormLayout(EN.IntEnum):
+        AutoGenerated = 0
+        DragAndDrop = 1
+        UiFile = 2
+
+    class AttributeEditorContainerType(EN.IntEnum):
+        GroupBox = 0
+        Tab = 1
+        Row = 2
+
+
+class QMetaType(object):
+    class Type(EN.IntEnum):
+        Bool = 1
+        Int = 2
+        LongLong = 4
+        Double = 6
+        QString = 10
+        QDate = 14
+        QTime = 15
+        QDateTime = 16
+
+class QVariant(object):
+    # (only imported along with QMetaType)
+    pass
+
+# field types: (type name, as in memory layer uris)
+field_type_names = {
+    QMetaType.Type.Bool: "boolean",
+    QMetaType.Type.Int: "integer",
+    QMetaType.Type.LongLong: "int8",
+    QMetaType.Type.Double: "double",
+    QMetaType.Type.QString: "string",
+    QMetaType.Type.QDate: "date",
+    QMetaType.Type.QTime: "time",
+    QMetaType.Type.QDateTime: "datetime",
+}
+
+# CRS definitions which are known without the PROJ database
+crs_definitions = {
+    4326: ("WGS 84", "+proj=longlat +datum=WGS84 +no_defs"),
+    3857: ("WGS 84 / Pseudo-Mercator", "+proj=merc +a=6378137 +b=6378137 +lat_ts=0 +lon_0=0" \
+           " +x_0=0 +y_0=0 +k=1 +units=m +nadgrids=@null +wktext +no_defs"),
+    31370: ("BD72 / Belgian Lambert 72", "+proj=lcc +lat_0=90 +lon_0=4.36748666666667" \
+            " +lat_1=51.1666672333333 +lat_2=49.8333339 +x_0=150000.013 +y_0=5400088.438" \
+            " +ellps=intl +towgs84=-106.8686,52.2978,-103.7239,0.3366,-0.457,1.8422,-1.2747" \
+            " +units=m +no_defs"),
+}
+
+# geometry types: GeoJSON -> (wkb type, QGIS geometry, layerGeometryType, symbol)
+geometry_types = {
+    "Point": ("Point", "Point", 0, "marker"),
+    "MultiPoint": ("MultiPoint", "Point", 0, "marker"),
+    "LineString": ("LineString", "Line", 1, "line"),
+    "MultiLineString": ("MultiLineString", "Line", 1, "line"),
+    "Polygon": ("Polygon", "Polygon", 2, "fill"),
+    "MultiPolygon": ("MultiPolygon", "Polygon", 2, "fill"),
+}
+
+
+#_______________________________________________________________________________
+#                 Application and Project
+#_______________________________________________________________________________
+
+class QgsApplication(object):
+    # nothing to initialize; one per process, as in QGIS
+    _instance = None
+
+    def __init__(self, argv = None, gui = False):
+        if QgsApplication._instance is not None:
+            raise RuntimeError("There is a QgsApplication already.")
+        QgsApplication._instance = self
+
+    @staticmethod
+    def instance():
+        return QgsApplication._instance
+
+    @staticmethod
+    def setPrefixPath(path, use_default_paths = False):
+        pass
+
+    def initQgis(self):
+        pass
+
+    def exitQgis(self):
+        QgsApplication._instance = None
+
+
+class QgsCoordinateReferenceSystem(object):
+    def __init__(self, epsg: int = None):
+        self.epsg = epsg
+
+    @classmethod
+    def fromEpsgId(cls, epsg: int):
+        return cls(int(epsg))
+
+    def isValid(self):
+        return self.epsg is not None
+
+    def authid(self):
+        return "" if self.epsg is None else f"EPSG:{self.epsg}"
+
+    def description(self):
+        return crs_definitions.get(self.epsg, ("", ""))[0]
+
+    def toProj(self):
+        return crs_definitions.get(self.epsg, ("", ""))[1]
+
+
+class QgsProject(object):
+    # independent projects, or the one of QgsProject.instance()
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.crs_ = QgsCoordinateReferenceSystem()
+        self.layers = {}
+        self.layer_order = [] # as in the layer tree: the latest on top
+        self.file_name = ""
+
+    def readPath(self, path):
+        # (a project without file name keeps paths as they are)
+        return path
+
+    def setCrs(self, crs):
+        self.crs_ = crs
+
+    def crs(self):
+        return self.crs_
+
+    def addMapLayer(self, layer, add_to_legend: bool = True):
+        if layer.id() not in self.layers:
+            layer.project_ = self
+            self.layers[layer.id()] = layer
+            self.layer_order.insert(0, layer.id())
+        return layer
+
+    def addMapLayers(self, layers, add_to_legend: bool = True):
+        return [self.addMapLayer(layer, add_to_legend) for layer in layers]
+
+    def mapLayers(self):
+        return dict(self.layers)
+
+    def fileName(self):
+        return self.file_name
+
+    def clear(self):
+        for layer in self.layers.values():
+            layer.project_ = None
+        self.__init__()
+
+    def write(self, filename: str = None):
+        if filename is not None:
+            self.file_name = str(filename)
+        with open(self.file_name, "w", encoding = "utf-8") as stream:
+            WriteProject(self, stream)
+        return True
+
+
+class QgsLayerDefinition(object):
+    # layers from .qlr files are copied into the project as they are
+    def loadLayerDefinitionLayers(self, path: str):
+        root = ET.parse(path).getroot()
+        return [DefinedLayer(element) for element in root.iter("maplayer")]
+
+
+class DefinedLayer(object):
+    # a layer from a layer definition file, kept as xml
+    def __init__(self, element):
+        self.element = element
+        self.layer_id = element.findtext("id")
+        self.project_ = None
+        self.provider = element.findtext("provider") or ""
+
+    def id(self):
+        return self.layer_id
+
+    def name(self):
+        return self.element.findtext("layername") or ""
+
+    def source(self):
+        return self.element.findtext("datasource") or ""
+
+
+#_______________________________________________________________________________
+#                 Layers and Fields
+#_______________________________________________________________________________
+
+class QgsField(object):
+    def __init__(self, name: str, type = QMetaType.Type.QString, typeName: str = "", \
+                 len: int = 0, prec: int = 0, comment: str = ""):
+        self.name_ = name
+        self.type_ = type
+        self.type_name = typeName # (as given; memory layers name the types in their uri)
+        self.length = len
+        self.precision = prec
+        self.comment_ = comment
+
+    def name(self):
+        return self.name_
+
+    def type(self):
+        return self.type_
+
+    def typeName(self):
+        return self.type_name
+
+
+class QgsFields(list):
+    def indexFromName(self, name):
+        for idx, field in enumerate(self):
+            if field.name() == name:
+                return idx
+        return -1
+
+    def names(self):
+        return [field.name() for field in self]
+
+    def count(self):
+        return len(self)
+
+
+class DataProvider(object):
+    def __init__(self, layer):
+        self.layer = layer
+        self.attributes = []
+
+    def addAttributes(self, fields):
+        self.attributes.extend(fields)
+        return True
+
+    def fields(self):
+        return QgsFields(self.attributes)
+
+    def name(self):
+        return self.layer.provider
+
+
+class QgsEditorWidgetSetup(object):
+    def __init__(self, type: str = "", config: dict = None):
+        self.type_ = type
+        self.config_ = {} if config is None else config
+
+    def type(self):
+        return self.type_
+
+    def config(self):
+        return self.config_
+
+
+class QgsDefaultValue(object):
+    def __init__(self, expression: str = "", applyOnUpdate: bool = False):
+        self.expression_ = expression
+        self.apply_on_update = applyOnUpdate
+
+    def expression(self):
+        return self.expression_
+
+    def applyOnUpdate(self):
+        return self.apply_on_update
+
+
+class QgsVectorLayer(object):
+    # a memory layer (e.g. a form), or a layer on a file
+    def __init__(self, path: str = "", baseName: str = "", providerLib: str = "ogr"):
+        self.path = str(path)
+        self.layer_name = baseName
+        self.provider = providerLib
+        self.data_provider = DataProvider(self)
+        self.layer_fields = QgsFields()
+        self.expression_fields = [] # (field, expression)
+        self.widget_setups = {}     # by field name
+        self.defaults = {}          # by field name
+        self.form_config = QgsEditFormConfig(self)
+        self.project_ = None
+
+        # layer ids as QGIS composes them, but derived from name and source
+        self.layer_id = (baseName.replace(" ", "_") + "_" \
+                         + str(UUID.uuid5(UUID.NAMESPACE_URL, f"{providerLib}:{path}:{baseName}"))) \
+                        .replace("-", "_")
+
+        # geometry (and crs) of file layers is read from the data
+        self.geometry = geometry_types.get(self.path.split("?")[0], None)
+        self.crs_ = QgsCoordinateReferenceSystem()
+        if (self.provider != "memory") and OS.path.exists(self.path):
+            self.ReadGeoJson()
+
+    def ReadGeoJson(self):
+        # geometry type and crs of a GeoJSON file
+        if not self.path.lower().endswith((".geojson", ".json")):
+            return
+        with open(self.path, encoding = "utf-8") as geojson:
+            data = JSON.load(geojson)
+        for feature in data.get("features", []):
+            if feature.get("geometry") is not None:
+                self.geometry = geometry_types.get(feature["geometry"]["type"], None)
+                break
+        crs_name = data.get("crs", {}).get("properties", {}).get("name", "EPSG:4326")
+        self.crs_ = QgsCoordinateReferenceSystem(int(crs_name.rsplit(":", 1)[-1]) \
+                                                 if crs_name.rsplit(":", 1)[-1].isdigit() else 4326)
+
+    def isValid(self):
+        return (self.provider == "memory") or OS.path.exists(self.path)
+
+    def id(self):
+        return self.layer_id
+
+    def name(self):
+        return self.layer_name
+
+    def crs(self):
+        # (without a crs of their own, layers are in the crs of their project)
+        if self.crs_.isValid() or (self.project_ is None):
+            return self.crs_
+        return self.project_.crs()
+
+    def dataProvider(self):
+        return self.data_provider
+
+    def updateFields(self):
+        # provider fields first, then expression fields
+        self.layer_fields = QgsFields(self.data_provider.attributes \
+                                      + [field for field, _ in self.expression_fields])
+
+    def fields(self):
+        return self.layer_fields
+
+    def addExpressionField(self, expression: str, field: QgsField):
+        self.expression_fields.append((field, expression))
+        self.updateFields()
+        return len(self.layer_fields) - 1
+
+    def ExpressionFieldNumber(self, idx):
+        return idx - len(self.data_provider.attributes)
+
+    def expressionField(self, idx):
+        return self.expression_fields[self.ExpressionFieldNumber(idx)][1]
+
+    def updateExpressionField(self, idx, expression: str):
+        number = self.ExpressionFieldNumber(idx)
+        self.expression_fields[number] = (self.expression_fields[number][0], expression)
+
+    def setEditorWidgetSetup(self, idx, setup: QgsEditorWidgetSetup):
+        self.widget_setups[self.layer_fields[idx].name()] = setup
+
+    def editorWidgetSetup(self, idx):
+        return self.widget_setups.get(self.layer_fields[idx].name(), QgsEditorWidgetSetup())
+
+    def setDefaultValueDefinition(self, idx, definition: QgsDefaultValue):
+        self.defaults[self.layer_fields[idx].name()] = definition
+
+    def defaultValueDefinition(self, idx):
+        return self.defaults.get(self.layer_fields[idx].name(), QgsDefaultValue())
+
+    def editFormConfig(self):
+        return self.form_config
+
+    def setEditFormConfig(self, config):
+        self.form_config = config
+
+    def source(self):
+        if self.provider != "memory":
+            return self.path
+        # memory layers carry their fields in the uri
+        crs = self.crs()
+        uid = UUID.uuid5(UUID.NAMESPACE_URL, self.layer_id)
+        return self.path + "?" + "&".join( \
+            ([f"crs={crs.authid()}"] if crs.isValid() else []) \
+            + [f"field={quote(field.name(), safe = '')}:{field.typeName() or field_type_names.get(field.type(), 'string')}"
+               f"({field.length},{field.precision})" \
+               for field in self.data_provider.attributes] \
+            + [f"uid={{{uid}}}"])
+
+
+#_______________________________________________________________________________
+#                 Form Elements
+#_______________________________________________________________________________
+
+class QgsExpression(object):
+    # (expressions are kept as text; they are not parsed or evaluated here)
+    def __init__(self, expression: str = ""):
+        self.expression_ = expression
+
+    def expression(self):
+        return self.expression_
+
+
+class QgsOptionalExpression(object):
+    def __init__(self, expression: QgsExpression = None):
+        self.expression_ = expression
+
+    def enabled(self):
+        return self.expression_ is not None
+
+    def data(self):
+        return QgsExpression() if self.expression_ is None else self.expression_
+
+
+class QgsAttributeEditorElement(object):
+    def __init__(self, name: str = "", parent = None):
+        self.name_ = name
+        self.parent_ = parent
+
+    def name(self):
+        return self.name_
+
+    def parent(self):
+        return self.parent_
+
+
+class QgsAttributeEditorContainer(QgsAttributeEditorElement):
+    def __init__(self, name: str = "", parent = None):
+        super(QgsAttributeEditorContainer, self).__init__(name, parent)
+        self.children_ = []
+        self.type_ = Qgis.AttributeEditorContainerType.GroupBox
+        self.column_count = 1
+        self.visibility = QgsOptionalExpression()
+
+    def addChildElement(self, element):
+        self.children_.append(element)
+
+    def children(self):
+        return list(self.children_)
+
+    def clear(self):
+        self.children_ = []
+
+    def setType(self, container_type):
+        self.type_ = Qgis.AttributeEditorContainerType(container_type)
+
+    def type(self):
+        return self.type_
+
+    def setVisibilityExpression(self, expression: QgsOptionalExpression):
+        self.visibility = expression
+
+    def visibilityExpression(self):
+        return self.visibility
+
+
+class QgsAttributeEditorField(QgsAttributeEditorElement):
+    def __init__(self, name: str = "", idx: int = -1, parent = None):
+        super(QgsAttributeEditorField, self).__init__(name, parent)
+        self.idx_ = idx
+
+    def idx(self):
+        return self.idx_
+
+
+class QgsAttributeEditorTextElement(QgsAttributeEditorElement):
+    def __init__(self, name: str = "", parent = None):
+        super(QgsAttributeEditorTextElement, self).__init__(name, parent)
+        self.text_ = ""
+
+    def setText(self, text: str):
+        self.text_ = text
+
+    def text(self):
+        return self.text_
+
+
+class QgsEditFormConfig(object):
+    def __init__(self, layer = None):
+        self.layer = layer
+        self.layout_ = Qgis.AttributeFormLayout.AutoGenerated
+        self.root = QgsAttributeEditorContainer("")
+        self.label_on_top = {} # by field name
+
+    def setLayout(self, layout):
+        self.layout_ = Qgis.AttributeFormLayout(layout)
+
+    def layout(self):
+        return self.layout_
+
+    def invisibleRootContainer(self):
+        return self.root
+
+    def setLabelOnTop(self, idx, on_top: bool):
+        self.label_on_top[self.layer.fields()[idx].name()] = bool(on_top)
+
+    def labelOnTop(self, idx):
+        return self.label_on_top.get(self.layer.fields()[idx].name(), False)
+
+
+#_______________________________________________________________________________
+#                 Writing XML
+#_______________________________________________________________________________
+# The project is written element by element, as it is walked
+# (indented by two, as QGIS saves its projects).
+
+def XmlEscape(text, attribute: bool = False):
+    text = str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if attribute:
+        text = text.replace("\"", "&quot;").replace("\n", "&#xa;") \
+                   .replace("\r", "&#xd;").replace("\t", "&#x9;")
+    return text
+
+
+class XmlStream(object):
+    def __init__(self, stream, indent: int = 2):
+        self.stream = stream
+        self.indent = indent
+        self.open_tags = []
+
+    def Tag(self, tag, attributes):
+        return "<" + " ".join([tag] + [f"{key}=\"{XmlEscape(value, True)}\"" \
+                                       for key, value in attributes.items()])
+
+    def Open(self, tag, attributes: dict = None):
+        self.stream.write(" " * (self.indent * len(self.open_tags)) + self.Tag(tag, attributes or {}) + ">\n")
+        self.open_tags.append(tag)
+
+    def Close(self):
+        tag = self.open_tags.pop()
+        self.stream.write(" " * (self.indent * len(self.open_tags)) + f"</{tag}>\n")
+
+    def Leaf(self, tag, attributes: dict = None, text = None):
+        # an element without children, with optional text
+        line = " " * (self.indent * len(self.open_tags)) + self.Tag(tag, attributes or {})
+        if text is None:
+            line += "/>\n"
+        else:
+            line += f">{XmlEscape(text)}</{tag}>\n"
+        self.stream.write(line)
+
+    def Copy(self, element):
+        # an (ElementTree) element, as it is
+        children = list(element)
+        if len(children) == 0:
+            self.Leaf(element.tag, element.attrib, element.text)
+            return
+        self.Open(element.tag, element.attrib)
+        for child in children:
+            self.Copy(child)
+        self.Close()
+
+
+def WriteVariant(xml, value, name: str = None):
+    # a (widget configuration) value as QGIS stores it (QgsXmlUtils::writeVariant);
+    # maps are sorted by key, as QVariantMaps are
+    attributes = {} if name is None else {"name": name}
+    if isinstance(value, dict):
+        if len(value) == 0:
+            xml.Leaf("Option", attributes)
+            return
+        xml.Open("Option", {**attributes, "type": "Map"})
+        for key in sorted(value.keys(), key = lambda key: str(key).encode("utf-16-be")):
+            WriteVariant(xml, value[key], str(key))
+        xml.Close()
+    elif isinstance(value, (list, tuple)):
+        if len(value) == 0:
+            xml.Leaf("Option", attributes)
+            return
+        xml.Open("Option", {**attributes, "type": "List"})
+        for item in value:
+            WriteVariant(xml, item)
+        xml.Close()
+    elif value is None:
+        xml.Leaf("Option", {**attributes, "type": "invalid"})
+    elif isinstance(value, bool):
+        xml.Leaf("Option", {**attributes, "type": "bool", "value": "true" if value else "false"})
+    elif isinstance(value, int):
+        xml.Leaf("Option", {**attributes, "type": "int" if abs(value) < 2**31 else "qlonglong", \
+                            "value": str(value)})
+    elif isinstance(value, float):
+        xml.Leaf("Option", {**attributes, "type": "double", "value": repr(value)})
+    else:
+        xml.Leaf("Option", {**attributes, "type": "QString", "value": str(value)})
+
+
+def WriteCrs(xml, crs):
+    xml.Open("spatialrefsys", {"nativeFormat": "Wkt"})
+    xml.Leaf("wkt", text = "")
+    xml.Leaf("proj4", text = crs.toProj())
+    xml.Leaf("srid", text = str(crs.epsg or 0))
+    xml.Leaf("authid", text = crs.authid())
+    xml.Leaf("description", text = crs.description())
+    xml.Close()
+
+
+def WriteRenderer(xml, symbol_type):
+    # a plain single symbol renderer
+    layer_class = {"marker": "SimpleMarker", "line": "SimpleLine", "fill": "SimpleFill"}[symbol_type]
+    xml.Open("renderer-v2", {"type": "singleSymbol", "symbollevels": "0", "forceraster": "0", \
+                             "enableorderby": "0", "referencescale": "-1"})
+    xml.Open("symbols")
+    xml.Open("symbol", {"name": "0", "type": symbol_type, "alpha": "1", "clip_to_extent": "1", \
+                        "force_rhr": "0", "frame_rate": "10", "is_animated": "0"})
+    xml.Open("layer", {"class": layer_class, "enabled": "1", "locked": "0", "pass": "0"})
+    WriteVariant(xml, {"color": "229,182,54,255", "outline_color": "35,35,35,255"})
+    xml.Close()
+    xml.Close()
+    xml.Close()
+    xml.Close()
+
+
+def WriteForm(xml, layer):
+    # fields, widgets, defaults and the drag&drop form of a layer
+    fields = layer.fields()
+    config = layer.editFormConfig()
+
+    xml.Open("fieldConfiguration")
+    for field in fields:
+        setup = layer.widget_setups.get(field.name(), QgsEditorWidgetSetup())
+        xml.Open("field", {"name": field.name(), "configurationFlags": "NoFlag"})
+        xml.Open("editWidget", {"type": setup.type()})
+        xml.Open("config")
+        WriteVariant(xml, setup.config())
+        xml.Close()
+        xml.Close()
+        xml.Close()
+    xml.Close()
+
+    xml.Open("aliases")
+    for idx, field in enumerate(fields):
+        xml.Leaf("alias", {"name": "", "index": str(idx), "field": field.name()})
+    xml.Close()
+
+    xml.Open("defaults")
+    for field in fields:
+        default = layer.defaults.get(field.name(), QgsDefaultValue())
+        xml.Leaf("default", {"field": field.name(), "expression": default.expression(), \
+                             "applyOnUpdate": "1" if default.applyOnUpdate() else "0"})
+    xml.Close()
+
+    if len(layer.expression_fields) > 0:
+        xml.Open("expressionfields")
+        for field, expression in layer.expression_fields:
+            xml.Leaf("field", {"name": field.name(), "expression": expression, \
+                               "type": str(int(field.type())), "typeName": field.typeName(), \
+                               "length": str(field.length), "precision": str(field.precision), \
+                               "subType": "0", "comment": ""})
+        xml.Close()
+    else:
+        xml.Leaf("expressionfields")
+
+    xml.Leaf("editform", {"tolerant": "1"}, "")
+    xml.Leaf("editforminit")
+    xml.Leaf("editforminitcodesource", text = "0")
+    xml.Leaf("editforminitfilepath", text = "")
+    xml.Leaf("featformsuppress", text = "0")
+    xml.Leaf("editorlayout", text = {Qgis.AttributeFormLayout.AutoGenerated: "generatedlayout", \
+                                     Qgis.AttributeFormLayout.DragAndDrop: "tablayout", \
+                                     Qgis.AttributeFormLayout.UiFile: "uifilelayout"}[config.layout()])
+
+    if config.layout() == Qgis.AttributeFormLayout.DragAndDrop:
+        # the children of the (invisible) root container
+        xml.Open("attributeEditorForm")
+        for element in config.invisibleRootContainer().children():
+            WriteFormElement(xml, element)
+        xml.Close()
+
+    for tag, value in [("editable", lambda name: "1"), \
+                       ("labelOnTop", lambda name: "1" if config.label_on_top.get(name, False) else "0"), \
+                       ("reuseLastValue", lambda name: "0")]:
+        xml.Open(tag)
+        for field in fields:
+            xml.Leaf("field", {"name": field.name(), tag: value(field.name())})
+        xml.Close()
+
+
+def WriteFormElement(xml, element):
+    attributes = {"name": element.name(), "showLabel": "1", \
+                  "horizontalStretch": "0", "verticalStretch": "0"}
+
+    if isinstance(element, QgsAttributeEditorField):
+        xml.Leaf("attributeEditorField", {**attributes, "index": str(element.idx())})
+        return
+    if isinstance(element, QgsAttributeEditorTextElement):
+        xml.Leaf("attributeEditorTextElement", {**attributes, "text": element.text()})
+        return
+
+    visibility = element.visibilityExpression()
+    attributes.update({"columnCount": str(element.column_count), \
+                       "groupBox": "1" if element.type() == Qgis.AttributeEditorContainerType.GroupBox else "0", \
+                       "type": element.type().name, \
+                       "collapsed": "0", \
+                       "collapsedExpressionEnabled": "0", "collapsedExpression": "", \
+                       "visibilityExpressionEnabled": "1" if visibility.enabled() else "0", \
+                       "visibilityExpression": visibility.data().expression()})
+    children = element.children()
+    if len(children) == 0:
+        xml.Leaf("attributeEditorContainer", attributes)
+        return
+    xml.Open("attributeEditorContainer", attributes)
+    for child in children:
+        WriteFormElement(xml, child)
+    xml.Close()
+
+
+def WriteLayer(xml, layer):
+    if isinstance(layer, DefinedLayer):
+        xml.Copy(layer.element)
+        return
+
+    wkb_type, geometry, geometry_code, symbol_type = layer.geometry or ("Unknown", "Unknown", 4, None)
+    xml.Open("maplayer", {"type": "vector", "geometry": geometry, "wkbType": wkb_type, \
+                          "styleCategories": "AllStyleCategories", "readOnly": "0", \
+                          "hasScaleBasedVisibilityFlag": "0", "minScale": "100000000", "maxScale": "0", \
+                          "autoRefreshMode": "Disabled", "autoRefreshTime": "0", \
+                          "refreshOnNotifyEnabled": "0", "refreshOnNotifyMessage": "", \
+                          "symbologyReferenceScale": "-1", "labelsEnabled": "0", \
+                          "legendPlaceholderImage": ""})
+    xml.Leaf("id", text = layer.id())
+    xml.Leaf("datasource", text = layer.source())
+    xml.Open("keywordList")
+    xml.Leaf("value", text = "")
+    xml.Close()
+    xml.Leaf("layername", text = layer.name())
+    xml.Open("srs")
+    WriteCrs(xml, layer.crs())
+    xml.Close()
+    xml.Leaf("provider", {"encoding": "" if layer.provider == "memory" else "UTF-8"}, layer.provider)
+    if symbol_type is not None:
+        WriteRenderer(xml, symbol_type)
+    WriteForm(xml, layer)
+    xml.Leaf("dataDefinedFieldProperties")
+    xml.Leaf("widgets")
+    xml.Leaf("previewExpression", text = "")
+    xml.Leaf("mapTip", {"enabled": "1"}, "")
+    xml.Leaf("layerGeometryType", text = str(geometry_code))
+    xml.Close()
+
+
+def WriteProject(project, stream):
+    # the whole project file, streamed
+    stream.write("<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>\n")
+    xml = XmlStream(stream)
+    xml.Open("qgis", {"projectname": "", "version": QGIS_VERSION})
+    xml.Leaf("homePath", {"path": ""})
+    xml.Leaf("title", text = "")
+    xml.Leaf("transaction", {"mode": "Disabled"})
+    xml.Leaf("projectFlags", {"set": ""})
+    xml.Open("projectCrs")
+    WriteCrs(xml, project.crs())
+    xml.Close()
+
+    # layer tree: the latest layer on top
+    xml.Open("layer-tree-group")
+    for layer_id in project.layer_order:
+        layer = project.layers[layer_id]
+        xml.Leaf("layer-tree-layer", {"id": layer.id(), "name": layer.name(), \
+                                      "source": layer.source(), "providerKey": layer.provider, \
+                                      "checked": "Qt::Checked", "expanded": "1", \
+                                      "legend_exp": "", "legend_split_behavior": "0", \
+                                      "patch_size": "-1,-1"})
+    xml.Close()
+
+    # layers (by id)
+    xml.Open("projectlayers")
+    for layer_id in sorted(project.layers.keys()):
+        WriteLayer(xml, project.layers[layer_id])
+    xml.Close()
+
+    xml.Close()
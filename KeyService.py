@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+A small local web service to walk a decision tree, question by question,
+e.g. from a browser on a field tablet.
+
+    python KeyService.py ./sleutels/Heidesleutel_digitaal_werkversie.csv --port 8642
+
+All sessions share one compiled (i.e. immutable) tree.
+Endpoints (JSON in, JSON out):
+    GET  /                              meta info of the key
+    POST /session                       start a walk        -> state
+    GET  /session/<id>                                      -> state
+    POST /session/<id>/answer/<idx>     choose an answer    -> state
+    POST /session/<id>/back             undo the last answer -> state
+    GET  /walk?answers=1,5,23           stateless: state after these answers
+The state carries a compact `token` (see TreeWalk.Serialize),
+with which a client can restore its walk (`POST /session?token=...`).
+"""
+
+#_______________________________________________________________________________
+#                 Libraries
+#_______________________________________________________________________________
+
+import argparse as ARG
+import asyncio as AIO
+import json as JSON
+import secrets as SEC
+from urllib.parse import urlsplit, parse_qs
+
+import QGISDecisionTrees as QGT
+
+
+#_______________________________________________________________________________
+#                 Sessions
+#_______________________________________________________________________________
+
+class KeyService(object):
+    # sessions are TreeWalk's on the shared tree (a path and answers, each);
+    # every answer or step back is one lookup.
+
+    def __init__(self, tree, max_sessions: int = 100000):
+        self.tree = tree.Compile()
+        self.sessions = {}
+        self.max_sessions = max_sessions
+
+    def State(self, walk, session = None):
+        state = walk.State()
+        state["token"] = walk.Serialize()
+        if session is not None:
+            state["session"] = session
+        return state
+
+    def Handle(self, method, path, query):
+        # route a request; returns (status, body)
+        parts = [part for part in path.split("/") if part != ""]
+
+        if (method == "GET") and (len(parts) == 0):
+            return 200, {"meta": {str(key): str(value) for key, value in (self.tree.meta or {}).items()}, \
+                         "steps": len(self.tree.steps), \
+                         "sessions": len(self.sessions)}
+
+        if (method == "GET") and (parts == ["walk"]):
+            answers = [answer for answer in query.get("answers", [""])[0].split(",") if answer != ""]
+            return 200, self.State(QGT.TreeWalk(self.tree, answers))
+
+        if (len(parts) == 0) or (parts[0] != "session"):
+            return 404, {"error": f"unknown path {path}"}
+
+        if (method == "POST") and (len(parts) == 1):
+            if len(self.sessions) >= self.max_sessions:
+                # forget the oldest
+                self.sessions.pop(next(iter(self.sessions)))
+            token = query.get("token", [None])[0]
+            walk = QGT.TreeWalk(self.tree) if token is None \
+                   else QGT.TreeWalk.Deserialize(self.tree, token)
+            session = SEC.token_urlsafe(8)
+            self.sessions[session] = walk
+            return 201, self.State(walk, session)
+
+        session = parts[1] if len(parts) > 1 else None
+        if session not in self.sessions:
+            return 404, {"error": f"unknown session {session}"}
+        walk = self.sessions[session]
+
+        if (method == "GET") and (len(parts) == 2):
+            pass
+        elif (method == "POST") and (len(parts) == 4) and (parts[2] == "answer"):
+            walk.Answer(parts[3])
+        elif (method == "POST") and (len(parts) == 3) and (parts[2] == "back"):
+            walk.Back()
+        else:
+            return 404, {"error": f"unknown path {path}"}
+
+        return 200, self.State(walk, session)
+
+
+#_______________________________________________________________________________
+#                 HTTP
+#_______________________________________________________________________________
+# a minimal HTTP/1.1 server (with keep-alive), to avoid extra dependencies
+
+def ErrorMessage(error):
+    # the message of a failed request
+    # (a KeyError's str() is the repr of its key, quotes included)
+    if isinstance(error, KeyError) and (len(error.args) > 0):
+        return str(error.args[0])
+    return str(error)
+
+async def ServeConnection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, value = line.decode("latin-1").split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            if int(headers.get("content-length", 0)) > 0:
+                await reader.readexactly(int(headers["content-length"]))
+
+            url = urlsplit(target)
+            try:
+                status, body = service.Handle(method, url.path, parse_qs(url.query))
+            except (KeyError, ValueError) as error:
+                status, body = 400, {"error": ErrorMessage(error)}
+
+            payload = JSON.dumps(body, ensure_ascii = False).encode("utf-8")
+            keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+            writer.write((f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n" \
+                          "Content-Type: application/json; charset=utf-8\r\n" \
+                          f"Content-Length: {len(payload)}\r\n" \
+                          f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n" \
+                          "\r\n").encode("latin-1") + payload)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, AIO.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def Serve(service, host: str = "127.0.0.1", port: int = 8642):
+    server = await AIO.start_server(lambda reader, writer: ServeConnection(service, reader, writer), \
+                                    host, port, backlog = 1024)
+    print(f"serving {len(service.tree.steps)} steps on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+
+#_______________________________________________________________________________
+#                 Mission Control
+#_______________________________________________________________________________
+
+if __name__ == "__main__":
+    parser = ARG.ArgumentParser(description = "serve a decision tree for walking")
+    parser.add_argument("csv_path", nargs = "?", default = "./sleutels/Heidesleutel_digitaal_werkversie.csv")
+    parser.add_argument("--header", type = int, default = 4)
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8642)
+    arguments = parser.parse_args()
+
+    tree = QGT.DecisionTree.from_csv(arguments.csv_path, sep = ",", header = arguments.header, \
+                                     compact = True, cache_dir = "./.tree_cache")
+    AIO.run(Serve(KeyService(tree), host = arguments.host, port = arguments.port))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+Load test for a local KeyService instance:
+many clients walk the key concurrently, choosing random answers.
+
+    python KeyService.py &
+    python KeyServiceLoadTest.py --clients 200 --walks 20 --port 8642
+"""
+
+import argparse as ARG
+import asyncio as AIO
+import json as JSON
+import random as RND
+import time as TI
+
+
+async def Request(reader, writer, method, path):
+    # one request on a keep-alive connection; returns (status, body, seconds)
+    start = TI.perf_counter()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: 0\r\n\r\n" \
+                 .encode("latin-1"))
+    await writer.drain()
+
+    status = int((await reader.readline()).split(b" ")[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, value = line.decode("latin-1").split(":", 1)
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    body = JSON.loads(await reader.readexactly(length))
+    return status, body, TI.perf_counter() - start
+
+
+async def Client(host, port, n_walks, latencies, errors):
+    reader, writer = await AIO.open_connection(host, port)
+    for _ in range(n_walks):
+        status, state, seconds = await Request(reader, writer, "POST", "/session")
+        latencies.append(seconds)
+        session = state["session"]
+        while state["classification"] is None:
+            answers = state["question"]["answers"]
+            if RND.random() < 0.1 and len(state["answers"]) > 0:
+                path = f"/session/{session}/back"
+            else:
+                path = f"/session/{session}/answer/{RND.choice(answers)['answer_idx']}"
+            status, state, seconds = await Request(reader, writer, "POST", path)
+            latencies.append(seconds)
+            if status != 200:
+                errors.append((status, state))
+                break
+    writer.close()
+
+
+async def LoadTest(host = "127.0.0.1", port = 8642, n_clients = 100, n_walks = 10):
+    latencies, errors = [], []
+    start = TI.perf_counter()
+    await AIO.gather(*[Client(host, port, n_walks, latencies, errors) for _ in range(n_clients)])
+    duration = TI.perf_counter() - start
+
+    latencies.sort()
+    quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{n_clients} clients x {n_walks} walks: {len(latencies)} requests in {duration:.2f}s" \
+          f" ({len(latencies) / duration:.0f}/s), {len(errors)} errors")
+    print(f"latency ms: p50 {quantile(0.5):.2f}, p95 {quantile(0.95):.2f}, p99 {quantile(0.99):.2f}")
+    return latencies, errors
+
+
+if __name__ == "__main__":
+    parser = ARG.ArgumentParser(description = "load test a local KeyService")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8642)
+    parser.add_argument("--clients", type = int, default = 100)
+    parser.add_argument("--walks", type = int, default = 10)
+    arguments = parser.parse_args()
+
+    AIO.run(LoadTest(host = arguments.host, port = arguments.port, \
+                     n_clients = arguments.clients, n_walks = arguments.walks))
@@ -28,11 +28,31 @@ Thank you for the programming task.
 #_______________________________________________________________________________
 # We build on the concepts of others.
 
-from collections.abc import Callable # for typestrings
+from collections.abc import Callable, Iterable # for typestrings
+from collections import OrderedDict # least recently used trees
+from types import MappingProxyType # read-only dicts
+from itertools import accumulate
+import bisect as BI # sorted insertion
+from functools import lru_cache # memoization
+import array as AR # compact typed arrays
+import csv as CSV # pandas-free reading
+import hashlib as HL # content hashing
+import math as MATH
+import os as OS
+import io as IO
+import pickle as PKL # tree cache
 import re as RE # regular expressions
-import numpy as NP
-import pandas as PD
-from difflib import SequenceMatcher # substring matching
+import threading as TH # building derived structures once
+import time as TI # polling (DecisionTree.Watch)
+
+# numpy and pandas take long to import;
+# they are imported only where data frames are used.
+# (budget: `python -X importtime -c "import QGISDecisionTrees"` stays below 50ms;
+#  measured 25-40ms including stdlib, where it took ~530ms with numpy and pandas)
+
+# pyarrow is an optional dependency, imported where it is used:
+# only Parquet/Arrow keys need it (`from_parquet`, `from_arrow`, `KeyTable`),
+# not csv, .xlsx and .ods keys. (`pip install pyarrow`)
 
 """
 ## Reference Collection:
@@ -46,6 +66,11 @@ from difflib import SequenceMatcher # substring matching
 """
 
 
+# increase whenever a change to the code alters the trees built from a file;
+# this invalidates all cached trees (see `DecisionTree.from_csv`)
+PARSER_VERSION = 7
+
+
 #_______________________________________________________________________________
 #                 Little Helpers
 #_______________________________________________________________________________
@@ -54,6 +79,128 @@ from difflib import SequenceMatcher # substring matching
 # get a subset of rows by type
 RowsByType = lambda df, typ, typcol = "type": df.loc[df[typcol].values == typ, :]
 
+def SplitBlocks(data):
+    # split the data into per-step and per-type blocks, in one group-by pass
+    # returns {step: {type: [(row_index, record), ...]}}
+    # where each record is a {column: str(value)} dict (missing values are "nan")
+
+    columns = list(data.columns)
+    values = data.values
+    index = data.index.tolist()
+
+    blocks = {}
+    for (step, typ), positions \
+            in data.groupby(["step", "type"], sort = False).indices.items():
+        blocks.setdefault(step, {})[typ] = \
+            [(index[pos], dict(zip(columns, map(str, values[pos])))) \
+             for pos in positions]
+
+    return blocks
+
+# pandas.read_csv default missing values
+NA_VALUES = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", \
+             "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", \
+             "n/a", "nan", "null"}
+
+# step ids: a number, possibly with letters ("12", "60A")
+STEP_PATTERN = RE.compile(r"\d+[A-Z]*")
+
+def StronglyConnected(successors):
+    # strongly connected components of a graph (Tarjan's algorithm, iterative)
+    # `successors[v]` lists the targets of vertex `v`; vertices are 0, 1, ...
+    # returns a list of components (lists of vertices)
+    n_vertices = len(successors)
+    index = [-1] * n_vertices
+    lowlink = [0] * n_vertices
+    on_stack = [False] * n_vertices
+    stack = []
+    components = []
+    counter = 0
+
+    for start in range(n_vertices):
+        if index[start] >= 0:
+            continue
+
+        # depth first, with an explicit stack of (vertex, next successor position)
+        work = [(start, 0)]
+        while len(work) > 0:
+            vertex, position = work.pop()
+            if position == 0:
+                index[vertex] = lowlink[vertex] = counter
+                counter += 1
+                stack.append(vertex)
+                on_stack[vertex] = True
+
+            recurse = False
+            for pos in range(position, len(successors[vertex])):
+                target = successors[vertex][pos]
+                if index[target] < 0:
+                    work.append((vertex, pos + 1))
+                    work.append((target, 0))
+                    recurse = True
+                    break
+                if on_stack[target]:
+                    lowlink[vertex] = min(lowlink[vertex], index[target])
+            if recurse:
+                continue
+
+            # all successors done
+            if lowlink[vertex] == index[vertex]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == vertex:
+                        break
+                components.append(component)
+
+            if len(work) > 0:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[vertex])
+
+    return components
+
+# trees are sent to pool processes only once (see DecisionTree.ApplyToNodes)
+worker_tree = None
+def SetWorkerTree(tree):
+    global worker_tree
+    worker_tree = tree
+
+def ApplyInWorker(apply_function, step):
+    return apply_function(worker_tree[step])
+
+# keys are loaded in pool processes (see DecisionForest)
+def LoadInWorker(csv_path, kwargs):
+    return csv_path, DecisionTree.from_csv(csv_path, compact = True, **kwargs)
+
+# trees are compiled one at a time (see DecisionTree.Compile)
+compile_lock = TH.Lock()
+
+# bitsets, as rows of uint64 words (see ReachabilityIndex)
+def SetBit(bits, position):
+    bits[position >> 6] |= type(bits[0])(1 << (position & 63))
+
+def TestBit(bits, position):
+    return bool((int(bits[position >> 6]) >> (position & 63)) & 1)
+
+def BitIndices(bits, n_bits):
+    import numpy as NP
+    return NP.flatnonzero(NP.unpackbits(bits.view(NP.uint8), bitorder = "little")[:n_bits]).tolist()
+
+def DotQuote(text):
+    # a quoted DOT identifier
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def FrozenArray(typecode, values):
+    # a compact, typed, read-only array
+    # (stdlib `array`; NumPy can wrap it without copying: `NP.asarray(frozen)`)
+    return memoryview(AR.array(typecode, values)).toreadonly()
+
+def GetTab(clade_idx):
+    # the tab of a clade is its top level ("50>>60A" -> "50")
+    return clade_idx.split(">>")[0]
+
 def CutString(string, length):
     if len(string) <= length-5:
         return string
@@ -61,42 +208,969 @@ def CutString(string, length):
         return(string[:length-5] + "[...]")
 
 def ExtractClades(data):
+    import numpy as NP
+
     # data contains "chapters", clades, subgroups.
     # These should better be added as a category.
     # Storing in a dict <- {"clade_idx": "label"}
 
-    # assemble clades as a dictionary
-    clades = {}
-    data["clade"] = NP.nan
-    data["clade"] = data["clade"].astype(str)
+    # This works column-wise: the T1/T2 header rows are boundaries,
+    # and every other row belongs to the last header above it.
 
-    current = str(0)
-    current_t1 = None
+    types = data["type"].values
+    steps = data["step"].astype(str).values.astype(object)
+    is_t1 = types == "T1"
+    is_t2 = types == "T2"
+    is_header = is_t1 | is_t2
 
-    clades[current] = ""
+    # the T1 clade in which each row lies
+    # (a cumulative T1 counter forward-fills the last T1 step)
+    t1_step = NP.array([None, *steps[is_t1]], dtype = object)[NP.cumsum(is_t1)]
 
+    # clade index of each header: "T1" or "T1>>T2"
+    clade = NP.full(len(data), NP.nan, dtype = object)
+    clade[is_t1] = steps[is_t1]
+    clade[is_t2] = t1_step[is_t2] + ">>" + steps[is_t2]
 
-    for idx, row in data.iterrows():
-        # print(idx, current, clades[current])
-        if row["type"] == "T1":
-            # add a new entry to clade
-            current = current_t1 = str(row["step"])
-            clades[current] = row["name"].strip()
-            # print("T1", current, clades[current])
-            continue
+    # header count increases cumulatively; each block inherits its header
+    # (rows before the first header belong to clade "0")
+    block = NP.cumsum(is_header)
+    headers = NP.array(["0", *clade[is_header]], dtype = object)
+    data["clade"] = headers[block]
+    # the header rows themselves are not linked to a clade
+    data.loc[is_header, "clade"] = "nan"
 
-        if row["type"] == "T2":
+    # assemble clades as a dictionary
+    # (only the few header rows need a label)
+    clades = {"0": ""}
+    for clade_idx, typ, t1, name in zip(clade[is_header], \
+                                        types[is_header], \
+                                        t1_step[is_header], \
+                                        data["name"].values[is_header]):
+        if typ == "T1":
+            clades[clade_idx] = name.strip()
+        else:
             # add extra clade description
-            current = current_t1 + ">>"+ str(row["step"])
+            clades[clade_idx] = clades[t1] + " // " + CutString(name, 60).strip()
+
+    return data, clades
+
+
+
+#_______________________________________________________________________________
+#                 Reading Keys
+#_______________________________________________________________________________
+# Keys are read line by line, with the csv module, as pandas.read_csv would
+# (but without type inference: all values remain text, missing values are "nan").
+# The meta info block and the data come in a single pass, and steps are
+# handed to the tree one by one, so a key never needs to be held as a whole table.
+
+class KeyStream(object):
+    # On construction, the meta info block and column names are read.
+    # Iterating yields (step, {type: [(row_index, record), ...]}) per step,
+    # in the shape of SplitBlocks; meanwhile spacing rows are dropped
+    # and clades are collected in `self.clades` (as in ExtractClades).
+
+    def __init__(self, stream, sep: str = ",", header: int = 0, rows: Iterable = None):
+        # `stream` is a text file object (opened with newline = "")
+        # alternatively, `rows` of cell texts can be given (e.g. from a spreadsheet)
+        if rows is None:
+            rows = CSV.reader(stream, delimiter = sep)
+
+        # blank lines are skipped, as in pandas
+        self.lines = (line for line in rows if len(line) > 0)
+
+        # the meta info block on top
+        self.meta = None
+        if header > 0:
+            self.meta = {}
+            for _, line in zip(range(header), self.lines):
+                key, value = [*line, "", ""][:2]
+                self.meta[float("nan") if key in NA_VALUES else key] = \
+                    float("nan") if value in NA_VALUES else value
+
+        # column names
+        self.columns = [col.lower() for col in next(self.lines)]
+
+        # clades, filled while iterating
+        self.clades = {"0": ""}
+
+    def Records(self):
+        # yield (row_index, record) for each data line
+        n_columns = len(self.columns)
+        for idx, line in enumerate(self.lines):
+            line = [*line, *([""] * (n_columns - len(line)))]
+            yield idx, {col: "nan" if value in NA_VALUES else value \
+                        for col, value in zip(self.columns, line)}
+
+    def __iter__(self):
+        current = "0"
+        current_t1 = None
+        step, blocks = None, {}
+
+        for idx, record in self.Records():
+            # group into clades
+            if record["type"] == "T1":
+                current = current_t1 = record["step"]
+                self.clades[current] = record["name"].strip()
+                record["clade"] = "nan"
+            elif record["type"] == "T2":
+                current = current_t1 + ">>" + record["step"]
+                self.clades[current] = self.clades[current_t1] + " // " \
+                                       + CutString(record["name"], 60).strip()
+                record["clade"] = "nan"
+            else:
+                record["clade"] = current
+
+            # remove spacing rows
+            if (record["step"] == "nan") or (record["type"] == "nan"):
+                continue
 
-            clades[current] = clades[current_t1] + " // " + CutString(row["name"], 60).strip()
-            # print("    T2", current, current_t1, clades[current])
+            for col in ["step", "next_step"]:
+                # ensure that these are the same data type
+                record[col] = record[col].strip().upper()
+
+            # a step is complete once the next one starts
+            if record["step"] != step:
+                if step is not None:
+                    yield step, blocks
+                step, blocks = record["step"], {}
+            blocks.setdefault(record["type"], []).append((idx, record))
+
+        if step is not None:
+            yield step, blocks
+
+
+def FrameSteps(data):
+    # the per-step blocks of a data frame (see SplitBlocks),
+    # after the clean-up which KeyStream does line by line
+    # columns: step, type, name, next_step, classification, bwk_code, subkey, remark(, clade)
+
+    # lower all column names
+    data.rename(columns = {col: col.lower() for col in data.columns}, inplace = True)
+
+    # remove spacing rows
+    data.dropna(subset = ["step", "type"], inplace = True)
+
+    # data["step"] = data["step"].astype(int) # does not work: things like "12A"
+    for col in ["step", "next_step"]:
+        # ensure that these are the same data type
+        data[col] = [str(val).strip().upper() for val in data[col].values]
+    # print(data.sample(3).T)
+
+    # split rows by step and type (in one pass)
+    return SplitBlocks(data).items()
+
+
+def MergeBlocks(blocks, more_blocks):
+    # append the rows of a step which recurs further down
+    merged = {typ: list(block) for typ, block in blocks.items()}
+    for typ, block in more_blocks.items():
+        merged.setdefault(typ, []).extend(block)
+    return merged
+
+
+def CollectSteps(steps):
+    # gather (step, blocks) pairs into {step: blocks}, in order of appearance
+    # (should a step recur further down, its rows are appended)
+    step_blocks = {}
+    for step, blocks in steps:
+        if step in step_blocks:
+            blocks = MergeBlocks(step_blocks[step], blocks)
+        step_blocks[step] = blocks
+    return step_blocks
+
+
+# file types which are not read as csv
+FILE_ENGINES = {".parquet": "parquet", ".xlsx": "spreadsheet", ".xlsm": "spreadsheet", \
+                ".ods": "spreadsheet"}
+
+def CsvSteps(csv_path: str, encoding: str = "utf-8", **reader_kwargs):
+    # a generator which first yields the KeyStream of a csv file (with meta info),
+    # then the steps, read from the file while iterating; the file is closed at the end
+    with open(csv_path, "r", newline = "", encoding = encoding) as csv_file:
+        key = KeyStream(csv_file, **reader_kwargs)
+        yield key
+        yield from key
+
+
+def StreamKey(csv_path: str, *args, engine: str = None, **kwargs):
+    # open a key file (see DecisionTree.from_csv for the arguments)
+    # returns (meta, clades, steps), where steps is an iterable of
+    #     (step, {type: [(row_index, record), ...]}) which is read while iterating
+    # (csv files and spreadsheets are streamed; clades are complete once all steps are read)
+    if engine is None:
+        engine = FILE_ENGINES.get(OS.path.splitext(csv_path)[1].lower(), None)
+    if engine is None:
+        engine = "csv" if (len(args) == 0) \
+            and set(kwargs.keys()) <= {"sep", "header", "encoding"} \
+            else "pandas"
+
+    if engine == "parquet":
+        import pyarrow.parquet as PQ
+        table = PQ.read_table(csv_path, *args, **kwargs)
+        clades, step_blocks = ArrowSteps(table)
+        return ArrowMeta(table), clades, step_blocks.items()
+
+    if engine == "spreadsheet":
+        key = KeyStream(None, header = kwargs.pop("header", 0), \
+                        rows = SpreadsheetRows(csv_path, *args, **kwargs))
+        return key.meta, key.clades, key
+
+    if engine == "csv":
+        # read meta info and column names; the steps follow
+        steps = CsvSteps(csv_path, **kwargs)
+        key = next(steps)
+        return key.meta, key.clades, steps
+
+    import pandas as PD
+    reader_kwargs = {key: kwargs.pop(key) for key in ["sep", "header"] if key in kwargs}
+    with open(csv_path, "r", newline = "", encoding = kwargs.pop("encoding", "utf-8")) as csv_file:
+        # read meta info and column names
+        key = KeyStream(csv_file, **reader_kwargs)
+
+        # read data, where the KeyStream left off
+        data = PD.read_csv(csv_file, *args, header = None, names = key.columns, \
+                           sep = reader_kwargs.get("sep", ","), **kwargs)
+
+    # group into clades
+    data, clades = ExtractClades(data)
+    return key.meta, clades, FrameSteps(data)
+
+
+def ReadKey(csv_path: str, *args, engine: str = None, **kwargs):
+    # read a key file as a whole (e.g. to compare it to a tree; see DecisionTree.Reload)
+    # returns (meta, clades, {step: {type: [(row_index, record), ...]}})
+    meta, clades, steps = StreamKey(csv_path, *args, engine = engine, **kwargs)
+    step_blocks = CollectSteps(steps)
+    return meta, clades, step_blocks
+
+
+def BlockDigest(blocks):
+    # a fingerprint of the rows of one step (including row indices and clade),
+    # to tell which steps changed when a key file is read again
+    # (records hold strings only; fields are joined with ASCII unit/record separators)
+    rows = "\x1e".join(f"{typ}\x1f{idx}\x1f" + "\x1f".join(record.values()) \
+                       for typ, block in sorted(blocks.items()) for idx, record in block)
+    return HL.blake2b(rows.encode("utf-8"), digest_size = 16).hexdigest()
+
+
+def NextSteps(blocks):
+    # the next_step of all rows of a step
+    return set(record["next_step"] for block in blocks.values() for _, record in block)
+
+
+def FindRelinks(steps, next_steps):
+    # links to "60" are meant for a loose "60A", if there is no step "60" with predecessors
+    # (`steps` in order of appearance; the first loose step of each number wins)
+    # returns {next_step: loose step}
+    no_predecessor = set([step for step in steps \
+                      if step not in next_steps \
+                      ])
+    if len(steps) > 0:
+        no_predecessor.discard(steps[0])
+
+    relink = {}
+    for npred in sorted(no_predecessor):
+        letterless_index = RE.sub(r"\D", "", npred)
+        if npred == letterless_index: continue
+        relink.setdefault(letterless_index, npred)
+    return relink
+
+
+def ApplyRelinks(answers, relink):
+    # rewrite the links of answer records, in one pass
+    # returns {(from, to): n_links}; the adjustments are reported by `Validate()`
+    adjusted = {link: 0 for link in relink.items()}
+    for record in answers:
+        npred = relink.get(record["next_step"], None)
+        if npred is not None:
+            adjusted[(record["next_step"], npred)] += 1
+            record["next_step"] = npred
+    return adjusted
+
+
+
+#_______________________________________________________________________________
+#                 Other Formats
+#_______________________________________________________________________________
+# Keys kept in spreadsheets are read without extra libraries:
+# .xlsx and .ods files are zip archives of xml, which is parsed row by row.
+# Merged cells are split up on the way: each cell of a merged range gets its value.
+# Keys as Arrow tables (or Parquet files) are cleaned up column by column;
+# the meta info block is kept in the schema metadata (see KeyTable).
+# Their rows still become one record per row, as those of a csv file,
+# since the nodes hold answers as records: building a tree from Arrow
+# is no faster than from csv. These formats are for exchange, not for speed.
+
+def ColumnIndex(letters):
+    # "A" -> 0, "AB" -> 27
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+def CellPosition(reference):
+    # "B5" -> (4, 1): zero-based row and column
+    letters = reference.rstrip("0123456789")
+    return int(reference[len(letters):]) - 1, ColumnIndex(letters)
+
+def XlsxRows(path: str, sheet = 0):
+    # the rows of an .xlsx sheet (by number or name), as lists of cell texts
+    import zipfile as ZIP
+    import xml.etree.ElementTree as ET
+    ns = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main", \
+          "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships", \
+          "p": "http://schemas.openxmlformats.org/package/2006/relationships"}
+    tag = lambda name: f"{{{ns['m']}}}{name}"
+
+    with ZIP.ZipFile(path) as archive:
+        # find the sheet
+        sheets = ET.fromstring(archive.read("xl/workbook.xml")).find("m:sheets", ns)
+        sheets = [(entry.get("name"), entry.get(f"{{{ns['r']}}}id")) for entry in sheets]
+        relation = sheets[sheet][1] if isinstance(sheet, int) else dict(sheets)[sheet]
+        targets = {entry.get("Id"): entry.get("Target") for entry \
+                   in ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))}
+        target = targets[relation]
+        sheet_path = target.lstrip("/") if target.startswith("/") else "xl/" + target
+
+        # shared strings (rich text runs are joined)
+        strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            for _, element in ET.iterparse(IO.BytesIO(archive.read("xl/sharedStrings.xml"))):
+                if element.tag == tag("si"):
+                    strings.append("".join(text.text or "" for text in element.iter(tag("t"))))
+                    element.clear()
+
+        data = archive.read(sheet_path)
+
+    # merged ranges are listed after the cells: find them first
+    merges = {}
+    for reference in RE.findall(rb'<(?:\w+:)?mergeCell\s+ref="([A-Z]+\d+:[A-Z]+\d+)"', \
+                                data[data.rfind(b"sheetData>"):]):
+        first, last = reference.decode("ascii").split(":")
+        merges[CellPosition(first)] = CellPosition(last)
+
+    fill = {} # {row: {column: value}} of merged ranges
+    next_row = None
+    row_tag, cell_tag, value_tag, text_tag = map(tag, ["row", "c", "v", "t"])
+    for _, element in ET.iterparse(IO.BytesIO(data)):
+        if element.tag != row_tag:
             continue
+        row_nr = int(element.get("r")) - 1
+
+        # empty rows are not stored; csv exports keep them
+        if next_row is not None:
+            for _ in range(next_row, row_nr):
+                yield [""]
+        next_row = row_nr + 1
+
+        cells = {}
+        for cell in element.iter(cell_tag):
+            _, column = CellPosition(cell.get("r"))
+            kind = cell.get("t", "n")
+            if kind == "inlineStr":
+                value = "".join(text.text or "" for text in cell.iter(text_tag))
+            else:
+                value = next((child.text or "" for child in cell if child.tag == value_tag), "")
+                if kind == "s":
+                    value = strings[int(value)]
+                elif (kind == "b") and (value != ""):
+                    value = "TRUE" if value == "1" else "FALSE"
+            cells[column] = value
+
+            # remember merged values for the cells below and aside
+            if (row_nr, column) in merges:
+                last_row, last_column = merges[(row_nr, column)]
+                for fill_row in range(row_nr + 1, last_row + 1):
+                    fill.setdefault(fill_row, {}).update( \
+                        {fill_column: value for fill_column in range(column, last_column + 1)})
+                cells.update({fill_column: value for fill_column in range(column + 1, last_column + 1)})
+        element.clear()
+
+        cells.update(fill.pop(row_nr, {}))
+        yield [cells.get(column, "") for column in range(max(cells.keys(), default = 0) + 1)]
+
+def OdsText(cell, ns):
+    # the text of an .ods cell (paragraphs on separate lines; spaces restored)
+    paragraphs = []
+    for paragraph in cell.iter(f"{{{ns['text']}}}p"):
+        parts = [paragraph.text or ""]
+        for child in paragraph.iter():
+            if child is paragraph:
+                continue
+            if child.tag == f"{{{ns['text']}}}s":
+                parts.append(" " * int(child.get(f"{{{ns['text']}}}c", "1")))
+            elif child.tag == f"{{{ns['text']}}}tab":
+                parts.append("\t")
+            elif child.text:
+                parts.append(child.text)
+            parts.append(child.tail or "")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs)
+
+def OdsRows(path: str, sheet = 0):
+    # the rows of an .ods sheet (by number or name), as lists of cell texts
+    import zipfile as ZIP
+    import xml.etree.ElementTree as ET
+    ns = {"table": "urn:oasis:names:tc:opendocument:xmlns:table:1.0", \
+          "office": "urn:oasis:names:tc:opendocument:xmlns:office:1.0", \
+          "text": "urn:oasis:names:tc:opendocument:xmlns:text:1.0"}
+    tag = lambda prefix, name: f"{{{ns[prefix]}}}{name}"
+    table_tag, row_tag, cell_tag, covered_tag, repeat_tag = \
+        tag("table", "table"), tag("table", "table-row"), tag("table", "table-cell"), \
+        tag("table", "covered-table-cell"), tag("table", "number-columns-repeated")
+
+    with ZIP.ZipFile(path) as archive:
+        content = archive.open("content.xml")
+
+        n_table = -1
+        in_sheet = False
+        row_nr = 0
+        n_empty = 0
+        fill = {} # {row: {column: value}} of merged ranges
+        for event, element in ET.iterparse(content, events = ("start", "end")):
+            if element.tag == table_tag:
+                if event == "start":
+                    n_table += 1
+                    in_sheet = (sheet == n_table) if isinstance(sheet, int) \
+                               else (element.get(tag("table", "name")) == sheet)
+                elif in_sheet:
+                    break
+                continue
+            if (event != "end") or (element.tag != row_tag):
+                continue
+            if not in_sheet:
+                element.clear()
+                continue
 
-        # link the row to a clade
-        data.loc[idx, "clade"] = current
+            # (sheets are padded with huge repeats of empty cells and rows:
+            #  those are only passed on if more content follows)
+            cells = []
+            n_blank = 0
+            for cell in element:
+                repeat = int(cell.get(repeat_tag, "1"))
+                if cell.tag == covered_tag:
+                    n_blank += repeat
+                    continue
+                if cell.tag != cell_tag:
+                    continue
+                kind = cell.get(tag("office", "value-type"), None)
+                value = cell.get(tag("office", "value")) if kind in ("float", "percentage", "currency") \
+                        else OdsText(cell, ns)
+                value = "" if value is None else value
+
+                # remember merged values for the cells below and aside
+                n_rows = int(cell.get(tag("table", "number-rows-spanned"), "1"))
+                n_columns = int(cell.get(tag("table", "number-columns-spanned"), "1"))
+                column = len(cells) + n_blank
+                for fill_row in range(row_nr, row_nr + n_rows):
+                    for fill_column in range(column, column + n_columns):
+                        if (fill_row, fill_column) != (row_nr, column):
+                            fill.setdefault(fill_row, {})[fill_column] = value
+
+                if value == "":
+                    n_blank += repeat
+                    continue
+                cells.extend([""] * n_blank + [value] * repeat)
+                n_blank = 0
+
+            row_repeat = int(element.get(tag("table", "number-rows-repeated"), "1"))
+            element.clear()
+
+            if (len(cells) == 0) and not any(row_nr <= fill_row < row_nr + row_repeat \
+                                             for fill_row in fill.keys()):
+                n_empty += row_repeat
+                row_nr += row_repeat
+                continue
 
-    return data, clades
+            for _ in range(row_repeat):
+                row = list(cells)
+                for column, value in sorted(fill.pop(row_nr, {}).items()):
+                    row.extend([""] * (column + 1 - len(row)))
+                    row[column] = value
+                row_nr += 1
+
+                while (len(row) > 0) and (row[-1] == ""):
+                    row.pop()
+                if len(row) == 0:
+                    n_empty += 1
+                    continue
+                for _ in range(n_empty):
+                    yield [""]
+                n_empty = 0
+                yield row
+
+def SpreadsheetRows(path: str, sheet = 0):
+    # the rows of a spreadsheet (.xlsx or .ods), with merged cells split up
+    if path.lower().endswith(".ods"):
+        return OdsRows(path, sheet)
+    return XlsxRows(path, sheet)
+
+
+def ArrowMeta(table):
+    # the meta info block of a key table (see KeyTable); None if there is none
+    import json as JSON
+    metadata = table.schema.metadata or {}
+    if b"key_meta" not in metadata:
+        return None
+    meta_rows = JSON.loads(metadata[b"key_meta"])
+    return KeyStream(None, header = len(meta_rows), \
+                     rows = [*meta_rows, table.column_names]).meta
+
+def ArrowSteps(table):
+    # the per-step blocks of an Arrow table (see KeyStream), cleaned column by column
+    # returns (clades, {step: {type: [(row_index, record), ...]}})
+    # (the columns are converted to Python, to make the records)
+    # (requires the optional pyarrow)
+    import pyarrow as PA
+    import pyarrow.compute as PC
+
+    columns = [name.lower() for name in table.column_names]
+    missing = PA.array(sorted(NA_VALUES), type = PA.string())
+    values = {}
+    for name, column in zip(columns, table.columns):
+        column = PC.cast(column, PA.string())
+        column = PC.fill_null(PC.if_else(PC.is_in(column, value_set = missing), None, column), "nan")
+        values[name] = column
+
+    # clades, from the header rows (as in KeyStream)
+    types = values["type"].to_pylist()
+    steps = values["step"].to_pylist()
+    names = values["name"].to_pylist()
+    clades = {"0": ""}
+    clade = []
+    current = "0"
+    current_t1 = None
+    for typ, step, name in zip(types, steps, names):
+        if typ == "T1":
+            current = current_t1 = step
+            clades[current] = name.strip()
+            clade.append("nan")
+        elif typ == "T2":
+            current = current_t1 + ">>" + step
+            clades[current] = clades[current_t1] + " // " + CutString(name, 60).strip()
+            clade.append("nan")
+        else:
+            clade.append(current)
+
+    # all but the spacing rows
+    keep = PC.and_(PC.not_equal(values["step"], "nan"), PC.not_equal(values["type"], "nan"))
+
+    for name in ["step", "next_step"]:
+        # ensure that these are the same data type
+        values[name] = PC.utf8_upper(PC.utf8_trim_whitespace(values[name]))
+
+    # the records
+    row_index = PC.indices_nonzero(keep).to_pylist()
+    columns = [*columns, "clade"]
+    values = [values[name].filter(keep).to_pylist() for name in columns[:-1]] \
+             + [[clade[idx] for idx in row_index]]
+
+    step_blocks = {}
+    for idx, row in zip(row_index, zip(*values)):
+        record = dict(zip(columns, row))
+        step_blocks.setdefault(record["step"], {}).setdefault(record["type"], []).append((idx, record))
+
+    return clades, step_blocks
+
+def KeyTable(path: str, *args, **kwargs):
+    # a key file (csv or spreadsheet) as an Arrow table of text columns,
+    # with the meta info block in the schema metadata
+    # e.g. `pyarrow.parquet.write_table(KeyTable("key.csv", header = 4), "key.parquet")`
+    # (requires the optional pyarrow)
+    import json as JSON
+    import pyarrow as PA
+
+    header = kwargs.pop("header", 0)
+    if FILE_ENGINES.get(OS.path.splitext(path)[1].lower(), None) == "spreadsheet":
+        rows = list(SpreadsheetRows(path, *args, **kwargs))
+    else:
+        with open(path, "r", newline = "", encoding = kwargs.pop("encoding", "utf-8")) as csv_file:
+            rows = list(CSV.reader(csv_file, delimiter = kwargs.pop("sep", ",")))
+    rows = [row for row in rows if len(row) > 0]
+
+    meta_rows = rows[:header]
+    columns = rows[header]
+    data = [[*row, *([""] * (len(columns) - len(row)))] for row in rows[header + 1:]]
+    table = PA.table({column: PA.array([row[nr] for row in data], type = PA.string()) \
+                      for nr, column in enumerate(columns)})
+    return table.replace_schema_metadata({"key_meta": JSON.dumps(meta_rows)})
+
+
+
+#_______________________________________________________________________________
+#                 Tree Cache
+#_______________________________________________________________________________
+# Parsing is slow, files rarely change. Store the built trees as pickles:
+#     <cache_dir>/<source hash>_<content hash>.pickle
+# The source hash covers the file path and loader arguments,
+# the content hash covers file content and PARSER_VERSION.
+
+def CacheFile(cache_dir, csv_path, arguments):
+    # the cache file for a given csv file content and loader arguments
+    source = repr((OS.path.abspath(csv_path), arguments))
+    source_hash = HL.sha256(source.encode("utf-8")).hexdigest()[:16]
+    with open(csv_path, "rb") as csv_file:
+        content_hash = HL.file_digest(csv_file, "sha256")
+    content_hash.update(repr(PARSER_VERSION).encode("utf-8"))
+    return OS.path.join(cache_dir, f"{source_hash}_{content_hash.hexdigest()}.pickle")
+
+def LoadCache(cache_file):
+    # load a tree from the cache; returns None if there is no (valid) entry
+    if not OS.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "rb") as cache:
+            version, tree = PKL.load(cache)
+    except Exception:
+        # broken or incompatible cache files are simply rebuilt
+        return None
+    if version != PARSER_VERSION:
+        return None
+    return tree
+
+def StoreCache(cache_file, tree):
+    # store a tree in the cache, replacing outdated entries of the same source
+    cache_dir, filename = OS.path.split(cache_file)
+    OS.makedirs(cache_dir, exist_ok = True)
+    source_hash = filename.split("_")[0]
+    for other in OS.listdir(cache_dir):
+        if other.startswith(source_hash + "_") and (other != filename):
+            OS.remove(OS.path.join(cache_dir, other))
+
+    # write atomically, in case other processes read the cache meanwhile
+    temp_file = f"{cache_file}.{OS.getpid()}.tmp"
+    with open(temp_file, "wb") as cache:
+        PKL.dump((PARSER_VERSION, tree), cache, protocol = PKL.HIGHEST_PROTOCOL)
+    OS.replace(temp_file, cache_file)
+
+
+
+#_______________________________________________________________________________
+#                 Clade Index
+#_______________________________________________________________________________
+# Clades are nested by name: "50" contains "50>>60A".
+# The index holds every clade as an entry of a prefix tree, with its members
+# and those of all its subclades, so that lookups need not scan the nodes.
+
+class CladeIndex(dict):
+    # {clade_idx: {"label": str, "members": [steps], "all_members": [steps],
+    #              "subclades": [clade_idx], "parent": clade_idx or None}}
+    # "members" are the steps of exactly this clade,
+    # "all_members" include the steps of the subclades.
+
+    def __init__(self, clades: dict, node_clades: dict):
+        # clades: {clade_idx: label}, node_clades: {step: clade_idx}
+        super(CladeIndex, self).__init__()
+
+        for clade_idx in [*clades.keys(), *node_clades.values()]:
+            self.AddClade(clade_idx, clades.get(clade_idx, ""))
+
+        for step, clade_idx in node_clades.items():
+            self[clade_idx]["members"].append(step)
+            # climb the prefix tree
+            while clade_idx is not None:
+                self[clade_idx]["all_members"].append(step)
+                clade_idx = self[clade_idx]["parent"]
+
+        # the top level clades ("tabs")
+        self.tabs = sorted(clade_idx for clade_idx, entry in self.items() if entry["parent"] is None)
+
+    def AddClade(self, clade_idx, label):
+        if clade_idx in self.keys():
+            return
+
+        parent = None
+        if ">>" in clade_idx:
+            parent = clade_idx.rsplit(">>", 1)[0]
+            self.AddClade(parent, "")
+            # sorted, as the members: a reloaded index equals a fresh one
+            BI.insort(self[parent]["subclades"], clade_idx)
+
+        self[clade_idx] = {"label": label, "members": [], "all_members": [], \
+                           "subclades": [], "parent": parent}
+
+    def Members(self, clade_idx, subclades: bool = False):
+        # the steps of a clade (optionally including its subclades)
+        return self[clade_idx]["all_members" if subclades else "members"]
+
+    def Copy(self):
+        # an independent copy (entries and member lists), e.g. to be updated
+        index = CladeIndex({}, {})
+        for clade_idx, entry in self.items():
+            index[clade_idx] = {key: list(value) if isinstance(value, list) else value \
+                                for key, value in entry.items()}
+        index.tabs = list(self.tabs)
+        return index
+
+    def Move(self, step, old_clade = None, new_clade = None):
+        # file a step under another clade (None: a step which is new, or gone)
+        # members stay sorted, as with a fresh index of a tree
+        if old_clade is not None:
+            self[old_clade]["members"].remove(step)
+            while old_clade is not None:
+                self[old_clade]["all_members"].remove(step)
+                old_clade = self[old_clade]["parent"]
+
+        if new_clade is not None:
+            self.AddClade(new_clade, "")
+            BI.insort(self[new_clade]["members"], step)
+            while new_clade is not None:
+                BI.insort(self[new_clade]["all_members"], step)
+                new_clade = self[new_clade]["parent"]
+
+    def Relabel(self, clades: dict, clade_indices: Iterable):
+        # take over labels of (new, relabeled, or removed) clades from `clades`
+        for clade_idx in clade_indices:
+            if clade_idx in clades:
+                self.AddClade(clade_idx, clades[clade_idx])
+                self[clade_idx]["label"] = clades[clade_idx]
+            elif (clade_idx in self.keys()) \
+                    and (len(self[clade_idx]["all_members"]) == 0) \
+                    and (len(self[clade_idx]["subclades"]) == 0):
+                parent = self.pop(clade_idx)["parent"]
+                if parent is not None:
+                    self[parent]["subclades"].remove(clade_idx)
+
+        self.tabs = sorted(clade_idx for clade_idx, entry in self.items() if entry["parent"] is None)
+
+    def Freeze(self):
+        # a read-only copy (see FrozenCladeIndex)
+        return FrozenCladeIndex(self)
+
+
+class FrozenCladeIndex(object):
+    # a CladeIndex which cannot be altered, e.g. of a CompactTree:
+    # entries are read-only mappings, member lists are tuples.
+    __slots__ = ["entries", "tabs"]
+
+    def __init__(self, index: CladeIndex):
+        entries = {clade_idx: MappingProxyType({key: tuple(value) if isinstance(value, list) else value \
+                                                for key, value in entry.items()}) \
+                   for clade_idx, entry in index.items()}
+        object.__setattr__(self, "entries", MappingProxyType(entries))
+        object.__setattr__(self, "tabs", tuple(index.tabs))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A FrozenCladeIndex cannot be altered.")
+
+    def __reduce__(self):
+        # (read-only mappings cannot be pickled)
+        return (CladeIndex.Freeze, (self.Copy(), ))
+
+    def Digest(self):
+        # the entries as text, in a fixed order (see CompactTree.content_hash)
+        return repr([(clade_idx, sorted(entry.items())) \
+                     for clade_idx, entry in sorted(self.entries.items())])
+
+    def Copy(self):
+        # an independent, mutable CladeIndex
+        index = CladeIndex({}, {})
+        for clade_idx, entry in self.entries.items():
+            index[clade_idx] = {key: list(value) if isinstance(value, tuple) else value \
+                                for key, value in entry.items()}
+        index.tabs = list(self.tabs)
+        return index
+
+    Members = CladeIndex.Members
+
+    # mapping interface
+    def __getitem__(self, clade_idx):
+        return self.entries[clade_idx]
+
+    def __contains__(self, clade_idx):
+        return clade_idx in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def items(self):
+        return self.entries.items()
+
+    def values(self):
+        return self.entries.values()
+
+
+
+#_______________________________________________________________________________
+#                 Reachability
+#_______________________________________________________________________________
+# Which steps and classifications can be reached from where?
+# The transitive closure of the answer graph is stored as bitsets
+# (one row of uint64 words per node), so that queries are bit operations.
+# Classifications are the labels of terminal answers, including the
+# "SLEUTEL" exits to sub keys.
+
+class ReachabilityIndex(object):
+
+    def __init__(self, compiled: "CompactTree"):
+        import numpy as NP
+        self.steps = compiled.steps
+        self.step_lookup = compiled.step_lookup
+
+        n_nodes = len(self.steps)
+        successors = compiled.Successors()
+
+        # terminal labels per node
+        self.labels = []
+        label_lookup = {}
+        node_labels = [[] for _ in range(n_nodes)]
+        for nid in range(n_nodes):
+            for aid in range(compiled.answer_ptr[nid], compiled.answer_ptr[nid+1]):
+                if compiled.answer_target[aid] < 0:
+                    label = compiled.Label(aid)
+                    if label not in label_lookup:
+                        label_lookup[label] = len(self.labels)
+                        self.labels.append(label)
+                    node_labels[nid].append(label_lookup[label])
+        self.label_lookup = label_lookup
+
+        Bits = lambda n_rows, n_bits: NP.zeros((n_rows, (n_bits + 63) // 64), dtype = NP.uint64)
+        self.descendants = Bits(n_nodes, n_nodes)  # steps reachable from each step
+        self.ancestors = Bits(n_nodes, n_nodes)    # steps from which each step is reachable
+        self.reachable = Bits(n_nodes, len(self.labels)) # labels reachable from each step
+        self.label_steps = Bits(len(self.labels), n_nodes) # steps leading to each label
+
+        # steps in a loop share their closure; Tarjan gives children first
+        components = StronglyConnected(successors)
+        for component in components:
+            descendants = NP.zeros(self.descendants.shape[1], dtype = NP.uint64)
+            reachable = NP.zeros(self.reachable.shape[1], dtype = NP.uint64)
+            for nid in component:
+                for target in successors[nid]:
+                    descendants |= self.descendants[target]
+                    SetBit(descendants, target)
+                    reachable |= self.reachable[target]
+                for label_id in node_labels[nid]:
+                    SetBit(reachable, label_id)
+            self.descendants[component] = descendants
+            self.reachable[component] = reachable
+
+        # and the other way round, parents first
+        predecessors = [[] for _ in range(n_nodes)]
+        for nid, targets in enumerate(successors):
+            for target in targets:
+                predecessors[target].append(nid)
+        for component in reversed(components):
+            ancestors = NP.zeros(self.ancestors.shape[1], dtype = NP.uint64)
+            for nid in component:
+                for source in predecessors[nid]:
+                    ancestors |= self.ancestors[source]
+                    SetBit(ancestors, source)
+            self.ancestors[component] = ancestors
+
+        for nid in range(n_nodes):
+            for label_id in node_labels[nid]:
+                self.label_steps[label_id] |= self.ancestors[nid]
+                SetBit(self.label_steps[label_id], nid)
+
+    def Descendants(self, step):
+        # the steps which can be reached from a step
+        return [self.steps[nid] for nid in BitIndices(self.descendants[self.step_lookup[step]], len(self.steps))]
+
+    def Ancestors(self, step):
+        # the steps from which a step can be reached
+        return [self.steps[nid] for nid in BitIndices(self.ancestors[self.step_lookup[step]], len(self.steps))]
+
+    def Classifications(self, step):
+        # the classification labels which can still be reached from a step
+        return [self.labels[label_id] for label_id in BitIndices(self.reachable[self.step_lookup[step]], len(self.labels))]
+
+    def StepsTo(self, label, from_root: bool = True):
+        # the steps which lie on some path to a classification label
+        # (by default, only those on a path from the root)
+        nids = BitIndices(self.label_steps[self.label_lookup[label]], len(self.steps))
+        if from_root:
+            root = self.step_lookup[min(self.steps)]
+            nids = [nid for nid in nids if (nid == root) or TestBit(self.descendants[root], nid)]
+        return [self.steps[nid] for nid in nids]
+
+    def CanReach(self, step, target):
+        # whether a step leads to another step, or to a classification label
+        row = self.step_lookup[step]
+        if target in self.step_lookup:
+            return TestBit(self.descendants[row], self.step_lookup[target])
+        return TestBit(self.reachable[row], self.label_lookup[target])
+
+
+
+#_______________________________________________________________________________
+#                 Validation
+#_______________________________________________________________________________
+# The outcome of `DecisionTree.Validate()`.
+
+class ValidationReport(dict):
+    # a dict of findings, each a list:
+    #     errors:
+    #     "cycles": loops of steps
+    #     "dangling": (step, next_step) links to steps which do not exist
+    #                 (a next_step which looks like a step id, e.g. "42" or "60A")
+    #     "unclassified": (step, answer name) of terminal answers without a classification
+    #     warnings:
+    #     "unreachable": steps which cannot be reached from the root
+    #     "loose": steps which no answer points to
+    #     "single_answer": steps with only one answer
+    #     "adjusted": (from, to, n_links) of links adjusted to loose steps on loading
+    #     "labels": (step, next_step) of terminal answers with a text in next_step,
+    #               which is their classification (see get_classification)
+    errors = ["cycles", "dangling", "unclassified"]
+    warnings = ["unreachable", "loose", "single_answer", "adjusted", "labels"]
+
+    def __init__(self):
+        super(ValidationReport, self).__init__({key: [] for key in self.errors + self.warnings})
+
+    def IsValid(self, strict: bool = False):
+        # no errors (and, if strict, no warnings either)
+        keys = self.errors + (self.warnings if strict else [])
+        return all(len(self[key]) == 0 for key in keys)
+
+    def __str__(self):
+        return "\n".join([f"{'ERROR' if key in self.errors else 'warning'} {key}: {self[key]}" \
+                          for key in self.errors + self.warnings \
+                          if len(self[key]) > 0])
+
+
+
+#_______________________________________________________________________________
+#                 Change Sets
+#_______________________________________________________________________________
+# The outcome of `DecisionTree.Reload()`: what changed in the key file.
+
+class KeyBuildError(ValueError):
+    # a key file was read, but its nodes cannot be built
+    # (raised by `DecisionTree.Reload()`, which then leaves the tree as it was)
+    pass
+
+class ChangeSet(dict):
+    # a dict of sorted lists:
+    #     "added": new steps
+    #     "removed": steps which are gone
+    #     "changed": steps whose rows (or link adjustments) changed
+    #     "clades": clades which are new, gone, or relabeled
+    #     "tabs": the tabs in which any of these steps were or are,
+    #             and those of the clades; their forms need to be regenerated
+    fields = ["added", "removed", "changed", "clades", "tabs"]
+
+    def __init__(self):
+        super(ChangeSet, self).__init__({key: [] for key in self.fields})
+
+    def IsEmpty(self):
+        return all(len(self[key]) == 0 for key in self.fields)
+
+    def Steps(self):
+        # all steps whose node was rebuilt or dropped
+        return sorted(self["added"] + self["removed"] + self["changed"])
+
+    def __str__(self):
+        return "\n".join([f"{key}: {self[key]}" for key in self.fields if len(self[key]) > 0]) \
+            if not self.IsEmpty() else "no changes"
 
 
 
@@ -108,35 +1182,85 @@ def ExtractClades(data):
 class DecisionTree(dict):
 
     @classmethod
-    def from_csv(cls, csv_path: str, *args, **kwargs):
+    def from_csv(cls, csv_path: str, *args, compact: bool = False, cache_dir: str = None, \
+                 engine: str = None, **kwargs):
         # load a decision tree from a csv
-        # passes arguments through to pandas.read_csv
-
-        # read meta info
-        meta = None
-        header = kwargs.get("header", 0)
-        if header > 0:
-            meta = PD.read_csv(csv_path, index_col = 0, nrows = header, header = None)
-            meta = meta.iloc[:, :1].reset_index(drop = False, inplace = False)
-            meta = {r[0]: r[1] for _, r in meta.iterrows()}
+        # the file is streamed in a single pass (see KeyStream);
+        # with `engine = "pandas"`, the data rows are read with pandas.read_csv,
+        #     which receives all further arguments.
+        #     By default, pandas is only used for arguments other than
+        #     `sep`, `header` and `encoding`.
+        #     Parquet files and spreadsheets (.xlsx, .ods) are recognized by extension
+        #     (see from_parquet, from_spreadsheet).
+        # with `compact = True`, a memory-saving CompactTree is returned
+        # with a `cache_dir`, the built tree is stored there and re-used
+        #     for as long as file content, arguments and PARSER_VERSION are unchanged.
+
+        # remember where the tree came from (see Reload)
+        source = (csv_path, args, dict(kwargs), engine)
+
+        # try the cache
+        if cache_dir is not None:
+            cache_file = CacheFile(cache_dir, csv_path, \
+                                   [cls.__name__, compact, args, sorted(kwargs.items())])
+            tree = LoadCache(cache_file)
+            if tree is not None:
+                if not compact:
+                    tree.source = source
+                return tree
+
+        # read meta info, clades and the rows of each step
+        meta, clades, steps = StreamKey(csv_path, *args, engine = engine, **kwargs)
+
+        # instantiate a DecisionTree, step by step
+        tree = cls(meta = meta, clades = clades, steps = steps)
+        tree.source = source
+
+        # return it.
+        if compact:
+            tree = tree.Compact()
+
+        if cache_dir is not None:
+            StoreCache(cache_file, tree)
+
+        return tree
 
-        # read data
-        data = PD.read_csv(csv_path, *args, **kwargs)
 
-        # lower all column names
-        data.rename(columns = {col: col.lower() for col in data.columns}, inplace = True)
+    @classmethod
+    def from_parquet(cls, parquet_path: str, *args, **kwargs):
+        # load a decision tree from a Parquet file (see KeyTable), with pyarrow
+        # (further arguments as in `from_csv`, or for pyarrow.parquet.read_table)
+        # (requires the optional pyarrow)
+        return cls.from_csv(parquet_path, *args, engine = "parquet", **kwargs)
 
-        # group into clades
-        data, clades = ExtractClades(data)
 
-        # instantiate a DecisionTree and return it.
-        return cls(data, meta = meta, clades = clades)
+    @classmethod
+    def from_spreadsheet(cls, path: str, sheet = 0, header: int = 4, **kwargs):
+        # load a decision tree from a sheet (number or name) of an .xlsx or .ods file
+        # (further arguments as in `from_csv`)
+        return cls.from_csv(path, engine = "spreadsheet", sheet = sheet, header = header, **kwargs)
 
 
-    def __init__(self, data: PD.DataFrame, meta: dict = None, clades: dict = None):
+    @classmethod
+    def from_arrow(cls, table, meta: dict = None, compact: bool = False):
+        # build a decision tree from an Arrow table (e.g. of KeyTable),
+        # without a detour via pandas
+        # (requires the optional pyarrow)
+        clades, steps = ArrowSteps(table)
+        tree = cls(meta = ArrowMeta(table) if meta is None else meta, \
+                   clades = clades, steps = steps.items())
+        return tree.Compact() if compact else tree
+
+
+    def __init__(self, data: "PD.DataFrame" = None, meta: dict = None, clades: dict = None, \
+                 steps: Iterable = None):
         # builds a tree from a data frame
         # which should have columns:
         #     step, type, name, next_step, classification, bwk_code, subkey, remark
+        # alternatively, the rows can come per step, as an iterable of
+        #     (step, {type: [(row_index, record), ...]}) (see KeyStream)
+        # Each node is built as soon as its step is complete;
+        # the links between nodes are resolved once all are built.
 
         # store meta info
         self.meta = meta
@@ -144,50 +1268,236 @@ class DecisionTree(dict):
         # store clades
         self.clades = clades
 
-        # lower all column names
-        data.rename(columns = {col: col.lower() for col in data.columns}, inplace = True)
-
-        # remove spacing rows
-        data.dropna(subset = ["step", "type"], inplace = True)
-
-        # data["step"] = data["step"].astype(int) # does not work: things like "12A"
-        for col in ["step", "next_step"]:
-            # ensure that these are the same data type
-            data[col] = [str(val).strip().upper() for val in data[col].values]
-        # print(data.sample(3).T)
-
-        # check if all steps have a predecessor
-        next_steps = set(data["next_step"].values)
-        no_predecessor = set([step for step in data["step"].values \
-                          if step not in next_steps \
-                          ])
-        no_predecessor.remove(data["step"].values[0])
-
-        # adjust some, print warning
-        if len(no_predecessor) > 0:
-            # remove extra letter
-            adjusted_predecessor = []
-            for npred in no_predecessor:
-                letterless_index = RE.sub(r"\D", "", npred)
-                if npred == letterless_index: continue
-                missing_links = data["next_step"].values == letterless_index
-                data.loc[missing_links, "next_step"] = npred
-                adjusted_predecessor.append(f"{letterless_index} -> {npred}")
-
-            print("Found the following loose branches: ", no_predecessor, \
-                  ", but adjusted ", adjusted_predecessor)
-            # raise IOError("Found the following loose branches: ", no_predecessor)
-
-        # list steps for later reference
-        self.steps = list(map(str, NP.unique(sorted(data["step"].values))))
-
-        # create TreeNode's
+        # the source file and its arguments, if loaded with `from_csv`
+        self.source = None
+
+        if steps is None:
+            steps = FrameSteps(data)
+
+        # create TreeNode's, one step at a time
+        # The answer rows are kept by the nodes; of the other rows of a step,
+        # only the block is kept, until all steps are read:
+        # should a step recur further down, its node is rebuilt with all rows.
+        nodes = {}
+        other_rows = {}
+        next_steps = set()
+        self.fingerprints = {}
+        for step, blocks in steps:
+            if step in nodes:
+                answers = [(answer_idx, {key: value for key, value in answer.items() if key != "node_link"}) \
+                           for answer_idx, answer in nodes[step]["A"].items()]
+                blocks = MergeBlocks({**other_rows[step], "A": answers}, blocks)
+
+            # fingerprints of the rows as they were read (see Reload)
+            self.fingerprints[step] = BlockDigest(blocks)
+            next_steps.update(NextSteps(blocks))
+            other_rows[step] = {typ: block for typ, block in blocks.items() if typ != "A"}
+
+            nodes[step] = TreeNode(self, blocks = blocks)
+        del other_rows
+
+        # adjust some: links to "60" are meant for a loose "60A"
+        self.adjusted = ApplyRelinks((answer for node in nodes.values() for answer in node["A"].values()), \
+                                     FindRelinks(list(nodes.keys()), next_steps))
+
+        # list steps for later reference, and store the nodes in that order
+        self.steps = list(sorted(nodes.keys()))
         for step in self.steps:
-            self[step] = TreeNode(self, data.loc[data["step"].values == step])
+            self[step] = nodes[step]
 
         # the root node
         self.root = self[min(self.steps)]
 
+        # look up nodes by clade and tab
+        self.clade_index = CladeIndex(self.clades, {step: self[step].clade for step in self.steps})
+
+
+    def Reload(self, csv_path: str = None, *args, engine: str = None, **kwargs):
+        # read the key file again and update the tree in place
+        # (by default, the file and arguments of `from_csv` are re-used)
+        # The rows of each step are compared to those loaded before, by fingerprint;
+        # only nodes of added or changed steps are rebuilt, and only their clade entries moved.
+        # returns a ChangeSet, e.g. for a form to regenerate the affected parts
+        if csv_path is None:
+            if self.source is None:
+                raise IOError("This tree was not loaded from a file; please give a `csv_path`.")
+            csv_path, args, kwargs, engine = self.source
+
+        meta, clades, step_blocks = ReadKey(csv_path, *args, engine = engine, **kwargs)
+        fingerprints = {step: BlockDigest(blocks) for step, blocks in step_blocks.items()}
+
+        # links which are adjusted differently than before
+        # (and, below, links to new or removed steps)
+        relink = FindRelinks(list(step_blocks.keys()), \
+                             set(next_step for blocks in step_blocks.values() \
+                                 for next_step in NextSteps(blocks)))
+        previous_relink = dict(self.adjusted.keys())
+        relinked = set(next_step for next_step in {*relink.keys(), *previous_relink.keys()} \
+                       if relink.get(next_step, None) != previous_relink.get(next_step, None))
+
+        # compare
+        # (nodes linking to steps which appeared or disappeared change, too:
+        #  their answers are no longer, or now, terminal)
+        changes = ChangeSet()
+        changes["removed"] = [step for step in self.steps if step not in fingerprints]
+        changes["added"] = [step for step in step_blocks.keys() if step not in self.fingerprints]
+        relinked.update(changes["removed"], changes["added"])
+        for step, blocks in step_blocks.items():
+            if step not in self.fingerprints:
+                continue
+            if (fingerprints[step] != self.fingerprints[step]) \
+                    or any(record["next_step"] in relinked \
+                           for block in blocks.values() for _, record in block):
+                changes["changed"].append(step)
+        changes["clades"] = [clade_idx for clade_idx in {*clades.keys(), *self.clades.keys()} \
+                             if clades.get(clade_idx, None) != self.clades.get(clade_idx, None)]
+
+        adjusted = ApplyRelinks((record for blocks in step_blocks.values() \
+                                 for _, record in blocks.get("A", [])), relink)
+
+        # rebuild what changed, aside of the tree
+        # (the clade index is copied first: it may be shared, e.g. with a compiled tree)
+        # The tree itself is only altered once everything is built:
+        # a key file which cannot be built leaves the tree as it was.
+        clade_index = self.clade_index.Copy()
+        tabs = set(GetTab(clade_idx) for clade_idx in changes["clades"])
+        for step in changes["removed"]:
+            clade_index.Move(step, old_clade = self[step].clade)
+            tabs.add(GetTab(self[step].clade))
+
+        nodes = {}
+        for step in changes["added"] + changes["changed"]:
+            try:
+                node = TreeNode(self, blocks = step_blocks[step])
+            except (ValueError, KeyError, IndexError) as error:
+                raise KeyBuildError(f"Step {step} of {csv_path} cannot be built: {error!r}") from error
+            old_clade = self[step].clade if step in self.keys() else None
+            clade_index.Move(step, old_clade = old_clade, new_clade = node.clade)
+            tabs.update(GetTab(clade_idx) for clade_idx in [old_clade, node.clade] \
+                        if clade_idx is not None)
+            nodes[step] = node
+
+        clade_index.Relabel(clades, changes["clades"])
+
+        steps = list(sorted(step_blocks.keys()))
+        if len(steps) == 0:
+            raise KeyBuildError(f"{csv_path} holds no steps.")
+
+        # all is built: update the tree
+        for step in changes["removed"]:
+            self.pop(step)
+        self.update(nodes)
+
+        self.source = (csv_path, args, dict(kwargs), engine)
+        self.adjusted = adjusted
+        self.meta = meta
+        self.clades = clades
+        self.clade_index = clade_index
+        self.fingerprints = fingerprints
+        self.steps = steps
+        self.root = self[min(self.steps)]
+        # (e.g. relabeled clades are also compiled)
+        self.compiled = None
+
+        changes["tabs"] = list(tabs)
+        for key in changes.fields:
+            changes[key].sort()
+
+        return changes
+
+
+    def Watch(self, callback: Callable = None, interval: float = 1.0, stop: Callable = None, \
+              on_error: Callable = None):
+        # poll the key file, and `Reload()` whenever it was saved
+        # `callback(changes)` is called after each reload which changed anything.
+        # Runs until `stop()` returns True (e.g. the `is_set` of a threading.Event).
+        # A saved key which cannot be built (KeyBuildError) is reported to `on_error(error)`
+        # (by default: printed); the tree stays as it was, until the file is saved again.
+        if self.source is None:
+            raise IOError("This tree was not loaded from a file, and cannot be watched.")
+
+        Stamp = lambda: (OS.stat(self.source[0]).st_mtime_ns, OS.stat(self.source[0]).st_size)
+        last_stamp = Stamp()
+        while (stop is None) or not stop():
+            TI.sleep(interval)
+            try:
+                stamp = Stamp()
+                if stamp == last_stamp:
+                    continue
+                changes = self.Reload()
+            except KeyBuildError as error:
+                last_stamp = stamp
+                if on_error is None:
+                    print(error)
+                else:
+                    on_error(error)
+                continue
+            except (OSError, CSV.Error, ValueError, KeyError):
+                # the file is being written (or moved); try again later
+                continue
+            last_stamp = stamp
+
+            if (callback is not None) and not changes.IsEmpty():
+                callback(changes)
+
+
+    def Validate(self):
+        # check the structure of the tree, in one pass over nodes and links
+        # returns a ValidationReport; use `report.IsValid()` to gate key versions
+        compiled = self.Compile()
+        n_nodes = len(compiled.steps)
+        report = ValidationReport()
+
+        # the links (from the compiled arrays)
+        successors = self.Successors()
+        has_predecessor = [False] * n_nodes
+        for nid in range(n_nodes):
+            answers = range(compiled.answer_ptr[nid], compiled.answer_ptr[nid+1])
+            if len(answers) == 1:
+                report["single_answer"].append(compiled.steps[nid])
+
+            for aid in answers:
+                answer = CompactAnswer(compiled, aid)
+                target = compiled.answer_target[aid]
+                if target >= 0:
+                    has_predecessor[target] = True
+                    continue
+
+                # terminal answers
+                if (answer["next_step"].lower() != "nan") and isna(answer, "subkey"):
+                    # pointing nowhere, and not to a sub key:
+                    # a missing step, or a remark text which labels the answer
+                    if STEP_PATTERN.fullmatch(answer["next_step"]):
+                        report["dangling"].append((compiled.steps[nid], answer["next_step"]))
+                    else:
+                        report["labels"].append((compiled.steps[nid], answer["next_step"]))
+                elif all(isna(answer, key) for key in ["classification", "bwk_code", "subkey"]):
+                    report["unclassified"].append((compiled.steps[nid], answer["name"]))
+
+        # steps without predecessor, and steps out of reach of the root
+        report["loose"] = [compiled.steps[nid] for nid in range(n_nodes) \
+                           if not has_predecessor[nid] and (nid != compiled.root.nid)]
+        reached = [False] * n_nodes
+        reached[compiled.root.nid] = True
+        queue = [compiled.root.nid]
+        for nid in queue:
+            for target in successors[nid]:
+                if not reached[target]:
+                    reached[target] = True
+                    queue.append(target)
+        report["unreachable"] = [compiled.steps[nid] for nid in range(n_nodes) if not reached[nid]]
+
+        # loops
+        report["cycles"] = [[compiled.steps[nid] for nid in component] \
+                            for component in StronglyConnected(successors) \
+                            if (len(component) > 1) or (component[0] in successors[component[0]])]
+
+        # adjustments made while loading
+        report["adjusted"] = [(source, target, n_links) \
+                              for (source, target), n_links in self.adjusted.items()]
+
+        return report
+
 
     def Print(self):
         # print the whole tree
@@ -196,72 +1506,589 @@ class DecisionTree(dict):
             print(str(self[step]))
 
 
-    def ApplyToNodes(self, apply_function: Callable[[object], None]):
-        # recursively apply a function to all nodes
-        results = {}
-
-        def RecursiveApply(tree_node):
-
-            results[tree_node.idx] = apply_function(tree_node)
-
-            for term, child in tree_node.Traverse():
-                if not term:
-                    # proceed to non-terminal nodes
-                    RecursiveApply(child)
-
-        RecursiveApply(self.root)
-
-        return(results)
+    def Successors(self):
+        # the node ids each node links to, one entry per answer (from the compiled arrays)
+        # (computed once per compiled tree, as tuples)
+        compiled = self.Compile()
+        return compiled.Derived("successors", lambda: tuple( \
+                tuple(target for target in compiled.answer_target[compiled.answer_ptr[nid]:compiled.answer_ptr[nid+1]] \
+                      if target >= 0) \
+                for nid in range(len(compiled.steps))))
+
+    def Predecessors(self):
+        # per node id: {node id of a predecessor: the answer_idx leading here}
+        # (if several answers of a node lead here, the last one counts;
+        #  computed once per compiled tree, as read-only mappings)
+        compiled = self.Compile()
+        def Build():
+            predecessors = [{} for _ in compiled.steps]
+            for aid, target in enumerate(compiled.answer_target):
+                if target >= 0:
+                    predecessors[target][compiled.answer_node[aid]] = compiled.answer_row[aid]
+            return tuple(map(MappingProxyType, predecessors))
+        return compiled.Derived("predecessors", Build)
+
+    def TopologicalOrder(self):
+        # the node ids reachable from the root, parents before children
+        # (steps in a loop come in arbitrary order among themselves)
+        compiled = self.Compile()
+        successors = self.Successors()
+        root = compiled.step_lookup[self.root.idx]
+
+        reached = [False] * len(successors)
+        reached[root] = True
+        queue = [root]
+        for nid in queue:
+            for target in successors[nid]:
+                if not reached[target]:
+                    reached[target] = True
+                    queue.append(target)
+
+        # Tarjan finds components children first
+        return [nid for component in reversed(StronglyConnected(successors)) \
+                for nid in component if reached[nid]]
+
+
+    def ApplyToNodes(self, apply_function: Callable[[object], None], \
+                     workers: int = None, processes: bool = False, counts: bool = False):
+        # apply a function to all nodes reachable from the root
+        # each node is visited once, in topological order (no recursion)
+        # with `workers`, the function runs in a thread pool (or, with `processes = True`,
+        #     in a process pool; the function must then be picklable, i.e. module level)
+        # with `counts = True`, returns (results, counts), where counts holds per step
+        #     the number of paths from the root, i.e. how often a recursive traversal
+        #     would have applied the function (steps in loops: inf)
+        compiled = self.Compile()
+        order = self.TopologicalOrder()
+        steps = [compiled.steps[nid] for nid in order]
+
+        if workers is None:
+            results = {step: apply_function(self[step]) for step in steps}
+        elif processes:
+            from concurrent.futures import ProcessPoolExecutor
+            # send the tree only once per process
+            with ProcessPoolExecutor(max_workers = workers, \
+                                     initializer = SetWorkerTree, initargs = (self, )) as pool:
+                results = dict(zip(steps, pool.map(ApplyInWorker, [apply_function] * len(steps), steps, \
+                                                   chunksize = max(1, len(steps) // (4 * workers)))))
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers = workers) as pool:
+                results = dict(zip(steps, pool.map(lambda step: apply_function(self[step]), steps)))
+
+        if not counts:
+            return(results)
+
+        # count the paths, parents first
+        successors = self.Successors()
+        in_loop = set(nid for component in StronglyConnected(successors) \
+                      if (len(component) > 1) or (component[0] in successors[component[0]]) \
+                      for nid in component)
+        paths = {nid: 0 for nid in order}
+        if len(order) > 0:
+            paths[order[0]] = 1
+        for nid in order:
+            if nid in in_loop:
+                paths[nid] = float("inf")
+            for target in successors[nid]:
+                paths[target] += paths[nid]
+
+        return(results, {compiled.steps[nid]: paths[nid] for nid in order})
+
+
+    def GraphSource(self, tab: str = None):
+        # the graph in DOT language, written directly (each node and edge once)
+        # with a `tab`, only the nodes of that top level clade are drawn,
+        #     and links to other tabs end in dashed stubs
+        compiled = self.Compile()
+
+        nodes = []
+        terminals = {}
+        stubs = {}
+        edges = {}
+        for nid in self.TopologicalOrder():
+            if (tab is not None) and (compiled.Tab(nid) != tab):
+                continue
+            step = compiled.steps[nid]
+            nodes.append(f"{DotQuote(step)};")
+
+            for aid in compiled.AnswerIds(step):
+                target = compiled.answer_target[aid]
+                if target < 0:
+                    # terminal nodes are named by their label
+                    child = compiled.Label(aid)
+                    terminals[child] = f"{DotQuote(child)} [style = filled, fillcolor = lightgreen];"
+                else:
+                    child = compiled.steps[target]
+                    if (tab is not None) and (compiled.Tab(target) != tab):
+                        stubs[child] = f"{DotQuote(child)} [style = dashed];"
+                edges[(step, child)] = f"{DotQuote(step)} -> {DotQuote(child)};"
+
+        return "\n".join(["digraph G {", \
+                          *nodes, *terminals.values(), *stubs.values(), *edges.values(), \
+                          "}", ""])
+
+
+    def PrintGraph(self, filename, split: bool = False, workers: int = None):
+        # render the graph with graphviz' `dot` (format from the file extension)
+        # with `split = True`, one graph is rendered per tab (top level clade),
+        #     to `<filename>_<tab>.<extension>`, with `workers` dot processes in parallel
+        # Graphs are only rendered if they changed since the last call:
+        #     a `.sha256` file next to each output holds the hash of its source.
+        # returns the list of rendered files
+        # TODO check valid filename
+        import subprocess as SP
+        from concurrent.futures import ThreadPoolExecutor
+
+        stem, extension = OS.path.splitext(filename)
+        compiled = self.Compile()
+        if split:
+            tabs = sorted(set(compiled.Tab(nid) for nid in range(len(compiled.steps))))
+            jobs = {f"{stem}_{tab}{extension}": self.GraphSource(tab) for tab in tabs}
+        else:
+            jobs = {filename: self.GraphSource()}
+
+        def Render(output):
+            source = jobs[output].encode("utf-8")
+            source_hash = HL.sha256(source).hexdigest()
+            hash_file = output + ".sha256"
+            if OS.path.exists(output) and OS.path.exists(hash_file):
+                with open(hash_file, "r") as hash_in:
+                    if hash_in.read().strip() == source_hash:
+                        # unchanged
+                        return None
+
+            SP.run(["dot", f"-T{extension.lstrip('.') or 'svg'}", "-o", output], \
+                   input = source, check = True)
+            with open(hash_file, "w") as hash_out:
+                hash_out.write(source_hash)
+            return output
+
+        with ThreadPoolExecutor(max_workers = workers or 1) as pool:
+            rendered = list(pool.map(Render, jobs.keys()))
+
+        return [output for output in rendered if output is not None]
+
+
+    def Compact(self):
+        # convert to an array-backed, read-only CompactTree
+        return CompactTree(self)
+
+
+    def Compile(self):
+        # freeze the tree into a CompactTree,
+        # with terminal flags, labels, questions, clades and tabs precomputed.
+        # The result is kept until a node of this tree is replaced.
+        # (threads which ask at the same time get the same compiled tree)
+        compiled = getattr(self, "compiled", None)
+        if compiled is None:
+            with compile_lock:
+                compiled = getattr(self, "compiled", None)
+                if compiled is None:
+                    compiled = self.compiled = CompactTree(self)
+        return compiled
+
+
+    def WalkBatch(self, data, answer_prefix: str = "Answer_", paths: bool = True):
+        # move many records along the tree at once (see ClassifyBatch)
+        # `data`: a pandas DataFrame (or anything with `to_pandas()`, e.g. an Arrow table)
+        #     with one `Answer_{step}` column per step, holding the chosen answer_idx
+        # All records are moved along together, step by step in topological order;
+        # per step, the records there are handled column-wise.
+        # returns a dict of numpy arrays:
+        #     answers: {node id: answer_idx per record (-1: empty, -2: not an answer_idx)}
+        #     visited: {node id: whether the path of each record passes}, for answered steps
+        #     current: node id where each record ended
+        #     classification, path (unless `paths = False`),
+        #     and the flags missing, invalid, loop (see ClassifyBatch)
+        import numpy as NP
+        import pandas as PD
+
+        if hasattr(data, "to_pandas"):
+            data = data.to_pandas()
+
+        compiled = self.Compile()
+        n_records = len(data)
+        n_nodes = len(compiled.steps)
+
+        # answer_idx -> answer id, as a sorted lookup
+        answer_rows = NP.asarray(compiled.answer_row, dtype = NP.int64)
+        row_order = NP.argsort(answer_rows)
+        sorted_rows = answer_rows[row_order]
+        answer_target = NP.asarray(compiled.answer_target, dtype = NP.int64)
+        answer_node = NP.asarray(compiled.answer_node, dtype = NP.int64)
+        answer_label = NP.array([compiled.Label(aid) for aid in range(len(answer_rows))], dtype = object)
+
+        # the answers, as integers (-1: empty, -2: not a number)
+        answers = {}
+        for nid, step in enumerate(compiled.steps):
+            column = f"{answer_prefix}{step}"
+            if column not in data.columns:
+                continue
+            # few distinct values per column: convert those only
+            positions, uniques = PD.factorize(data[column], use_na_sentinel = True)
+            numeric = PD.to_numeric(PD.Series(uniques, dtype = object), errors = "coerce")
+            unique_codes = numeric.fillna(-2).values.astype(NP.int64)
+            unique_codes[(numeric.fillna(0).values % 1) != 0] = -2
+            # blank text counts as empty, too
+            unique_codes[[str(value).strip() == "" for value in uniques]] = -1
+            answers[nid] = NP.append(unique_codes, -1)[positions] # (the NA sentinel is -1)
+
+        walk = {
+            "answers": answers,
+            "visited": {nid: NP.zeros(n_records, dtype = bool) for nid in answers.keys()},
+            "current": NP.full(n_records, compiled.step_lookup[self.root.idx], dtype = NP.int64),
+            "classification": NP.full(n_records, None, dtype = object),
+            "path": NP.full(n_records, "", dtype = object),
+            **{flag: NP.zeros(n_records, dtype = bool) for flag in ["missing", "invalid", "loop"]}
+            }
+        current = walk["current"]
+        active = NP.ones(n_records, dtype = bool)
+        n_moves = NP.zeros(n_records, dtype = NP.int64)
+        empty = NP.full(n_records, -1, dtype = NP.int64)
+
+        order = self.TopologicalOrder()
+        while active.any():
+            # in a tree without loops, one pass suffices
+            moved = False
+            for nid in order:
+                here = NP.flatnonzero(active & (current == nid))
+                if len(here) == 0:
+                    continue
+                moved = True
+
+                # a path longer than the tree has steps runs in circles
+                n_moves[here] += 1
+                looped = n_moves[here] > n_nodes
+                walk["loop"][here[looped]] = True
+                active[here[looped]] = False
+                here = here[~looped]
+
+                if nid in answers:
+                    walk["visited"][nid][here] = True
+                if paths:
+                    walk["path"][here] = walk["path"][here] \
+                                         + NP.where(walk["path"][here] == "", "", ">") + compiled.steps[nid]
+
+                codes = answers.get(nid, empty)[here]
+                position = NP.clip(NP.searchsorted(sorted_rows, codes), 0, len(sorted_rows) - 1)
+                aid = row_order[position]
+                valid = (sorted_rows[position] == codes) & (answer_node[aid] == nid)
+
+                walk["missing"][here[codes == -1]] = True
+                walk["invalid"][here[(codes != -1) & ~valid]] = True
+                active[here[~valid]] = False
+
+                here, aid = here[valid], aid[valid]
+                target = answer_target[aid]
+                terminal = target < 0
+                walk["classification"][here[terminal]] = answer_label[aid[terminal]]
+                active[here[terminal]] = False
+                current[here[~terminal]] = target[~terminal]
+
+            if not moved:
+                # stuck on steps out of the topological order
+                walk["missing"][active] = True
+                break
+
+        return walk
+
+
+    def ClassifyBatch(self, data, answer_prefix: str = "Answer_"):
+        # classify many records at once, e.g. all features of a field layer
+        # (see WalkBatch for the input)
+        # returns a DataFrame (same index) with columns
+        #     classification: label of the terminal answer reached (None if not reached)
+        #     step: the step where the record ended
+        #     path: the steps taken, as "0>2>3"
+        #     missing: ended on a step without (usable) answer
+        #     invalid: an answer which does not belong to its step
+        #     stale: answers on steps off the path
+        #     loop: the path runs in circles
+        import numpy as NP
+        import pandas as PD
+
+        if hasattr(data, "to_pandas"):
+            data = data.to_pandas()
+
+        compiled = self.Compile()
+        walk = self.WalkBatch(data, answer_prefix)
+
+        # answers given off the path
+        stale = NP.zeros(len(data), dtype = bool)
+        for nid, codes in walk["answers"].items():
+            stale |= (codes != -1) & ~walk["visited"][nid]
+
+        return PD.DataFrame({"classification": walk["classification"], \
+                             "step": NP.array(compiled.steps, dtype = object)[walk["current"]], \
+                             "path": walk["path"], \
+                             "missing": walk["missing"], \
+                             "invalid": walk["invalid"], \
+                             "stale": stale, \
+                             "loop": walk["loop"], \
+                             }, \
+                            index = data.index)
+
+
+    def ClassificationExpression(self, answer_prefix: str = "Answer_"):
+        # a QGIS expression for the classification of a record, e.g. as default value
+        # of the `classification` field: it follows the path of the answers from the root,
+        # as ClassifyBatch does, so that answers off the path (e.g. kept in hidden fields
+        # after a surveyor changed an earlier answer) do not count.
+        # Two lookup tables, keyed by "step:answer_idx", give the next step of each answer
+        # and the label of each terminal answer; the path is taken in as many moves
+        # as the longest path of the key has (loops: once around).
+        # (NULL if the path ends without classification, as in ClassifyBatch)
+        compiled = self.Compile()
+        links = {}
+        labels = {}
+        for aid, target in enumerate(compiled.answer_target):
+            key = f"{compiled.steps[compiled.answer_node[aid]]}:{compiled.answer_row[aid]}"
+            if target >= 0:
+                links[key] = compiled.steps[target]
+            else:
+                labels[key] = compiled.Label(aid)
+
+        # the longest path from the root, in steps
+        # (loops count with all their steps; components come children first)
+        successors = self.Successors()
+        components = StronglyConnected(successors)
+        component_of = {nid: nr for nr, component in enumerate(components) for nid in component}
+        longest = [0] * len(components)
+        for nr, component in enumerate(components):
+            longest[nr] = len(component) + max((longest[component_of[target]] \
+                                                for nid in component for target in successors[nid] \
+                                                if component_of[target] != nr), default = 0)
+        n_moves = longest[component_of[compiled.step_lookup[self.root.idx]]] - 1
+
+        return PathLabel(links, labels, self.root.idx, n_moves, answer_prefix)
+
+
+    def CheckConsistency(self, data, answer_prefix: str = "Answer_", showall_prefix: str = "showall_tab"):
+        # find answers in field data which do not fit the path of the other answers,
+        # e.g. after a surveyor changed an earlier answer in the form
+        # (see WalkBatch for the input; `showall_tab{tab}` columns are checked as well)
+        # returns two DataFrames:
+        #     per feature (same index as the data):
+        #         stale_steps: answered steps off the path, as "3,76"
+        #         n_stale: their number
+        #         n_hidden: the number of those the form hides (i.e. not in a "show all" tab)
+        #         showall_invalid: tabs with a "show all" value that is not a boolean
+        #         showall_unused: tabs shown entirely, although the path does not enter them
+        #     per step:
+        #         n_answered, n_stale, n_hidden
+        import numpy as NP
+        import pandas as PD
+
+        if hasattr(data, "to_pandas"):
+            data = data.to_pandas()
+
+        compiled = self.Compile()
+        walk = self.WalkBatch(data, answer_prefix, paths = False)
+        n_records = len(data)
+
+        # "show all" checkboxes per tab
+        tabs = sorted(set(compiled.Tab(nid) for nid in range(len(compiled.steps))))
+        showall = {}
+        showall_invalid = NP.full(n_records, "", dtype = object)
+        for tab in tabs:
+            column = f"{showall_prefix}{tab}"
+            if column not in data.columns:
+                continue
+            positions, uniques = PD.factorize(data[column], use_na_sentinel = True)
+            text = [str(value).strip().lower() for value in uniques]
+            is_true = NP.append(NP.isin(text, ["true", "1", "1.0", "t", "yes"]), False)[positions]
+            is_false = NP.append(NP.isin(text, ["false", "0", "0.0", "f", "no", ""]), True)[positions]
+            showall[tab] = is_true
+            showall_invalid[~(is_true | is_false)] += f"{tab},"
+
+        # tabs the path enters
+        entered = {tab: NP.zeros(n_records, dtype = bool) for tab in showall.keys()}
+        for nid, visited in walk["visited"].items():
+            tab = compiled.Tab(nid)
+            if tab in entered:
+                entered[tab] |= visited
+        # (unanswered steps on the path are not in `visited`; the last one is `current`)
+        current_tab = NP.array([compiled.Tab(nid) for nid in range(len(compiled.steps))], \
+                               dtype = object)[walk["current"]]
+        showall_unused = NP.full(n_records, "", dtype = object)
+        for tab, is_true in showall.items():
+            showall_unused[is_true & ~(entered[tab] | (current_tab == tab))] += f"{tab},"
+
+        # stale answers, per feature and per step
+        stale_steps = NP.full(n_records, "", dtype = object)
+        n_stale = NP.zeros(n_records, dtype = NP.int64)
+        n_hidden = NP.zeros(n_records, dtype = NP.int64)
+        per_step = {}
+        for nid, codes in walk["answers"].items():
+            answered = codes != -1
+            stale = answered & ~walk["visited"][nid]
+            hidden = stale & ~showall.get(compiled.Tab(nid), NP.zeros(n_records, dtype = bool))
+            stale_steps[stale] += compiled.steps[nid] + ","
+            n_stale += stale
+            n_hidden += hidden
+            per_step[compiled.steps[nid]] = (answered.sum(), stale.sum(), hidden.sum())
+
+        features = PD.DataFrame({"stale_steps": stale_steps, \
+                                 "n_stale": n_stale, \
+                                 "n_hidden": n_hidden, \
+                                 "showall_invalid": showall_invalid, \
+                                 "showall_unused": showall_unused, \
+                                 }, index = data.index)
+        for column in ["stale_steps", "showall_invalid", "showall_unused"]:
+            features[column] = [text[:-1] for text in features[column].values]
+
+        steps = PD.DataFrame.from_dict(per_step, orient = "index", \
+                                       columns = ["n_answered", "n_stale", "n_hidden"])
+        steps.index.name = "step"
+
+        return features, steps
+
+
+    def Hashes(self):
+        # Merkle hashes per step: each covers the node content (question, info, answers)
+        # and the hashes of the nodes its answers lead to, i.e. the whole subtree below.
+        # Equal hashes mean equal subtrees (also across trees and key versions).
+        # Row numbers (answer_idx) are not part of the hash: inserting a row in the csv
+        # changes no subtree. Caches which depend on them must add them.
+        # (steps in a loop share the hash of their loop, plus their own step)
+        # returns {step: hex digest}; computed once per compiled tree
+        return self.Compile().Derived("merkle", self.MerkleHashes)["hashes"]
+
+    def MerkleHashes(self):
+        # the hashes of `Hashes`, with the local hashes (node content only)
+        # and the steps without predecessor (where a Diff starts)
+        compiled = self.Compile()
+        n_nodes = len(compiled.steps)
+        Digest = lambda *parts: HL.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+        # node content, with the links as step names
+        local = []
+        for nid in range(n_nodes):
+            parts = [compiled.steps[nid], compiled.Text(compiled.node_question[nid]), \
+                     *[compiled.Text(text_id) for text_id \
+                       in compiled.info_text[compiled.info_ptr[nid]:compiled.info_ptr[nid+1]]]]
+            for aid in range(compiled.answer_ptr[nid], compiled.answer_ptr[nid+1]):
+                answer = CompactAnswer(compiled, aid)
+                parts.extend([answer[field] for field in CompactTree.answer_fields])
+                parts.append(compiled.Label(aid))
+            local.append(Digest(*parts))
+
+        # then add the subtrees, children first
+        successors = self.Successors()
+        hashes = [None] * n_nodes
+        for component in StronglyConnected(successors):
+            members = set(component)
+            if (len(component) == 1) and (component[0] not in successors[component[0]]):
+                nid = component[0]
+                hashes[nid] = Digest(local[nid], *[hashes[target] for target in successors[nid]])
+                continue
 
+            loop_hash = Digest(*sorted(local[nid] for nid in component), \
+                               *sorted(hashes[target] for nid in component \
+                                       for target in successors[nid] if target not in members))
+            for nid in component:
+                hashes[nid] = Digest(loop_hash, local[nid])
+
+        has_predecessor = set(target for targets in successors for target in targets)
+        return MappingProxyType({ \
+            "local_hashes": MappingProxyType(dict(zip(compiled.steps, local))), \
+            "hashes": MappingProxyType(dict(zip(compiled.steps, hashes))), \
+            "loose_steps": tuple(compiled.steps[nid] for nid in range(n_nodes) \
+                                 if nid not in has_predecessor)})
+
+
+    def Diff(self, other):
+        # compare to another tree (e.g. a newer version of the key), by step
+        # Starting from the root (and loose steps), subtrees with equal
+        # hashes are skipped: the effort grows with the change, not the tree.
+        # returns {"added": [steps], "removed": [steps], "changed": [steps]},
+        # where added steps are only in `other`, removed ones only in this tree
+        hashes, other_hashes = self.Hashes(), other.Hashes()
+        compiled, other_compiled = self.Compile(), other.Compile()
+        merkle = compiled.Derived("merkle", self.MerkleHashes)
+        other_merkle = other_compiled.Derived("merkle", other.MerkleHashes)
+        local, other_local = merkle["local_hashes"], other_merkle["local_hashes"]
+        successors, other_successors = self.Successors(), other.Successors()
+
+        def Children(tree_successors, tree_compiled, step):
+            if step not in tree_compiled.step_lookup:
+                return []
+            return [tree_compiled.steps[target] \
+                    for target in tree_successors[tree_compiled.step_lookup[step]]]
+
+        starts = {self.root.idx, other.root.idx, \
+                  *merkle["loose_steps"], *other_merkle["loose_steps"]}
+
+        report = {"added": [], "removed": [], "changed": []}
+        seen = set()
+        queue = sorted(starts)
+        for step in queue:
+            if step in seen:
+                continue
+            seen.add(step)
+
+            if step not in hashes:
+                report["added"].append(step)
+            elif step not in other_hashes:
+                report["removed"].append(step)
+            elif hashes[step] == other_hashes[step]:
+                # identical subtree
+                continue
+            elif local[step] != other_local[step]:
+                report["changed"].append(step)
 
-    def PrintGraph(self, filename):
-        # TODO check valid filename
+            queue.extend(Children(successors, compiled, step))
+            queue.extend(Children(other_successors, other_compiled, step))
 
-        import pydot as DOT
+        return {key: sorted(steps) for key, steps in report.items()}
 
-        graph = DOT.Dot(graph_type = "digraph")
-        q_nodes = []
-        t_nodes = []
-        edges = []
 
+    def Walk(self, answers: list = None):
+        # start a TreeWalk, optionally with the answers given so far
+        return TreeWalk(self, answers)
 
-        def AppendGraph(tree_node):
-            # recursively build the graph
 
-            dot_node = DOT.Node(str(tree_node.idx))
-            graph.add_node(dot_node)
+    def Reachability(self):
+        # the ReachabilityIndex of this tree; built on first use, kept with the compiled tree
+        compiled = self.Compile()
+        return compiled.Derived("reachability", lambda: ReachabilityIndex(compiled))
 
-            children = tree_node.Traverse()
-            for term, child in children:
-                # print(term, child)
-                if not term:
-                    child_node = AppendGraph(child)
-                    q_nodes.append(child_node)
-                    edges.append(DOT.Edge(dot_node, child_node))
 
-                else:
-                    term_node = DOT.Node(get_classification(child),
-                                         style = "filled",
-                                         fillcolor = "lightgreen")
-                    t_nodes.append(term_node)
-                    edges.append(DOT.Edge(dot_node, term_node))
+    def __setitem__(self, step, node):
+        # any change to the nodes outdates the compiled tree
+        self.compiled = None
+        super(DecisionTree, self).__setitem__(step, node)
 
-            return dot_node
+    def pop(self, step, *default):
+        self.compiled = None
+        return super(DecisionTree, self).pop(step, *default)
 
+    # (dict does not route these through __setitem__ or pop)
+    def __delitem__(self, step):
+        self.compiled = None
+        super(DecisionTree, self).__delitem__(step)
 
-        # start at the root
-        AppendGraph(self.root)
+    def update(self, *args, **kwargs):
+        self.compiled = None
+        super(DecisionTree, self).update(*args, **kwargs)
 
-        for node in set(q_nodes):
-            graph.add_node(node)
+    def __ior__(self, other):
+        self.compiled = None
+        return super(DecisionTree, self).__ior__(other)
 
-        for node in set(t_nodes):
-            graph.add_node(node)
+    def setdefault(self, step, node = None):
+        if step not in self:
+            self.compiled = None
+        return super(DecisionTree, self).setdefault(step, node)
 
-        for edge in set(edges):
-            graph.add_edge(edge)
+    def popitem(self):
+        self.compiled = None
+        return super(DecisionTree, self).popitem()
 
-        graph.write_svg(filename)
+    def clear(self):
+        self.compiled = None
+        super(DecisionTree, self).clear()
 
 
     def GetAllNodes(self):
@@ -271,17 +2098,21 @@ class DecisionTree(dict):
                 }
 
 
-    def GetCladeMembers(self, clade_idx):
+    def GetCladeMembers(self, clade_idx, subclades: bool = False):
         # return all nodes by clade
+        # (optionally including those of subclades, e.g. "50" -> "50>>60A")
         assert clade_idx in self.clades.keys()
-        return {tnidx: node \
-                for tnidx, node in self.GetAllNodes().items() \
-                if node.clade == clade_idx \
+        return {tnidx: self[tnidx] \
+                for tnidx in self.clade_index.Members(clade_idx, subclades) \
                 }
 
+    def GetTabMembers(self, tab):
+        # return all nodes of a tab, i.e. of a top level clade and its subclades
+        return self.GetCladeMembers(tab, subclades = True)
+
     def GetAllClades(self):
         # return all nodes, organized in clades
-        return {self.GetCladeMembers(clade_idx) \
+        return {clade_idx: self.GetCladeMembers(clade_idx) \
                 for clade_idx in self.clades.keys() \
                 }
 
@@ -296,6 +2127,31 @@ class DecisionTree(dict):
 
 
 
+def SharedSubtrees(trees: dict):
+    # find identical subtrees among several trees (e.g. keys, or versions of a key)
+    # trees: {name: tree}
+    # returns {hash: [(name, step), ...]} for subtrees which occur more than once,
+    # only the largest: a subtree is left out if the node above it is shared, too
+    occurrences = {}
+    for name, tree in trees.items():
+        for step, subtree_hash in tree.Hashes().items():
+            occurrences.setdefault(subtree_hash, []).append((name, step))
+    shared = {subtree_hash: where for subtree_hash, where in occurrences.items() if len(where) > 1}
+
+    # drop subtrees of shared subtrees
+    below = set()
+    for name, tree in trees.items():
+        compiled = tree.Compile()
+        hashes = tree.Hashes()
+        for nid, targets in enumerate(tree.Successors()):
+            if hashes[compiled.steps[nid]] in shared:
+                below |= {hashes[compiled.steps[target]] for target in targets}
+
+    return {subtree_hash: where for subtree_hash, where in shared.items() \
+            if subtree_hash not in below}
+
+
+
 #_______________________________________________________________________________
 #                 The Node
 #_______________________________________________________________________________
@@ -303,25 +2159,32 @@ class DecisionTree(dict):
 
 class TreeNode(dict):
 
-    def __init__(self, tree, rows):
+    def __init__(self, tree, rows = None, blocks = None):
         # print(rows)
         # rows contain the following types:
         #     "T1", "T2": new clade/subgroup/category; to be removed
         #     "Q": that is the question
         #     "A": answers (usually more than one)
         #     "I": extra info
+        # Instead of a data frame of `rows`, the node accepts the
+        # pre-split `blocks` {type: [(row_index, record), ...]} (see SplitBlocks).
 
         # reference to the tree
         self.tree = tree
 
+        if blocks is None:
+            blocks, = SplitBlocks(rows).values()
+
         # skip clade-defining category rows
-        non_T = lambda tp: tp[0] != "T"
-        rows = rows.loc[list(map(non_T, rows["type"].values)), :]
+        blocks = {typ: block for typ, block in blocks.items() if typ[0] != "T"}
+        names_by_type = lambda typ: [record["name"] for _, record in blocks.get(typ, [])]
 
         # the index ("step")
-        self.idx = rows.iloc[0, :]["step"]
-        self.types = NP.unique(rows["type"].values).astype(str)
-        self.clade = rows.iloc[0, :]["clade"]
+        _, first_row = min((block[0] for block in blocks.values()), \
+                           key = lambda row: row[0])
+        self.idx = first_row["step"]
+        self.types = list(sorted(blocks.keys()))
+        self.clade = first_row["clade"]
 
         ### [T]: type/topic/theme (can be T1, T2, ...)
         ### and [I]: extra information
@@ -332,22 +2195,21 @@ class TreeNode(dict):
 
             # this is about "T"/headers and "I"/info
             self[str(typ)] = \
-                    [", ".join(map(str, RowsByType(rows, t_type)["name"].values)) \
+                    [", ".join(names_by_type(t_type)) \
                          for t_type in self.types \
                          if t_type[0] == typ ] \
             # print(self[str(typ)])
 
         # print(self.get("I", None))
         # add remarks on the question line
-        remarks = [rem.strip() for rem in RowsByType(rows, "Q")["remark"] \
-                   if str(rem).lower() != "nan"]
+        remarks = [record["remark"].strip() for _, record in blocks.get("Q", []) \
+                   if record["remark"].lower() != "nan"]
         if len(remarks) > 0:
             self["I"] = [info for info in [*self.get("I", []), *list(remarks)] \
                          if info != ""]
 
         ### [A]: Possible Answers
-        self["A"] = {i: row.astype(str).to_dict() \
-                     for i, row in RowsByType(rows, "A").iterrows()}
+        self["A"] = {i: record for i, record in blocks.get("A", [])}
         # ['name', 'next_step', 'classification', 'bwk_code', 'subkey', 'remark']
 
 
@@ -358,10 +2220,23 @@ class TreeNode(dict):
         # print(self.idx, CommonString(self["A"]))
 
         ### [Q]: What is the question?
-        if all(RowsByType(rows, "Q")["name"].isna()):
+        if all(name == "nan" for name in names_by_type("Q")):
             self["Q"] = CommonString(self["A"])
         else:
-            self["Q"] = "/".join(RowsByType(rows, "Q")["name"].values)
+            self["Q"] = "/".join(names_by_type("Q"))
+
+    def Copy(self, tree):
+        # a copy of this node, which belongs to another `tree`
+        # (e.g. a form built from this tree; see QgisFormDecisionTree.CopyTree)
+        # Answers are copied as well, since they link back to their node.
+        node = TreeNode.__new__(TreeNode)
+        node.__dict__.update(self.__dict__)
+        node.tree = tree
+        for key, value in self.items():
+            node[key] = list(value) if isinstance(value, list) else value
+        node["A"] = {answer_idx: {**answer, "node_link": node} \
+                     for answer_idx, answer in self["A"].items()}
+        return node
 
     def GetCladeLabel(self):
         # get the clade for this node
@@ -381,17 +2256,25 @@ class TreeNode(dict):
         # facilitate moving along the tree
         # returns a tuple with (is_terminal, node|classification)
 
+        # terminal flags and targets are precompiled
+        compiled = self.tree.Compile()
+
         children = []
-        for answer in self.GetAnswers():
-            if is_terminal(answer):
+        for answer, aid in zip(self.GetAnswers(), compiled.AnswerIds(self.idx)):
+            target = compiled.answer_target[aid]
+            if target < 0:
                 # either append
                 children.append((True, answer))
             else:
-                children.append((False, self.tree[answer["next_step"]]))
+                children.append((False, self.tree[compiled.steps[target]]))
 
         return children
 
 
+    def Hash(self):
+        # the Merkle hash of this node and its subtree (see DecisionTree.Hashes)
+        return self.tree.Hashes()[self.idx]
+
     def ExtraInfo(self):
         # print extra info
         return self.get("I", None)
@@ -405,17 +2288,21 @@ class TreeNode(dict):
         out = ["Q: " + self["Q"]]
         if "I" in self.keys():
             out.append("\t"+", ".join(self["I"]))
-        for answer in self["A"].values():
+
+        # terminal flags and labels are precompiled
+        compiled = self.tree.Compile()
+        for answer, aid in zip(self["A"].values(), compiled.AnswerIds(self.idx)):
             proceed = answer["next_step"]
+            terminal = compiled.answer_target[aid] < 0
 
-            if proceed not in self.tree.keys():
+            if terminal:
                 # some more extensive tests (e.g. "19")
                 proceed = "*" + proceed
 
             if is_subkey(answer):
                 proceed = "*" + answer["subkey"]
-            elif is_terminal(answer):
-                proceed = "*" + get_classification(answer)
+            elif terminal:
+                proceed = "*" + compiled.Label(aid)
 
             if print_remark and (not isna(answer, "remark")):
                 remark = "(" + answer["remark"] + ")"
@@ -472,28 +2359,170 @@ def get_classification(answer):
         answer["bwk_code"]
     ] if label.lower() != 'nan']))
 
+def SuffixAutomaton(text):
+    # suffix automaton of a sequence: one state per set of end positions
+    # returns (length, link, endpos, states), where per state
+    #     length: length of its longest substring
+    #     link: suffix link (the state of its longest shorter suffix)
+    #     endpos: end position of its first occurrence
+    # and `states` is the state reached after each position of the text
+    length, link, endpos, transitions = [0], [-1], [-1], [{}]
+    states = []
+    last = 0
+    for pos, char in enumerate(text):
+        current = len(length)
+        length.append(length[last] + 1)
+        link.append(0)
+        endpos.append(pos)
+        transitions.append({})
+
+        state = last
+        while (state != -1) and (char not in transitions[state]):
+            transitions[state][char] = current
+            state = link[state]
+
+        if state != -1:
+            target = transitions[state][char]
+            if length[state] + 1 == length[target]:
+                link[current] = target
+            else:
+                # split the target state
+                clone = len(length)
+                length.append(length[state] + 1)
+                link.append(link[target])
+                endpos.append(endpos[target])
+                transitions.append(dict(transitions[target]))
+                while (state != -1) and (transitions[state].get(char, None) == target):
+                    transitions[state][char] = clone
+                    state = link[state]
+                link[target] = link[current] = clone
+
+        last = current
+        states.append(current)
+
+    return length, link, endpos, states
+
+
+def LongestMatchCounts(strings):
+    # for all pairs of strings, find their longest common substring;
+    # returns {substring: number of pairs}, in the order of the pairs
+    # (as `difflib.SequenceMatcher(None, a, b).find_longest_match` for each pair
+    #  of an earlier string `a` and a later string `b`: of several longest matches,
+    #  the one which starts earliest in `a`; no match at all gives "")
+    # All strings go into one suffix automaton, separated by unique characters.
+    # For each state, a bit mask records which strings contain it.
+    # Going from long to short, each pair takes the first length at which both share a state,
+    # and of the states of that length, the one occurring first in `a`.
+    # Pairs with a `b` of 200+ characters are left to difflib itself:
+    # its "autojunk" heuristic then ignores the frequent characters of `b`.
+
+    text, owner = [], []
+    for nr, string in enumerate(strings):
+        text.extend(string)
+        owner.extend([nr] * len(string))
+        text.append(chr(0xE000 + nr)) # private use characters
+        owner.append(-1)
+
+    # matches[(nr, other)]: the longest match of a pair
+    matches = {}
+    # partners[nr]: mask of strings already paired with string nr
+    partners = [0] * len(strings)
+    for other, string_b in enumerate(strings):
+        if len(string_b) < 200:
+            continue
+        from difflib import SequenceMatcher
+        for nr, string_a in enumerate(strings[:other]):
+            match = SequenceMatcher(None, string_a, string_b) \
+                .find_longest_match(0, len(string_a), 0, len(string_b))
+            matches[(nr, other)] = string_a[match.a : match.a + match.size]
+            partners[nr] |= 1 << other
+            partners[other] |= 1 << nr
+    pairs_left = len(strings) * (len(strings) - 1) // 2 - len(matches)
+
+    length, link, endpos, states = SuffixAutomaton(text)
+
+    # mark the strings containing each state
+    masks = [0] * len(length)
+    for pos, state in enumerate(states):
+        if owner[pos] < 0:
+            continue
+        bit = 1 << owner[pos]
+        while (state > 0) and not (masks[state] & bit):
+            masks[state] |= bit
+            state = link[state]
+
+    order = sorted(range(1, len(length)), key = lambda st: -length[st])
+    start = 0
+    while (start < len(order)) and (pairs_left > 0):
+        # all states of the same length
+        end = start
+        while (end < len(order)) and (length[order[end]] == length[order[start]]):
+            end += 1
+
+        # per new pair, the match which starts earliest in the first string
+        best = {}
+        for state in order[start:end]:
+            mask = masks[state]
+            if mask & (mask - 1) == 0:
+                # contained in less than two strings
+                continue
+
+            substring = None
+            rest = mask
+            while rest:
+                # loop the set bits
+                bit = rest & -rest
+                rest ^= bit
+                nr = bit.bit_length() - 1
+                new_pairs = rest & ~partners[nr]
+                if new_pairs == 0:
+                    continue
+                if substring is None:
+                    substring = "".join(text[endpos[state] - length[state] + 1 : endpos[state] + 1])
+                position = strings[nr].find(substring)
+                while new_pairs:
+                    other = new_pairs & -new_pairs
+                    new_pairs ^= other
+                    pair = (nr, other.bit_length() - 1)
+                    if (pair not in best) or (position < best[pair][0]):
+                        best[pair] = (position, substring)
+
+        for (nr, other), (_, substring) in best.items():
+            matches[(nr, other)] = substring
+            partners[nr] |= 1 << other
+            partners[other] |= 1 << nr
+        pairs_left -= len(best)
+        start = end
+
+    # count, in the order of the pairs
+    counts = {}
+    for nr in range(len(strings)):
+        for other in range(nr + 1, len(strings)):
+            substring = matches.get((nr, other), "")
+            counts[substring] = counts.get(substring, 0) + 1
+
+    return counts
+
+
 def CommonString(answers):
     # get the common part of a set of answer descriptions ("name")
+    names = tuple(ans["name"].lower() for ans in answers.values())
+    return CommonName(names)
+
 
-    names = [ans["name"].lower() for ans in answers.values()]
-    substring_counts={}
+@lru_cache(maxsize = 1024)
+def CommonName(names: tuple):
+    # get the common part of a set of (lower case) names
+    # (memoized: the same answers recur throughout a key and across keys)
 
+    # count the longest matches of all pairs
     # https://stackoverflow.com/questions/58585052/find-most-common-substring-in-a-list-of-strings
-    for i in range(0, len(names)):
-        for j in range(i+1,len(names)):
-            string1 = names[i].strip()
-            string2 = names[j].strip()
-            match = SequenceMatcher(None, string1, string2).find_longest_match(0, len(string1), 0, len(string2))
-            matching_substring=string1[match.a:match.a+match.size]
-            if(matching_substring not in substring_counts):
-                substring_counts[matching_substring]=1
-            else:
-                substring_counts[matching_substring]+=1
+    substring_counts = LongestMatchCounts([name.strip() for name in names])
 
     # print(substring_counts)
 
     # scoring:
-    scores = {key: NP.sqrt(len(key))*len(key.split(" ")) * value / len(answers) \
+    scores = {key: MATH.sqrt(len(key))*len(key.split(" ")) * value / len(names) \
               for key, value in substring_counts.items() \
               if (value > 1) \
               # and (len(key.split(" ")) > 1) \
@@ -511,13 +2540,741 @@ def CommonString(answers):
     return(" ".join(name_split[:min([4, len(name_split)])]) + "...")
 
 
+#_______________________________________________________________________________
+#                 The Compact Tree
+#_______________________________________________________________________________
+# When many keys are kept in memory, dicts of strings become heavy.
+# This is the same tree, flattened into a few integer arrays.
+
+class CompactTree(object):
+    # A read-only, array-backed version of a DecisionTree.
+    #   - steps and answers are integer ids
+    #   - the answers of node `n` are `answer_ptr[n]:answer_ptr[n+1]` (CSR style),
+    #     each pointing to a next node id, or -1 if terminal
+    #   - all text is interned in one utf-8 string table (id -1 is "nan")
+    # Nodes and answers are handed out as light-weight, slotted views,
+    # which behave like TreeNode's and answer dicts.
+    #
+    # Derived attributes (terminal flags, classification labels, tabs, clade index)
+    # are computed once. After construction, the tree is frozen:
+    # it cannot be altered, it is hashable, and it can be shared among threads.
+    # Structures derived on demand (e.g. the reachability index) are built
+    # once, under a lock (see `Derived`), and are read-only as well.
+
+    # columns of the answer records which are kept
+    answer_fields = ["name", "next_step", "classification", "bwk_code", "subkey", "remark"]
+
+    # the arrays which carry the tree, with their type codes
+    array_types = {
+        "text_offsets": "q",   # string table: start of each string in the buffer
+        "node_question": "i",  # per node: text ids
+        "node_clade": "i",
+        "node_tab": "i",
+        "node_has_info": "b",
+        "info_ptr": "i",       # per node: range in `info_text`
+        "info_text": "i",
+        "answer_ptr": "i",     # per node: range in the answer arrays
+        "answer_node": "i",    # per answer: node id
+        "answer_row": "q",     #     row index in the data ("answer_idx")
+        "answer_text": "i",    #     text ids of all `answer_fields` (flattened)
+        "answer_target": "i",  #     next node id (-1 if terminal)
+        "answer_label": "i",   #     text id of the classification label
+    }
+
+    def __init__(self, tree: DecisionTree):
+
+        self.meta = None if tree.meta is None else MappingProxyType(dict(tree.meta))
+        self.clades = MappingProxyType(dict(tree.clades))
+        self.adjusted = MappingProxyType(dict(tree.adjusted))
+        self.clade_index = tree.clade_index.Freeze()
+
+        # the string table: interned while building, packed afterwards
+        strings = {}
+        def Intern(text):
+            if text == "nan":
+                return -1
+            return strings.setdefault(text, len(strings))
+
+        self.steps = tuple(tree.steps)
+        self.step_lookup = MappingProxyType({step: nid for nid, step in enumerate(self.steps)})
+
+        arrays = {name: [] for name in self.array_types.keys()}
+        arrays["info_ptr"].append(0)
+        arrays["answer_ptr"].append(0)
+
+        for nid, step in enumerate(self.steps):
+            node = tree[step]
+            arrays["node_question"].append(Intern(node["Q"]))
+            arrays["node_clade"].append(Intern(node.clade))
+            arrays["node_tab"].append(Intern(GetTab(node.clade)))
+            arrays["node_has_info"].append("I" in node.keys())
+            arrays["info_text"].extend(map(Intern, node.get("I", [])))
+            arrays["info_ptr"].append(len(arrays["info_text"]))
+
+            for answer_idx, answer in node["A"].items():
+                arrays["answer_node"].append(nid)
+                arrays["answer_row"].append(answer_idx)
+                arrays["answer_text"].extend([Intern(answer[field]) for field in self.answer_fields])
+                arrays["answer_target"].append(-1 if is_terminal(answer) \
+                                               else self.step_lookup[answer["next_step"]])
+                arrays["answer_label"].append(Intern(get_classification(answer)))
+            arrays["answer_ptr"].append(len(arrays["answer_row"]))
+
+        # pack the string table
+        encoded = [text.encode("utf-8") for text in strings.keys()]
+        self.text_buffer = b"".join(encoded)
+        arrays["text_offsets"] = list(accumulate([0, *map(len, encoded)]))
+
+        for name, typecode in self.array_types.items():
+            setattr(self, name, FrozenArray(typecode, arrays[name]))
+
+        # the root node
+        self.root = self[min(self.steps)]
+
+        # freeze
+        content = HL.sha256(self.text_buffer)
+        content.update(repr((self.steps, dict(self.clades), \
+                             None if self.meta is None else dict(self.meta))).encode("utf-8"))
+        content.update(self.clade_index.Digest().encode("utf-8"))
+        for name in self.array_types.keys():
+            content.update(getattr(self, name).tobytes())
+        self.content_hash = content.hexdigest()
+
+        # structures derived on demand (see `Derived`)
+        # do not alter the tree; they are kept here, but not pickled
+        super(CompactTree, self).__setattr__("derived", {})
+        super(CompactTree, self).__setattr__("derive_lock", TH.RLock())
+
+
+    def __setattr__(self, name, value):
+        if "content_hash" in self.__dict__:
+            raise AttributeError("A CompactTree is frozen and cannot be altered.")
+        super(CompactTree, self).__setattr__(name, value)
+
+    def __hash__(self):
+        return hash(self.content_hash)
+
+    def __getstate__(self):
+        # read-only mappings and memoryviews cannot be pickled;
+        # store plain dicts and bytes
+        state = dict(self.__dict__)
+        for key in ["meta", "clades", "adjusted", "step_lookup"]:
+            if state[key] is not None:
+                state[key] = dict(state[key])
+        for name in self.array_types.keys():
+            state[name] = state[name].tobytes()
+        state["derived"] = {}
+        del state["derive_lock"]
+        return state
+
+    def __setstate__(self, state):
+        # restore, and freeze again
+        for key in ["meta", "clades", "adjusted", "step_lookup"]:
+            if state[key] is not None:
+                state[key] = MappingProxyType(state[key])
+        for name, typecode in self.array_types.items():
+            array = AR.array(typecode)
+            array.frombytes(state[name])
+            state[name] = memoryview(array).toreadonly()
+        state["derive_lock"] = TH.RLock()
+        self.__dict__.update(state)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactTree) and (self.content_hash == other.content_hash)
+
+    def Compile(self):
+        # a compact tree is compiled already
+        return self
+
+    def Derived(self, name, Build: Callable):
+        # a structure derived from the tree, built by `Build()` on first use
+        # (once, also when several threads ask at the same time)
+        if name not in self.derived:
+            with self.derive_lock:
+                if name not in self.derived:
+                    self.derived[name] = Build()
+        return self.derived[name]
+
+
+    def AnswerIds(self, step):
+        # the answer ids of a node, by step
+        nid = self.step_lookup[step]
+        return range(self.answer_ptr[nid], self.answer_ptr[nid+1])
+
+    def Label(self, aid):
+        # the (precomputed) classification label of an answer
+        return self.Text(self.answer_label[aid])
+
+    def Tab(self, nid):
+        # the tab of a node, i.e. its top level clade
+        return self.Text(self.node_tab[nid])
+
+
+    def AnswerLookup(self):
+        # {answer_idx: answer id}, built on first use
+        return self.Derived("answer_lookup", lambda: \
+            MappingProxyType({int(row): aid for aid, row in enumerate(self.answer_row)}))
+
+    def QuestionData(self, nid):
+        # a node as plain data, e.g. to be sent to clients (built once per node; do not alter)
+        return self.Derived(("question", nid), lambda: {
+                "step": self.steps[nid],
+                "question": self.Text(self.node_question[nid]),
+                "info": [self.Text(text_id) for text_id \
+                         in self.info_text[self.info_ptr[nid]:self.info_ptr[nid+1]]],
+                "tab": self.Tab(nid),
+                "clade": self.clades.get(self.Text(self.node_clade[nid]), ""),
+                "answers": [{"answer_idx": int(self.answer_row[aid]), \
+                             "name": CompactAnswer(self, aid)["name"], \
+                             "remark": CompactAnswer(self, aid)["remark"], \
+                             "next_step": None if self.answer_target[aid] < 0 \
+                                          else self.steps[self.answer_target[aid]], \
+                             "classification": self.Label(aid) if self.answer_target[aid] < 0 \
+                                               else None} \
+                            for aid in range(self.answer_ptr[nid], self.answer_ptr[nid+1])]
+                })
+
+    def Text(self, text_id):
+        # look up a string in the table
+        if text_id < 0:
+            return "nan"
+        return self.text_buffer[self.text_offsets[text_id]:self.text_offsets[text_id+1]] \
+                   .decode("utf-8")
+
+    # mapping interface, analogous to the DecisionTree dict
+    def keys(self):
+        return self.step_lookup.keys()
+
+    def __contains__(self, step):
+        return step in self.step_lookup
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __getitem__(self, step):
+        if step not in self.step_lookup:
+            raise KeyError(f"The node {str(step)} is not found in the list of tree nodes.")
+        return CompactNode(self, self.step_lookup[step])
+
+    def items(self):
+        return [(step, self[step]) for step in self.steps]
+
+    def values(self):
+        return [self[step] for step in self.steps]
+
+    # these only rely on the mapping interface
+    Print = DecisionTree.Print
+    Successors = DecisionTree.Successors
+    Predecessors = DecisionTree.Predecessors
+    TopologicalOrder = DecisionTree.TopologicalOrder
+    ApplyToNodes = DecisionTree.ApplyToNodes
+    GraphSource = DecisionTree.GraphSource
+    PrintGraph = DecisionTree.PrintGraph
+    GetAllNodes = DecisionTree.GetAllNodes
+    GetCladeMembers = DecisionTree.GetCladeMembers
+    GetTabMembers = DecisionTree.GetTabMembers
+    GetAllClades = DecisionTree.GetAllClades
+    Validate = DecisionTree.Validate
+    ClassificationExpression = DecisionTree.ClassificationExpression
+    Reachability = DecisionTree.Reachability
+    Walk = DecisionTree.Walk
+    Hashes = DecisionTree.Hashes
+    MerkleHashes = DecisionTree.MerkleHashes
+    Diff = DecisionTree.Diff
+    WalkBatch = DecisionTree.WalkBatch
+    ClassifyBatch = DecisionTree.ClassifyBatch
+    CheckConsistency = DecisionTree.CheckConsistency
+
+
+class CompactNode(object):
+    # a view on one node of a CompactTree
+
+    __slots__ = ("tree", "nid")
+
+    def __init__(self, tree, nid):
+        self.tree = tree
+        self.nid = nid
+
+    @property
+    def idx(self):
+        return self.tree.steps[self.nid]
+
+    @property
+    def clade(self):
+        return self.tree.Text(self.tree.node_clade[self.nid])
+
+    def AnswerRange(self):
+        return range(self.tree.answer_ptr[self.nid], self.tree.answer_ptr[self.nid+1])
+
+    def keys(self):
+        return (["I"] if self.tree.node_has_info[self.nid] else []) + ["A", "Q"]
+
+    def __getitem__(self, key):
+        tree = self.tree
+        if key == "Q":
+            return tree.Text(tree.node_question[self.nid])
+        if key == "A":
+            return {int(tree.answer_row[aid]): CompactAnswer(tree, aid) \
+                    for aid in self.AnswerRange()}
+        if (key == "I") and tree.node_has_info[self.nid]:
+            return [tree.Text(text_id) for text_id \
+                    in tree.info_text[tree.info_ptr[self.nid]:tree.info_ptr[self.nid+1]]]
+        raise KeyError(key)
+
+    def get(self, key, default = None):
+        if key in self.keys():
+            return self[key]
+        return default
+
+    def Traverse(self):
+        # facilitate moving along the tree, directly on the arrays
+        # returns a tuple with (is_terminal, node|classification)
+        tree = self.tree
+        return [(True, CompactAnswer(tree, aid)) if tree.answer_target[aid] < 0 \
+                else (False, CompactNode(tree, tree.answer_target[aid])) \
+                for aid in self.AnswerRange()]
+
+    def __eq__(self, other):
+        return isinstance(other, CompactNode) \
+            and (self.tree is other.tree) and (self.nid == other.nid)
+
+    def __hash__(self):
+        return hash((id(self.tree), self.nid))
+
+    # the remaining node functions only need the dict-like interface
+    GetCladeLabel = TreeNode.GetCladeLabel
+    GetAnswers = TreeNode.GetAnswers
+    ExtraInfo = TreeNode.ExtraInfo
+    Hash = TreeNode.Hash
+    __str__ = TreeNode.__str__
+
+
+class CompactAnswer(object):
+    # a view on one answer of a CompactTree;
+    # reads like the answer dicts of a TreeNode
+
+    __slots__ = ("tree", "aid")
+
+    def __init__(self, tree, aid):
+        self.tree = tree
+        self.aid = aid
+
+    def keys(self):
+        return ["step", "type", *CompactTree.answer_fields, "clade", "node_link"]
+
+    def __getitem__(self, key):
+        tree = self.tree
+        if key in CompactTree.answer_fields:
+            n_fields = len(CompactTree.answer_fields)
+            return tree.Text(tree.answer_text[self.aid * n_fields + CompactTree.answer_fields.index(key)])
+        nid = tree.answer_node[self.aid]
+        if key == "node_link":
+            return CompactNode(tree, nid)
+        if key == "step":
+            return tree.steps[nid]
+        if key == "clade":
+            return tree.Text(tree.node_clade[nid])
+        if key == "type":
+            return "A"
+        raise KeyError(key)
+
+    def get(self, key, default = None):
+        if key in self.keys():
+            return self[key]
+        return default
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def __eq__(self, other):
+        return isinstance(other, CompactAnswer) \
+            and (self.tree is other.tree) and (self.aid == other.aid)
+
+    def __hash__(self):
+        return hash((id(self.tree), self.aid))
+
+
+#_______________________________________________________________________________
+#                 Walking the Tree
+#_______________________________________________________________________________
+# Step by step through a (compiled) tree, as a surveyor would:
+# one question at a time, with the option to go back.
+# For clients outside QGIS; see KeyService.py.
+
+class TreeWalk(object):
+    # a walk is the list of answers chosen (answer_idx);
+    # the current question follows from the last one.
+    # All lookups go to the compiled tree, which is shared and never altered.
+
+    def __init__(self, tree, answers: list = None):
+        self.tree = tree.Compile()
+        self.nodes = [self.tree.step_lookup[min(self.tree.steps)]] # the path
+        self.answers = []
+        self.result = None
+
+        for answer_idx in (answers or []):
+            self.Answer(answer_idx)
+
+    def Answer(self, answer_idx):
+        # choose an answer to the current question
+        if self.result is not None:
+            raise ValueError("This walk has reached a classification already.")
+
+        lookup = self.tree.AnswerLookup()
+        aid = lookup.get(int(answer_idx), None)
+        if (aid is None) or (self.tree.answer_node[aid] != self.nodes[-1]):
+            raise KeyError(f"{answer_idx} is no answer to step {self.tree.steps[self.nodes[-1]]}.")
+
+        self.answers.append(int(answer_idx))
+        target = self.tree.answer_target[aid]
+        if target < 0:
+            self.result = self.tree.Label(aid)
+        else:
+            self.nodes.append(target)
+
+        return self.Question()
+
+    def Back(self, n_steps: int = 1):
+        # undo the last answer(s)
+        for _ in range(min(n_steps, len(self.answers))):
+            if self.result is not None:
+                self.result = None
+            else:
+                self.nodes.pop()
+            self.answers.pop()
+
+        return self.Question()
+
+    def Question(self):
+        # the current question, with answer options (or None, once classified)
+        if self.result is not None:
+            return None
+        return self.tree.QuestionData(self.nodes[-1])
+
+    def State(self):
+        # all there is to know about the walk, as plain data
+        return {"path": [self.tree.steps[nid] for nid in self.nodes], \
+                "answers": list(self.answers), \
+                "question": self.Question(), \
+                "classification": self.result}
+
+    def Serialize(self):
+        # a compact text token: tree hash and answers, e.g. "3f2a9c1e:1,5,23"
+        return f"{self.tree.content_hash[:8]}:" + ",".join(map(str, self.answers))
+
+    @classmethod
+    def Deserialize(cls, tree, token: str):
+        # restore a walk from its token (on the same tree)
+        tree_hash, answers = token.split(":", 1)
+        if not tree.Compile().content_hash.startswith(tree_hash):
+            raise ValueError("This walk belongs to another version of the tree.")
+        return cls(tree, [int(answer) for answer in answers.split(",") if answer != ""])
+
+
+
+#_______________________________________________________________________________
+#                 The Forest
+#_______________________________________________________________________________
+# Keys link to each other: a terminal answer with next step "SLEUTEL"
+# continues in the key named in its SUBKEY column (e.g. BOSSEN_STRUWELEN).
+
+class DecisionForest(object):
+    # All keys (csv files) in a directory, indexed by the `Key` of their meta info
+    # (sub keys are matched regardless of case).
+    # The keys are loaded in a process pool on construction, as CompactTree's.
+    # Only `capacity` trees are kept in memory; the least recently used are dropped,
+    # and loaded again on demand (quickly, with a `cache_dir`).
+    # Links between keys are resolved on first traversal.
+
+    def __init__(self, directory: str = "./sleutels", pattern: str = "*.csv", \
+                 capacity: int = 8, workers: int = None, cache_dir: str = None, \
+                 sep: str = ",", header: int = 4, **kwargs):
+        # further arguments go to DecisionTree.from_csv
+        # with `workers = 0`, keys are loaded in this process
+        import glob as GLOB
+
+        self.capacity = capacity
+        self.kwargs = {"sep": sep, "header": header, "cache_dir": cache_dir, **kwargs}
+        self.paths = {} # key name: csv path
+        self.names = {} # upper case name: key name
+        self.trees = OrderedDict() # key name: tree, least recently used first
+        self.links = {} # (key name, answer id): sub key name, as resolved
+
+        csv_paths = sorted(GLOB.glob(OS.path.join(directory, pattern)))
+        if workers == 0:
+            loaded = map(LoadInWorker, csv_paths, [self.kwargs] * len(csv_paths))
+            for csv_path, tree in loaded:
+                self.Add(csv_path, tree)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                for csv_path, tree in pool.map(LoadInWorker, csv_paths, \
+                                               [self.kwargs] * len(csv_paths)):
+                    self.Add(csv_path, tree)
+
+    def Add(self, csv_path, tree):
+        # index a loaded key
+        key = str((tree.meta or {}).get("Key", OS.path.splitext(OS.path.basename(csv_path))[0])).strip()
+        if self.paths.get(key, csv_path) != csv_path:
+            raise KeyError(f"Key {key} is in {self.paths[key]} and {csv_path}.")
+        self.paths[key] = csv_path
+        self.names[key.upper()] = key
+        self.Keep(key, tree.Compile())
+
+    def Keep(self, key, tree):
+        # remember a tree as most recently used; forget the least recently used
+        self.trees[key] = tree
+        self.trees.move_to_end(key)
+        while len(self.trees) > self.capacity:
+            self.trees.popitem(last = False)
+
+    def __getitem__(self, key):
+        # the compiled tree of a key (loaded, if it was dropped)
+        if key not in self.paths:
+            raise KeyError(f"There is no key {key} in this forest.")
+        tree = self.trees.get(key, None)
+        if tree is None:
+            _, tree = LoadInWorker(self.paths[key], self.kwargs)
+        self.Keep(key, tree)
+        return tree
+
+    def keys(self):
+        return self.paths.keys()
+
+    def __contains__(self, key):
+        return key in self.paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def Resolve(self, name):
+        # the key of a sub key name (None if it is not in the forest)
+        return self.names.get(str(name).strip().upper(), None)
+
+    def Subkey(self, key, aid):
+        # the sub key name of a terminal answer (None if it does not lead to another key)
+        # (looked up on first traversal, and remembered)
+        link = (key, aid)
+        if link not in self.links:
+            answer = CompactAnswer(self[key], aid)
+            self.links[link] = None if isna(answer, "subkey") else answer["subkey"].strip()
+        return self.links[link]
+
+    def Walk(self, key, answers: list = None):
+        # start a ForestWalk in a key, optionally with the answers given so far
+        return ForestWalk(self, key, answers)
+
+    def ClassifyBatch(self, data, key, answer_prefix: str = "Answer_"):
+        # classify many records, starting in one key (see DecisionTree.ClassifyBatch)
+        # Records which reach a sub key continue there, with the answers in
+        # columns `{answer_prefix}{sub key}_{step}`.
+        # returns the frame of DecisionTree.ClassifyBatch, with an extra column
+        #     key: where each record ended
+        # and paths across keys as "Heidesleutel:0>1>BOSSEN_STRUWELEN:0>3"
+        import pandas as PD
+
+        if hasattr(data, "to_pandas"):
+            data = data.to_pandas()
+
+        result = self[key].ClassifyBatch(data, answer_prefix)
+        result.insert(0, "key", key)
+        result["path"] = key + ":" + result["path"]
+
+        pending = {key: result.index}
+        for _ in range(len(self.paths) + 1):
+            # the records which reached a sub key
+            exits = {}
+            for key, index in pending.items():
+                tree = self[key]
+                ended = result.loc[index]
+                ended = ended.loc[ended["classification"].notna()]
+                for (step, label), records in ended.groupby(["step", "classification"]).groups.items():
+                    name = next((self.Subkey(key, aid) for aid in tree.AnswerIds(step) \
+                                 if (tree.answer_target[aid] < 0) and (tree.Label(aid) == label)), None)
+                    subkey = self.Resolve(name) if name is not None else None
+                    if subkey is not None:
+                        exits.setdefault(subkey, []).extend(records)
+
+            if len(exits) == 0:
+                break
+
+            # continue there
+            for subkey, records in exits.items():
+                sub_result = self[subkey].ClassifyBatch(data.loc[records], f"{answer_prefix}{subkey}_")
+                result.loc[records, "key"] = subkey
+                result.loc[records, "path"] = result.loc[records, "path"] \
+                                              + f">{subkey}:" + sub_result["path"]
+                for column in ["classification", "step", "missing"]:
+                    result.loc[records, column] = sub_result[column]
+                for flag in ["invalid", "stale", "loop"]:
+                    result.loc[records, flag] = result.loc[records, flag] | sub_result[flag]
+            pending = {subkey: PD.Index(records) for subkey, records in exits.items()}
+        else:
+            # more key changes than keys: the keys link in circles
+            for key, index in pending.items():
+                result.loc[index, "loop"] = True
+
+        return result
+
+    def Validate(self):
+        # validate all keys (see DecisionTree.Validate)
+        # in addition, links to sub keys which are not in the forest are "dangling",
+        # and keys linking to each other in circles form "cycles" (of key names)
+        # returns {key: ValidationReport}
+        reports = {}
+        key_links = {}
+        for key in list(self.keys()):
+            tree = self[key]
+            reports[key] = tree.Validate()
+            key_links[key] = set()
+            for aid in range(len(tree.answer_row)):
+                if tree.answer_target[aid] >= 0:
+                    continue
+                name = self.Subkey(key, aid)
+                if name is None:
+                    continue
+                subkey = self.Resolve(name)
+                if subkey is None:
+                    reports[key]["dangling"].append((tree.steps[tree.answer_node[aid]], name))
+                else:
+                    key_links[key].add(subkey)
+
+        keys = list(key_links.keys())
+        successors = [[keys.index(subkey) for subkey in sorted(key_links[key])] for key in keys]
+        for component in StronglyConnected(successors):
+            if (len(component) > 1) or (component[0] in successors[component[0]]):
+                for position in component:
+                    reports[keys[position]]["cycles"].append([keys[other] for other in component])
+
+        return reports
+
+
+class ForestWalk(object):
+    # a walk across keys: one TreeWalk per key entered;
+    # a "SLEUTEL" answer continues at the first question of the sub key.
+
+    def __init__(self, forest: DecisionForest, key, answers: list = None):
+        self.forest = forest
+        self.walks = [(key, TreeWalk(forest[key]))]
+
+        for answer_idx in (answers or []):
+            self.Answer(answer_idx)
+
+    def Answer(self, answer_idx):
+        # choose an answer to the current question
+        key, walk = self.walks[-1]
+        walk.Answer(answer_idx)
+
+        if walk.result is not None:
+            name = self.forest.Subkey(key, walk.tree.AnswerLookup()[int(answer_idx)])
+            subkey = None if name is None else self.forest.Resolve(name)
+            if subkey is not None:
+                self.walks.append((subkey, TreeWalk(self.forest[subkey])))
+
+        return self.Question()
+
+    def Back(self, n_steps: int = 1):
+        # undo the last answer(s), back into the previous key if need be
+        for _ in range(n_steps):
+            if len(self.walks[-1][1].answers) == 0:
+                if len(self.walks) == 1:
+                    break
+                self.walks.pop()
+            self.walks[-1][1].Back()
+
+        return self.Question()
+
+    def Question(self):
+        # the current question (or None, once classified)
+        return self.walks[-1][1].Question()
+
+    def State(self):
+        # as TreeWalk.State, with (key, step) paths and (key, answer_idx) answers
+        state = self.walks[-1][1].State()
+        state["key"] = self.walks[-1][0]
+        state["path"] = [(key, step) for key, walk in self.walks for step in walk.State()["path"]]
+        state["answers"] = [(key, answer) for key, walk in self.walks for answer in walk.answers]
+        return state
+
+
+
+#_______________________________________________________________________________
+#                 Form Expressions
+#_______________________________________________________________________________
+# The form shows and hides its containers by QGIS expressions on the answer fields
+# (see AssembleMolenheide.py). QGIS re-evaluates all of them on every edit,
+# so they are kept short: equality chains on one field become `IN (...)`,
+# and conditions shared by many containers are computed once, in hidden fields.
+
+def AnyEquals(conditions: Iterable, collapse: bool = True):
+    # OR over (field, value) conditions:
+    #     ("Answer_3" = 1) OR ("Answer_3" = 2) OR ("Answer_7" = 0)
+    # or, collapsed per field (in the order of their first condition):
+    #     ("Answer_3" IN (1, 2)) OR ("Answer_7" = 0)
+    if not collapse:
+        return " OR ".join(f"(\"{field}\" = {value})" for field, value in conditions)
+
+    values = {}
+    for field, value in conditions:
+        values.setdefault(field, {})[value] = None
+    return " OR ".join(f"(\"{field}\" = {next(iter(field_values))})" if len(field_values) == 1 \
+                       else f"(\"{field}\" IN ({', '.join(map(str, field_values))}))" \
+                       for field, field_values in values.items())
+
+def AnsweredCount(fields: Iterable):
+    # the number of answered (i.e. non-NULL) fields
+    return " + ".join(f"if(\"{field}\" IS NULL, 0, 1)" for field in fields) or "0"
+
+def QuoteText(text: str):
+    # a string literal for QGIS expressions (as QgsExpression.quotedString)
+    return "'" + text.replace("\\", "\\\\").replace("'", "''") \
+                     .replace("\n", "\\n").replace("\t", "\\t") + "'"
+
+def PathLabel(links: dict, labels: dict, root: str, n_moves: int, answer_prefix: str = "Answer_"):
+    # the label at the end of the path of answers, from `root`, in up to `n_moves` moves:
+    #     with_variable('links', map('0:1', '2', ...), with_variable('labels', map('3:8', 'HC', ...),
+    #     with_variable('step', '0',
+    #     with_variable('step', coalesce(map_get(@links, <answer>), @step), ...
+    #     map_get(@labels, <answer>)))))
+    # where <answer> is `concat(@step, ':', attribute(concat('Answer_', @step)))`.
+    # (unanswered steps and answers of other steps do not move; then the label is NULL)
+    Table = lambda table: "map(" + ", ".join(f"{QuoteText(str(key))}, {QuoteText(str(value))}" \
+                                            for key, value in table.items()) + ")"
+    answer = f"concat(@step, ':', attribute(concat({QuoteText(answer_prefix)}, @step)))"
+    move = f"with_variable('step', coalesce(map_get(@links, {answer}), @step), "
+    return f"with_variable('links', {Table(links)}, " \
+           + f"with_variable('labels', {Table(labels)}, " \
+           + f"with_variable('step', {QuoteText(str(root))}, " \
+           + move * max(n_moves, 0) \
+           + f"map_get(@labels, {answer})" \
+           + ")" * (3 + max(n_moves, 0))
+
+def NoOtherAnswered(count_field: str, field: str = None):
+    # true if none of the fields counted in `count_field` is answered,
+    # except (optionally) `field` itself
+    if field is None:
+        return f"(\"{count_field}\" = 0)"
+    return f"(\"{count_field}\" <= if(\"{field}\" IS NULL, 0, 1))"
+
+
+
 #_______________________________________________________________________________
 #                 Mission Control
 #_______________________________________________________________________________
 # Every program has to start somewhere.
 
 if __name__ == "__main__":
-    dt = DecisionTree.from_csv("./sleutels/Heidesleutel_digitaal_werkversie.csv", sep = ",", header = 4)
+    dt = DecisionTree.from_csv("./sleutels/Heidesleutel_digitaal_werkversie.csv", sep = ",", header = 4, cache_dir = "./.tree_cache")
+    print(dt.Validate())
     # print(dt.root)
     # dt.Print()
     # print ("\n____\n".join(map(str, [tr[1] for tr in dt.root.Traverse()])))
@@ -533,4 +3290,4 @@ if __name__ == "__main__":
     #     get_remark(answer)
 
     print("\n".join([f"{k}:\t{v}" for k, v in dt.clades.items()]))
-    dt.GetCladeMembers('50>60A')
+    dt.GetCladeMembers('50>>60A')
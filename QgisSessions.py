@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+The QGIS application and its projects, shared by the form scripts
+(AssembleMolenheide.py, AssemblePlantentuin.py, BackfillClassification.py).
+
+    with QgisSession() as session:
+        project = session.Project("heide.qgs")
+
+There is one QgsApplication per process. A session which is entered while
+an application runs already (another session, or QGIS itself) joins it:
+it only closes its own projects, and leaves the application to its owner.
+
+With QGIS_HEADLESS=1, the application and projects are those of the
+pure-Python form model (see HeadlessForms).
+"""
+
+#_______________________________________________________________________________
+#                 Libraries
+#_______________________________________________________________________________
+
+import os
+import pathlib as pl
+
+if os.environ.get("QGIS_HEADLESS", "0") not in ("", "0"):
+    from HeadlessForms import QgsApplication, QgsProject, QgsCoordinateReferenceSystem
+else:
+    from qgis.core import QgsApplication, QgsProject, QgsCoordinateReferenceSystem
+
+
+#_______________________________________________________________________________
+#                 Session
+#_______________________________________________________________________________
+
+class QgisSession(object):
+    # a QGIS application, initialized once per process, for any number of projects
+    #     with QgisSession() as session:
+    #         project = session.Project("heide.qgs")
+    # On leaving the `with` block (also on errors), the projects are cleared
+    # and exitQgis() removes the provider and layer registries from memory
+    # (unless the application was running before; then it is only joined).
+    # `application` is the QgsApplication class (e.g. of qgis.core,
+    # for scripts which always need QGIS itself).
+
+    def __init__(self, prefix_path = "/usr/bin/qgis", application = None):
+        self.prefix_path = prefix_path
+        self.application = QgsApplication if application is None else application
+        self.app = None
+        self.owner = False
+        self.projects = []
+
+    def __enter__(self):
+        # https://docs.qgis.org/3.40/en/docs/pyqgis_developer_cookbook/intro.html#using-pyqgis-in-standalone-scripts
+
+        # a second QgsApplication in the same process is not allowed:
+        # join the one which runs
+        running = self.application.instance()
+        if running is not None:
+            self.app, self.owner = running, False
+            return self
+
+        # Supply path to qgis install location
+        # QgsApplication.prefixPath()
+        self.application.setPrefixPath(self.prefix_path, True)
+
+        # Create a reference to the QgsApplication.  Setting the
+        # second argument to False disables the GUI.
+        self.app, self.owner = self.application([], False), True
+
+        # Load providers
+        self.app.initQgis()
+        return self
+
+    def __exit__(self, *exception):
+        # projects (and their layers) must go before the application
+        for project in list(self.projects):
+            project.Close()
+
+        if self.owner:
+            self.app.exitQgis()
+        self.app, self.owner = None, False
+        return False
+
+    def Project(self, filename):
+        project = QgisProject(filename, self)
+        self.projects.append(project)
+        return project
+
+
+#_______________________________________________________________________________
+#                 Project
+#_______________________________________________________________________________
+
+class QgisProject(object):
+    # an independent project (rather than QgsProject.instance()),
+    # so that one session can assemble many
+
+    def __init__(self, filename, session: QgisSession):
+        self.filename = filename # "test.qgs"
+        self.session = session
+        self.CreateQgisProject()
+        self.Save()
+
+    def CreateQgisProject(self):
+        ### Project
+        self.project = QgsProject()
+        self.path: pl._local.PosixPath = pl.Path(self.project.readPath("./"))
+        # print(project.fileName())
+
+        project_crs = QgsCoordinateReferenceSystem.fromEpsgId(31370)
+        self.project.setCrs(project_crs)
+
+
+    def Save(self):
+        # Read input parameters from GP dialog
+        self.save_filename = self.path/self.filename
+        check = self.project.write(str(self.save_filename))
+
+    def Close(self):
+        # release the layers, and leave the session
+        self.project.clear()
+        if self in self.session.projects:
+            self.session.projects.remove(self)
@@ -0,0 +1,1579 @@
+#!/usr/bin/env python3
+
+# parity checks of QGISDecisionTrees against reference implementations
+#     python -m pytest -q test_QGISDecisionTrees.py
+
+#_______________________________________________________________________________
+#                 Libraries
+#_______________________________________________________________________________
+
+import os as OS
+import random as RND
+from difflib import SequenceMatcher
+
+import QGISDecisionTrees as QGT
+
+REPO_DIR = OS.path.dirname(OS.path.abspath(__file__))
+KEY_FILE = OS.path.join(REPO_DIR, "sleutels", "Heidesleutel_digitaal_werkversie.csv")
+
+
+#_______________________________________________________________________________
+#                 Import Time
+#_______________________________________________________________________________
+
+def test_import_budget():
+    # numpy and pandas are imported only where data frames are used;
+    # the budget of the module header (50ms) holds
+    import subprocess as SP
+    import sys as SYS
+    check = "import sys, QGISDecisionTrees; " \
+            "print(','.join(sorted({'numpy', 'pandas', 'pyarrow'} & set(sys.modules))))"
+    result = SP.run([SYS.executable, "-X", "importtime", "-c", check], \
+                    capture_output = True, text = True, check = True, \
+                    cwd = REPO_DIR)
+    assert result.stdout.strip() == ""
+
+    # import time:  self [us] | cumulative | imported package
+    timings = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")]
+    cumulative = {name.strip(): int(total) for _, total, name in timings[1:]}
+    assert not any(name.split(".")[0] in ("numpy", "pandas") for name in cumulative.keys())
+    assert cumulative["QGISDecisionTrees"] < 50000
+
+
+#_______________________________________________________________________________
+#                 Common Substrings
+#_______________________________________________________________________________
+
+def PairwiseLongestMatches(strings, autojunk: bool = True):
+    # the pairwise loop which LongestMatchCounts replaces
+    counts = {}
+    for i in range(len(strings)):
+        for j in range(i+1, len(strings)):
+            string1, string2 = strings[i], strings[j]
+            match = SequenceMatcher(None, string1, string2, autojunk = autojunk) \
+                .find_longest_match(0, len(string1), 0, len(string2))
+            substring = string1[match.a:match.a+match.size]
+            counts[substring] = counts.get(substring, 0) + 1
+    return counts
+
+
+def test_longest_match_ties():
+    # of several longest matches, difflib takes the earliest in the first string
+    strings = [" a abb ", "ba a", "bab  aa "]
+    assert QGT.LongestMatchCounts(strings) == {"a a": 1, " a": 1, "ba": 1}
+
+
+def test_longest_match_random_short():
+    # short strings: no junk heuristic
+    rng = RND.Random(1)
+    for _ in range(3000):
+        strings = ["".join(rng.choice("ab ") for _ in range(rng.randint(0, 9))) \
+                   for _ in range(rng.randint(2, 6))]
+        assert list(QGT.LongestMatchCounts(strings).items()) \
+            == list(PairwiseLongestMatches(strings, autojunk = False).items())
+
+
+def test_longest_match_random_long():
+    # long strings: difflib's autojunk applies
+    rng = RND.Random(2)
+    for _ in range(100):
+        strings = ["".join(rng.choice("abcde fgh") for _ in range(rng.randint(150, 260))) \
+                   for _ in range(rng.randint(2, 5))]
+        assert list(QGT.LongestMatchCounts(strings).items()) \
+            == list(PairwiseLongestMatches(strings).items())
+
+
+def test_longest_match_key():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    for node in tree.values():
+        names = [answer["name"].lower().strip() for answer in node["A"].values()]
+        assert list(QGT.LongestMatchCounts(names).items()) \
+            == list(PairwiseLongestMatches(names).items())
+
+
+#_______________________________________________________________________________
+#                 Clades
+#_______________________________________________________________________________
+
+def IterrowsClades(data):
+    # the row-by-row ExtractClades, which the column-wise version replaced
+    clades = {}
+    data["clade"] = float("nan")
+    data["clade"] = data["clade"].astype(str)
+
+    current = str(0)
+    current_t1 = None
+    clades[current] = ""
+
+    for idx, row in data.iterrows():
+        if row["type"] == "T1":
+            current = current_t1 = str(row["step"])
+            clades[current] = row["name"].strip()
+            continue
+
+        if row["type"] == "T2":
+            current = current_t1 + ">>"+ str(row["step"])
+            clades[current] = clades[current_t1] + " // " + QGT.CutString(row["name"], 60).strip()
+            continue
+
+        data.loc[idx, "clade"] = current
+
+    return data, clades
+
+
+def ReadKeyFrame():
+    import pandas as PD
+    data = PD.read_csv(KEY_FILE, sep = ",", header = 4)
+    data.rename(columns = {col: col.lower() for col in data.columns}, inplace = True)
+    return data
+
+
+def test_extract_clades():
+    reference, reference_clades = IterrowsClades(ReadKeyFrame())
+    data, clades = QGT.ExtractClades(ReadKeyFrame())
+
+    assert list(data["clade"]) == list(reference["clade"])
+    assert clades == reference_clades
+
+    # the pandas-free reader finds the same clades
+    assert QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4).clades == reference_clades
+
+
+def test_clade_index():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    InClade = lambda node, clade_idx, subclades: (node.clade == clade_idx) \
+        or (subclades and node.clade.startswith(clade_idx + ">>"))
+
+    # lookups equal a scan of all nodes
+    all_clades = tree.GetAllClades()
+    assert isinstance(all_clades, dict) and (list(all_clades.keys()) == list(tree.clades.keys()))
+    for clade_idx in tree.clades.keys():
+        for subclades in [False, True]:
+            scan = {step: node for step, node in tree.items() if InClade(node, clade_idx, subclades)}
+            members = tree.GetCladeMembers(clade_idx, subclades)
+            assert list(members.keys()) == list(scan.keys())
+            assert all(members[step] is node for step, node in scan.items())
+        assert all_clades[clade_idx].keys() == tree.GetCladeMembers(clade_idx).keys()
+    for tab in tree.clade_index.tabs:
+        assert tree.GetTabMembers(tab).keys() == tree.GetCladeMembers(tab, subclades = True).keys()
+
+    # the compact tree has the same
+    compact = tree.Compact()
+    assert {clade_idx: list(members.keys()) for clade_idx, members in compact.GetAllClades().items()} \
+        == {clade_idx: list(members.keys()) for clade_idx, members in all_clades.items()}
+
+    # moving a step there and back again restores the index
+    index = tree.clade_index.Copy()
+    index.Move("51", old_clade = tree["51"].clade, new_clade = "0")
+    assert "51" in index.Members("0") and "51" not in index.Members("50", subclades = True)
+    index.Move("51", old_clade = "0", new_clade = tree["51"].clade)
+    assert index == tree.clade_index
+
+
+#_______________________________________________________________________________
+#                 Nodes
+#_______________________________________________________________________________
+
+def MaskedBlocks(data):
+    # the per-step boolean masks, which the group-by pass replaced
+    columns = list(data.columns)
+    blocks = {}
+    for step in data["step"].unique():
+        rows = data.loc[data["step"].values == step, :]
+        blocks[step] = {}
+        for typ in rows["type"].unique():
+            typ_rows = QGT.RowsByType(rows, typ)
+            blocks[step][typ] = [(idx, dict(zip(columns, map(str, values)))) \
+                                 for idx, values in zip(typ_rows.index, typ_rows.values)]
+    return blocks
+
+
+def NodeContent(node):
+    # a node as plain data (the answers without their link back)
+    return {key: {answer_idx: {field: value for field, value in answer.items() if field != "node_link"} \
+                  for answer_idx, answer in value.items()} if key == "A" else value \
+            for key, value in node.items()}
+
+
+def test_split_blocks():
+    data, _ = QGT.ExtractClades(ReadKeyFrame())
+    blocks = dict(QGT.FrameSteps(data))
+    reference = MaskedBlocks(data)
+    assert list(blocks.keys()) == list(reference.keys())
+    for step, step_blocks in blocks.items():
+        assert sorted(step_blocks.items()) == sorted(reference[step].items())
+
+    # nodes from the blocks equal those from their rows
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4, engine = "pandas")
+    relink = dict(tree.adjusted.keys())
+    for step, node in tree.items():
+        row_node = QGT.TreeNode(tree, rows = data.loc[data["step"].values == step, :])
+        QGT.ApplyRelinks(row_node["A"].values(), relink)
+        assert NodeContent(row_node) == NodeContent(node)
+        assert (row_node.idx, row_node.clade, row_node.types) == (node.idx, node.clade, node.types)
+
+
+#_______________________________________________________________________________
+#                 Streaming
+#_______________________________________________________________________________
+
+def test_nodes_built_while_streaming(monkeypatch):
+    built = []
+    class CountedNode(QGT.TreeNode):
+        def __init__(self, *args, **kwargs):
+            super(CountedNode, self).__init__(*args, **kwargs)
+            built.append(self.idx)
+    monkeypatch.setattr(QGT, "TreeNode", CountedNode)
+
+    meta, clades, steps = QGT.StreamKey(KEY_FILE, sep = ",", header = 4)
+    def Steps():
+        # each step arrives once the one before is built
+        for nr, (step, blocks) in enumerate(steps):
+            assert len(built) == nr
+            yield step, blocks
+    tree = QGT.DecisionTree(meta = meta, clades = clades, steps = Steps())
+    assert sorted(built) == tree.steps
+
+
+def test_recurring_step(tmp_path):
+    key_file = tmp_path / "key.csv"
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_file.write_text(original.read() + "\n,,,,,,,\n2,I,extra info,,,,,\n2,A,nog een antwoord,60,,,,\n", \
+                            encoding = "utf-8")
+
+    tree = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+    meta, clades, step_blocks = QGT.ReadKey(str(key_file), sep = ",", header = 4)
+    collected = QGT.DecisionTree(meta = meta, clades = clades, steps = step_blocks.items())
+
+    assert tree.Compile() == collected.Compile()
+    assert tree.fingerprints == collected.fingerprints
+    assert [answer["name"] for answer in tree["2"]["A"].values()][-1] == "nog een antwoord"
+    assert tree["2"]["I"] == ["extra info"]
+    assert tree.adjusted == {("60", "60A"): 2}
+
+
+#_______________________________________________________________________________
+#                 Cache
+#_______________________________________________________________________________
+
+def test_tree_cache(tmp_path, monkeypatch):
+    key_file = tmp_path / "key.csv"
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_text = original.read()
+    key_file.write_text(key_text, encoding = "utf-8")
+    cache_dir = tmp_path / "cache"
+    Load = lambda: QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4, \
+                                             compact = True, cache_dir = str(cache_dir))
+
+    parsed = []
+    StreamKey = QGT.StreamKey
+    def CountedStreamKey(*args, **kwargs):
+        parsed.append(args[0])
+        return StreamKey(*args, **kwargs)
+    monkeypatch.setattr(QGT, "StreamKey", CountedStreamKey)
+
+    tree = Load()
+    assert (len(parsed) == 1) and (len(list(cache_dir.iterdir())) == 1)
+
+    # a hit: not parsed again
+    assert Load() == tree
+    assert len(parsed) == 1
+
+    # a new parser version invalidates the entry, which is replaced
+    monkeypatch.setattr(QGT, "PARSER_VERSION", QGT.PARSER_VERSION + 1)
+    assert Load() == tree
+    assert (len(parsed) == 2) and (len(list(cache_dir.iterdir())) == 1)
+
+    # as does a change of the file
+    key_file.write_text(key_text.replace("0,A,≤ 10%", "0,A,≤ 11%"), encoding = "utf-8")
+    changed = Load()
+    assert (len(parsed) == 3) and (changed != tree)
+    assert changed["0"]["A"][1]["name"] == "≤ 11%"
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # broken entries are rebuilt
+    cache_file, = cache_dir.iterdir()
+    cache_file.write_bytes(b"not a pickle")
+    assert Load() == changed
+    assert len(parsed) == 4
+
+
+#_______________________________________________________________________________
+#                 Other Formats
+#_______________________________________________________________________________
+# There is no spreadsheet writer among the dependencies:
+# the test files are written as the xml of their formats, in a zip archive.
+
+from xml.sax.saxutils import escape as XmlEscape
+
+def KeyRows():
+    import csv as CSV
+    with open(KEY_FILE, newline = "", encoding = "utf-8") as key_file:
+        return list(CSV.reader(key_file))
+
+
+def StepSpans(rows, header):
+    # {first row: n_rows} of the step cells of consecutive rows with the same step,
+    # to be merged in a spreadsheet (the others are left empty)
+    spans, first = {}, None
+    for nr, row in enumerate(rows):
+        step = row[0] if (nr > header) else ""
+        if (first is not None) and (step != "") and (step == rows[first][0]):
+            spans[first] = nr - first + 1
+        else:
+            first = nr if (step != "") else None
+    return spans
+
+
+def WriteXlsx(path, rows, header):
+    # an .xlsx file: the key on its second sheet, numbers as numbers,
+    # text as shared strings, empty rows left out, and the step cells merged
+    import zipfile as ZIP
+    strings = []
+    Column = lambda nr: chr(ord("A") + nr)
+    spans = StepSpans(rows, header)
+    covered = {nr for first, n_rows in spans.items() for nr in range(first + 1, first + n_rows)}
+
+    sheet_rows = []
+    for nr, row in enumerate(rows):
+        cells = []
+        for column, value in enumerate(row):
+            if (value == "") or ((column == 0) and (nr in covered)):
+                continue
+            reference = f"{Column(column)}{nr + 1}"
+            if value.isdigit():
+                cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+            else:
+                strings.append(value)
+                cells.append(f'<c r="{reference}" t="s"><v>{len(strings) - 1}</v></c>')
+        if len(cells) > 0:
+            sheet_rows.append(f'<row r="{nr + 1}">{"".join(cells)}</row>')
+    merges = "".join(f'<mergeCell ref="A{first + 1}:A{first + n_rows}"/>' for first, n_rows in spans.items())
+
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    relations = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    with ZIP.ZipFile(path, "w") as archive:
+        archive.writestr("xl/workbook.xml", \
+            f'<workbook xmlns="{main}" xmlns:r="{relations}"><sheets>' \
+            '<sheet name="info" sheetId="1" r:id="rId1"/><sheet name="sleutel" sheetId="2" r:id="rId2"/>' \
+            '</sheets></workbook>')
+        archive.writestr("xl/_rels/workbook.xml.rels", \
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">' \
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/>' \
+            '<Relationship Id="rId2" Target="worksheets/sheet2.xml"/></Relationships>')
+        archive.writestr("xl/sharedStrings.xml", \
+            f'<sst xmlns="{main}">' \
+            + "".join(f'<si><t xml:space="preserve">{XmlEscape(value)}</t></si>' for value in strings) \
+            + '</sst>')
+        archive.writestr("xl/worksheets/sheet1.xml", \
+            f'<worksheet xmlns="{main}"><sheetData><row r="1"><c r="A1" t="inlineStr"><is><t>info</t></is></c>' \
+            '</row></sheetData></worksheet>')
+        archive.writestr("xl/worksheets/sheet2.xml", \
+            f'<worksheet xmlns="{main}"><sheetData>{"".join(sheet_rows)}</sheetData>' \
+            f'<mergeCells count="{len(spans)}">{merges}</mergeCells></worksheet>')
+
+
+def WriteOds(path, rows, header):
+    # an .ods file: the key on its second sheet, numbers as floats, repeated
+    # spaces as <text:s/>, empty cells and rows repeated, and the step cells merged
+    import zipfile as ZIP
+    import re as RE
+    spans = StepSpans(rows, header)
+    covered = {nr for first, n_rows in spans.items() for nr in range(first + 1, first + n_rows)}
+    Text = lambda value: RE.sub(r"  +", lambda spaces: f' <text:s text:c="{len(spaces.group()) - 1}"/>', \
+                                XmlEscape(value))
+
+    table_rows = []
+    for nr, row in enumerate(rows):
+        cells = []
+        for column, value in enumerate(row):
+            span = f' table:number-rows-spanned="{spans[nr]}"' if (column == 0) and (nr in spans) else ""
+            if (column == 0) and (nr in covered):
+                cells.append('<table:covered-table-cell/>')
+            elif value == "":
+                cells.append('<table:table-cell/>')
+            elif value.isdigit():
+                cells.append(f'<table:table-cell office:value-type="float" office:value="{value}"{span}>' \
+                             f'<text:p>{value}</text:p></table:table-cell>')
+            else:
+                cells.append(f'<table:table-cell office:value-type="string"{span}>' \
+                             f'<text:p>{Text(value)}</text:p></table:table-cell>')
+        # padding, as spreadsheet programs write it
+        cells.append('<table:table-cell table:number-columns-repeated="1016"/>')
+        table_rows.append(f'<table:table-row>{"".join(cells)}</table:table-row>')
+    table_rows.append('<table:table-row table:number-rows-repeated="1048000">' \
+                      '<table:table-cell table:number-columns-repeated="1024"/></table:table-row>')
+
+    with ZIP.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/vnd.oasis.opendocument.spreadsheet")
+        archive.writestr("content.xml", \
+            '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" ' \
+            'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" ' \
+            'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:spreadsheet>' \
+            '<table:table table:name="info"><table:table-row><table:table-cell office:value-type="string">' \
+            '<text:p>info</text:p></table:table-cell></table:table-row></table:table>' \
+            f'<table:table table:name="sleutel">{"".join(table_rows)}</table:table>' \
+            '</office:spreadsheet></office:body></office:document-content>')
+
+
+def test_loader_parity(tmp_path):
+    # all formats give the tree of the csv file
+    import pyarrow.parquet as PQ
+    reference = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    Same = lambda tree: (tree.Compile() == reference.Compile()) and (tree.meta == reference.meta) \
+        and (tree.clades == reference.clades) and (tree.adjusted == reference.adjusted) \
+        and (tree.fingerprints == reference.fingerprints)
+
+    table = QGT.KeyTable(KEY_FILE, header = 4)
+    assert Same(QGT.DecisionTree.from_arrow(table))
+    PQ.write_table(table, str(tmp_path / "key.parquet"))
+    assert Same(QGT.DecisionTree.from_parquet(str(tmp_path / "key.parquet")))
+
+    rows = KeyRows()
+    WriteXlsx(str(tmp_path / "key.xlsx"), rows, header = 4)
+    WriteOds(str(tmp_path / "key.ods"), rows, header = 4)
+    for extension in ["xlsx", "ods"]:
+        path = str(tmp_path / f"key.{extension}")
+        # merged step cells are split up; empty rows are kept, as in the csv
+        assert [row for row in QGT.SpreadsheetRows(path, "sleutel")] \
+            == [[*row[:max((nr + 1 for nr, value in enumerate(row) if value != ""), default = 1)]] \
+                for row in rows]
+        assert Same(QGT.DecisionTree.from_spreadsheet(path, sheet = "sleutel"))
+        assert Same(QGT.DecisionTree.from_spreadsheet(path, sheet = 1))
+        # and via an Arrow table
+        assert Same(QGT.DecisionTree.from_arrow(QGT.KeyTable(path, 1, header = 4)))
+
+
+#_______________________________________________________________________________
+#                 Versions
+#_______________________________________________________________________________
+
+def KeyVersion(tmp_path, name, Edit = lambda lines: lines):
+    # a copy of the key, with some lines edited, as a tree
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        lines = original.read().splitlines()
+    key_file = tmp_path / f"{name}.csv"
+    key_file.write_text("\n".join(Edit(lines)) + "\n", encoding = "utf-8")
+    return QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+
+
+def test_merkle_diff(tmp_path):
+    tree = KeyVersion(tmp_path, "original")
+    descendants, _ = BruteReachability(tree)
+    ancestors = lambda step: {other for other in tree.steps if step in descendants[other]}
+
+    # row numbers do not count: a spacing row on top changes no hash
+    shifted = KeyVersion(tmp_path, "shifted", lambda lines: [*lines[:5], ",,,,,,,", *lines[5:]])
+    assert shifted["0"]["A"].keys() != tree["0"]["A"].keys()
+    assert shifted.Hashes() == tree.Hashes()
+    assert tree.Diff(shifted) == {"added": [], "removed": [], "changed": []}
+
+    # an edit changes the hashes of the step and of all steps above it, only
+    edited = KeyVersion(tmp_path, "edited", lambda lines: [line.replace("andere veenmossen", "andere mossen") \
+                                                           for line in lines])
+    changed_hashes = {step for step in tree.steps if edited.Hashes()[step] != tree.Hashes()[step]}
+    assert changed_hashes == {"52"} | ancestors("52")
+    assert tree["52"].Hash() != edited["52"].Hash()
+
+    # Diff finds the steps whose own content differs, as a full comparison does
+    def Versioned(lines):
+        lines = [line for line in lines if not line.startswith("76,")]
+        lines = [line.replace("jeneverbes: ≥ 10 ex. aanwezig,35", "jeneverbes: ≥ 12 ex. aanwezig,35") \
+                 for line in lines]
+        return [*lines, ",,,,,,,", "99,Q,Nieuwe vraag,,,,,", "99,A,ja,,9999,xx,,", "99,A,nee,,9998,yy,,"]
+    other = KeyVersion(tmp_path, "other", Versioned)
+    local, other_local = tree.MerkleHashes()["local_hashes"], other.MerkleHashes()["local_hashes"]
+    assert tree.Diff(other) == { \
+        "added": sorted(set(other.steps) - set(tree.steps)), \
+        "removed": sorted(set(tree.steps) - set(other.steps)), \
+        "changed": sorted(step for step in set(tree.steps) & set(other.steps) \
+                          if local[step] != other_local[step])}
+    assert tree.Diff(other) == {"added": ["99"], "removed": ["76"], "changed": ["2"]}
+    assert other.Diff(tree) == {"added": ["76"], "removed": ["99"], "changed": ["2"]}
+
+    # shared subtrees: the largest only
+    shared = QGT.SharedSubtrees({"original": tree, "edited": edited})
+    assert tree.Hashes()[tree.root.idx] not in shared
+    assert shared[tree.Hashes()["53"]] == [("original", "53"), ("edited", "53")]
+    for subtree_hash, where in shared.items():
+        for name, step in where:
+            assert not any(subtree_hash == tree.Hashes()[child.idx] \
+                           for parent in ancestors(step) if tree.Hashes()[parent] in shared \
+                           for terminal, child in tree[parent].Traverse() if not terminal)
+
+
+#_______________________________________________________________________________
+#                 Reload
+#_______________________________________________________________________________
+
+def test_reload_keeps_tree_on_build_error(tmp_path):
+    key_file = tmp_path / "key.csv"
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_text = original.read()
+    key_file.write_text(key_text, encoding = "utf-8")
+
+    tree = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+    nodes = dict(tree)
+    fingerprints, steps, clades = dict(tree.fingerprints), list(tree.steps), dict(tree.clades)
+
+    # a changed step, and a new step of only a header row, which cannot be built
+    key_file.write_text(key_text.replace("0,A,≤ 10%", "0,A,≤ 11%") \
+                        + "\n999,T2,a header without questions,,,,,\n", encoding = "utf-8")
+    try:
+        tree.Reload()
+        assert False, "Reload should fail"
+    except QGT.KeyBuildError:
+        pass
+
+    assert dict(tree) == nodes
+    assert all(tree[step] is node for step, node in nodes.items())
+    assert (tree.fingerprints, tree.steps, tree.clades) == (fingerprints, steps, clades)
+
+    # once the key is fixed, the reload goes through
+    key_file.write_text(key_text.replace("0,A,≤ 10%", "0,A,≤ 11%"), encoding = "utf-8")
+    changes = tree.Reload()
+    assert changes["changed"] == ["0"]
+    assert tree["0"]["A"][1]["name"] == "≤ 11%"
+
+
+def test_reload_equals_fresh_build(tmp_path):
+    # a sequence of edits, each reloaded into the same tree:
+    # the tree is as a fresh build of the edited file, and the change set covers the Diff
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        original_lines = original.read().splitlines()
+    key_file = tmp_path / "key.csv"
+    Write = lambda lines: key_file.write_text("\n".join(lines) + "\n", encoding = "utf-8")
+    Write(original_lines)
+    tree = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+
+    edits = [ \
+        # an answer text
+        lambda lines: [line.replace("jeneverbes: ≥ 10 ex. aanwezig,35", "jeneverbes: ≥ 12 ex. aanwezig,35") \
+                       for line in lines], \
+        # a step removed
+        lambda lines: [line for line in lines if not line.startswith("76,")], \
+        # a new step, linked from another
+        lambda lines: [line.replace("52,A,Anders,53,", "52,A,Anders,99,") for line in lines] \
+                      + [",,,,,,,", "99,Q,Nieuwe vraag,,,,,", "99,A,ja,53,,,,", "99,A,nee,,9999,xx,,"], \
+        # a clade relabeled, and a subclade header dropped
+        lambda lines: [line.replace("50,T1,Open heide en landduin", "50,T1,Open heide en duin") \
+                       for line in lines if not line.startswith("51,T2,")], \
+        # a real step "60": links to "60" no longer go to "60A"
+        lambda lines: [*lines, ",,,,,,,", "60,Q,Een stap 60,,,,,", "60,A,ja,,9998,yy,,"], \
+        # and back to the original
+        lambda lines: original_lines, \
+        ]
+
+    lines = original_lines
+    for version, Edit in enumerate(edits):
+        before = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+        lines = Edit(lines)
+        Write(lines)
+        changes = tree.Reload()
+        fresh = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+
+        assert tree.Compile() == fresh.Compile(), version
+        assert (tree.steps, tree.fingerprints, tree.adjusted, tree.clades, tree.meta) \
+            == (fresh.steps, fresh.fingerprints, fresh.adjusted, fresh.clades, fresh.meta)
+        assert dict(tree.clade_index) == dict(fresh.clade_index)
+        assert tree.clade_index.tabs == fresh.clade_index.tabs
+        assert tree.Hashes() == fresh.Hashes()
+
+        # the change set covers what a Diff finds
+        diff = before.Diff(fresh)
+        assert (changes["added"], changes["removed"]) == (diff["added"], diff["removed"])
+        assert set(diff["changed"]) <= set(changes["changed"])
+        assert not changes.IsEmpty()
+
+
+#_______________________________________________________________________________
+#                 Classification Expression
+#_______________________________________________________________________________
+
+import re as RE
+
+EXPRESSION_TOKENS = RE.compile(r"\s*(?:('(?:[^'\\]|''|\\.)*')|(@\w+)|(\w+)\s*\(|(\))|(,))")
+
+def EvaluateExpression(expression, record):
+    # evaluate the few QGIS expression functions of PathLabel, for one record
+    position = 0
+    def Parse():
+        nonlocal position
+        match = EXPRESSION_TOKENS.match(expression, position)
+        position = match.end()
+        if match.group(1):
+            return ("text", match.group(1)[1:-1].replace("''", "'"))
+        if match.group(2):
+            return ("variable", match.group(2)[1:])
+        arguments = []
+        while True:
+            match_next = EXPRESSION_TOKENS.match(expression, position)
+            if match_next.group(4) or match_next.group(5):
+                position = match_next.end()
+                if match_next.group(4):
+                    break
+                continue
+            arguments.append(Parse())
+        return ("call", match.group(3), arguments)
+
+    def Evaluate(node, variables):
+        if node[0] == "text":
+            return node[1]
+        if node[0] == "variable":
+            return variables[node[1]]
+        _, function, arguments = node
+        if function == "with_variable":
+            name, value = Evaluate(arguments[0], variables), Evaluate(arguments[1], variables)
+            return Evaluate(arguments[2], {**variables, name: value})
+        values = [Evaluate(argument, variables) for argument in arguments]
+        return {"map": lambda *v: dict(zip(v[::2], v[1::2])), \
+                "map_get": lambda table, key: table.get(key), \
+                "coalesce": lambda *v: next((value for value in v if value is not None), None), \
+                "concat": lambda *v: "".join("" if value is None else str(value) for value in v), \
+                "attribute": lambda name: record.get(name), \
+                }[function](*values)
+
+    return Evaluate(Parse(), {})
+
+
+def test_classification_expression_follows_path():
+    import pandas as PD
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    expression = tree.ClassificationExpression()
+
+    rng = RND.Random(3)
+    records = []
+    for nr in range(300):
+        walk = QGT.TreeWalk(tree.Compile())
+        record = {}
+        while True:
+            question = walk.Question()
+            if (question is None) or ((nr % 5 == 0) and (rng.random() < 0.1)):
+                break
+            answer_idx = rng.choice(question["answers"])["answer_idx"]
+            record[f"Answer_{walk.State()['path'][-1]}"] = str(answer_idx)
+            walk.Answer(answer_idx)
+
+        if nr % 3 == 0:
+            # answers off the path, e.g. of a changed earlier answer
+            for step in rng.sample(list(tree.keys()), 5):
+                record.setdefault(f"Answer_{step}", str(rng.choice(list(tree[step]["A"].keys()))))
+        records.append(record)
+
+    expected = tree.ClassifyBatch(PD.DataFrame(records))["classification"].tolist()
+    assert [EvaluateExpression(expression, record) for record in records] == expected
+
+
+#_______________________________________________________________________________
+#                 Validation
+#_______________________________________________________________________________
+
+def test_validate_key():
+    report = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4).Validate()
+
+    assert report.IsValid()
+    assert report["cycles"] == []
+    assert report["dangling"] == []
+    assert report["unreachable"] == ["24", "25", "26", "37", "76"]
+    # step 19 refers to the forest biotope by text
+    assert [step for step, _ in report["labels"]] == ["19"]
+
+
+def test_validate_dangling():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    tree["19"]["A"][79]["next_step"] = "99"
+    tree.compiled = None
+    report = tree.Validate()
+    assert report["dangling"] == [("19", "99")]
+    assert not report.IsValid()
+
+
+#_______________________________________________________________________________
+#                 Key Service
+#_______________________________________________________________________________
+
+def test_service_error_message():
+    from KeyService import ErrorMessage
+    assert ErrorMessage(KeyError("'x' is no answer to step 3.")) == "'x' is no answer to step 3."
+    assert ErrorMessage(KeyError("step 'x'")) == "step 'x'"
+    assert ErrorMessage(ValueError("'quoted'")) == "'quoted'"
+
+
+def test_tree_walk():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    compiled = tree.Compile()
+    walk = tree.Walk()
+    assert walk.Question()["step"] == tree.root.idx
+
+    # along a path to a classification, answer by answer
+    answers = []
+    while walk.Question() is not None:
+        question = walk.Question()
+        node = tree[question["step"]]
+        assert [answer["answer_idx"] for answer in question["answers"]] == list(node["A"].keys())
+        answers.append(question["answers"][-1]["answer_idx"])
+        walk.Answer(answers[-1])
+    assert walk.result == compiled.Label(compiled.AnswerLookup()[answers[-1]])
+
+    # restored from its token; not on another version of the tree
+    restored = QGT.TreeWalk.Deserialize(tree, walk.Serialize())
+    assert restored.State() == walk.State()
+    other = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    other["0"]["Q"] = "another question"
+    other.compiled = None
+    try:
+        QGT.TreeWalk.Deserialize(other, walk.Serialize())
+        assert False, "the token should not fit"
+    except ValueError:
+        pass
+
+    # back, and no answers of other steps
+    walk.Back(2)
+    assert (walk.answers, walk.result) == (answers[:-2], None)
+    current = walk.State()["path"][-1]
+    elsewhere = next(step for step in tree.steps if step != current)
+    try:
+        walk.Answer(next(iter(tree[elsewhere]["A"])))
+        assert False, "an answer of another step"
+    except KeyError:
+        pass
+    walk.Back(len(answers))
+    assert walk.State()["path"] == [tree.root.idx]
+
+
+def test_service_requests():
+    import asyncio as AIO
+    import json as JSON
+    from KeyService import KeyService, ServeConnection
+    service = KeyService(QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4), max_sessions = 2)
+
+    status, state = service.Handle("POST", "/session", {})
+    session = state["session"]
+    answer = state["question"]["answers"][0]["answer_idx"]
+    status, state = service.Handle("POST", f"/session/{session}/answer/{answer}", {})
+    assert (status, state["answers"]) == (200, [answer])
+    assert service.Handle("GET", "/walk", {"answers": [str(answer)]})[1]["path"] == state["path"]
+    assert service.Handle("POST", "/session", {"token": [state["token"]]})[1]["answers"] == [answer]
+    assert service.Handle("POST", f"/session/{session}/back", {})[1]["answers"] == []
+    assert service.Handle("GET", "/session/nope", {})[0] == 404
+
+    # the oldest sessions are dropped
+    service.Handle("POST", "/session", {})
+    assert (len(service.sessions) == 2) and (session not in service.sessions)
+
+    # over HTTP, with keep-alive; errors are reported with their message
+    async def Requests():
+        server = await AIO.start_server(lambda reader, writer: ServeConnection(service, reader, writer), \
+                                        "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await AIO.open_connection("127.0.0.1", port)
+        replies = []
+        for target in ["/walk?answers=", "/walk?answers=999999"]:
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+            status_line = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                key, value = line.decode("latin-1").split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers["content-length"]))
+            replies.append((status_line.split()[1], JSON.loads(body)))
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return replies
+    (first_status, first), (second_status, second) = AIO.run(Requests())
+    assert (first_status, first["path"]) == (b"200", [service.tree.root.idx])
+    assert (second_status, second["error"]) == (b"400", "999999 is no answer to step 0.")
+
+
+#_______________________________________________________________________________
+#                 Applying to Nodes
+#_______________________________________________________________________________
+
+def RecursiveCounts(tree):
+    # how often the recursive traversal, which ApplyToNodes replaced, visits each step
+    counts = {}
+    def Visit(node):
+        counts[node.idx] = counts.get(node.idx, 0) + 1
+        for terminal, child in node.Traverse():
+            if not terminal:
+                Visit(child)
+    Visit(tree.root)
+    return counts
+
+
+def test_apply_to_nodes():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    visited = []
+    results, counts = tree.ApplyToNodes(lambda node: visited.append(node.idx) or node["Q"], counts = True)
+
+    # once per reachable step, parents first
+    reference = RecursiveCounts(tree)
+    assert sorted(visited) == sorted(reference.keys())
+    assert counts == reference
+    position = {step: nr for nr, step in enumerate(visited)}
+    for step in visited:
+        assert all(position[step] < position[child.idx] \
+                   for terminal, child in tree[step].Traverse() if not terminal)
+    assert results == {step: tree[step]["Q"] for step in visited}
+
+    # the same in threads and processes (the tree is sent once per process)
+    assert tree.ApplyToNodes(str, workers = 4) == tree.ApplyToNodes(str)
+    assert tree.ApplyToNodes(str, workers = 2, processes = True) == tree.ApplyToNodes(str)
+
+
+def test_apply_counts_loops():
+    # steps in a loop are reached on endless paths
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    tree["2"]["A"][next(iter(tree["2"]["A"]))]["next_step"] = "0"
+    tree.compiled = None
+    _, counts = tree.ApplyToNodes(lambda node: None, counts = True)
+    assert counts["0"] == counts["2"] == float("inf")
+    assert counts["1"] == float("inf")
+
+
+#_______________________________________________________________________________
+#                 Graphs
+#_______________________________________________________________________________
+
+def test_graph_source():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    compiled = tree.Compile()
+    lines = tree.GraphSource().splitlines()
+    assert (lines[0], lines[-1]) == ("digraph G {", "}")
+    assert len(lines) == len(set(lines))
+
+    # every edge of the tree, once
+    edges = set()
+    for step, node in tree.items():
+        for (terminal, child), aid in zip(node.Traverse(), compiled.AnswerIds(step)):
+            edges.add((step, compiled.Label(aid) if terminal else child.idx))
+    reachable = tree.ApplyToNodes(lambda node: None).keys()
+    expected = {f"{QGT.DotQuote(step)} -> {QGT.DotQuote(child)};" for step, child in edges if step in reachable}
+    assert {line for line in lines if " -> " in line} == expected
+
+    # per tab: the nodes of the tab, and dashed stubs where links leave it
+    tabs = sorted(set(compiled.Tab(nid) for nid in range(len(compiled.steps))))
+    drawn = set()
+    for tab in tabs:
+        source = tree.GraphSource(tab)
+        for step in reachable:
+            if compiled.Tab(compiled.step_lookup[step]) == tab:
+                assert f"{QGT.DotQuote(step)};" in source
+                drawn.add(step)
+            elif f"{QGT.DotQuote(step)};" in source.splitlines():
+                assert False, (tab, step)
+    assert drawn == set(reachable)
+
+
+def test_print_graph_renders_changes(tmp_path, monkeypatch):
+    # (without graphviz: `dot` only writes its input)
+    import subprocess as SP
+    rendered = []
+    def Dot(command, input = None, check = False):
+        output = command[command.index("-o") + 1]
+        rendered.append(output)
+        with open(output, "wb") as dot_out:
+            dot_out.write(input)
+    monkeypatch.setattr(SP, "run", Dot)
+
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    filename = str(tmp_path / "graph.svg")
+    outputs = tree.PrintGraph(filename, split = True, workers = 4)
+    assert sorted(outputs) == sorted(rendered) and (len(outputs) > 1)
+    for output in outputs:
+        tab = output[len(str(tmp_path / "graph_")):-len(".svg")]
+        with open(output, encoding = "utf-8") as graph:
+            assert graph.read() == tree.GraphSource(tab)
+
+    # unchanged graphs are not rendered again
+    assert tree.PrintGraph(filename, split = True, workers = 4) == []
+    assert tree.PrintGraph(filename) == [filename]
+    assert tree.PrintGraph(filename) == []
+
+
+#_______________________________________________________________________________
+#                 Reachability
+#_______________________________________________________________________________
+
+def BruteReachability(tree):
+    # descendants and labels of each step, by a search from every step
+    compiled = tree.Compile()
+    successors = {step: [child.idx for terminal, child in tree[step].Traverse() if not terminal] \
+                  for step in tree.steps}
+    labels = {step: {compiled.Label(aid) for aid in compiled.AnswerIds(step) \
+                     if compiled.answer_target[aid] < 0} for step in tree.steps}
+    descendants = {}
+    for step in tree.steps:
+        seen, queue = set(), list(successors[step])
+        while queue:
+            child = queue.pop()
+            if child not in seen:
+                seen.add(child)
+                queue.extend(successors[child])
+        descendants[step] = seen
+    reached_labels = {step: set(labels[step]).union(*[labels[other] for other in descendants[step]]) \
+                      for step in tree.steps}
+    return descendants, reached_labels
+
+
+def CheckReachability(tree):
+    index = tree.Reachability()
+    descendants, reached_labels = BruteReachability(tree)
+    root = tree.root.idx
+    for step in tree.steps:
+        assert set(index.Descendants(step)) == descendants[step], step
+        assert set(index.Ancestors(step)) == {other for other in tree.steps if step in descendants[other]}
+        assert set(index.Classifications(step)) == reached_labels[step]
+        for other in tree.steps:
+            assert index.CanReach(step, other) == (other in descendants[step])
+    for label in index.labels:
+        assert set(index.StepsTo(label, from_root = False)) \
+            == {step for step in tree.steps if label in reached_labels[step]}
+        assert set(index.StepsTo(label)) \
+            == {step for step in tree.steps if (label in reached_labels[step]) \
+                and ((step == root) or (step in descendants[root]))}
+        assert all(index.CanReach(step, label) == (label in reached_labels[step]) for step in tree.steps)
+
+
+def test_reachability():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    CheckReachability(tree)
+
+    # with a loop: steps in it reach each other, and themselves
+    loop = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    loop["2"]["A"][next(iter(loop["2"]["A"]))]["next_step"] = "0"
+    loop.compiled = None
+    CheckReachability(loop)
+    assert loop.Reachability().CanReach("0", "0") and not tree.Reachability().CanReach("0", "0")
+
+
+#_______________________________________________________________________________
+#                 Batch Classification
+#_______________________________________________________________________________
+
+def FieldRecords(tree, n_records, seed):
+    # answers as a surveyor leaves them: along a path, sometimes stopped early,
+    # with answers off the path and some which are no answer to their step
+    rng = RND.Random(seed)
+    compiled = tree.Compile()
+    records = []
+    for nr in range(n_records):
+        walk, record = QGT.TreeWalk(compiled), {}
+        while (walk.Question() is not None) and (rng.random() > 0.05):
+            answer_idx = rng.choice(walk.Question()["answers"])["answer_idx"]
+            record[f"Answer_{walk.State()['path'][-1]}"] = str(answer_idx)
+            walk.Answer(answer_idx)
+        if nr % 3 == 0:
+            for step in rng.sample(list(tree.keys()), 4):
+                record.setdefault(f"Answer_{step}", str(rng.choice(list(tree[step]["A"].keys()))))
+        if (nr % 11 == 0) and (len(record) > 0):
+            record[rng.choice(list(record.keys()))] = rng.choice(["0", "x", " ", "1.5"])
+        records.append(record)
+    return records
+
+
+def WalkRecord(tree, record):
+    # one record along the tree, with a TreeWalk (as ClassifyBatch reports it)
+    walk = QGT.TreeWalk(tree.Compile())
+    missing = invalid = False
+    while walk.Question() is not None:
+        value = str(record.get(f"Answer_{walk.State()['path'][-1]}", "")).strip()
+        if value == "":
+            missing = True
+            break
+        try:
+            walk.Answer(int(value))
+        except (KeyError, ValueError):
+            invalid = True
+            break
+    path = walk.State()["path"]
+    answered = {column[len("Answer_"):] for column, value in record.items() if str(value).strip() != ""}
+    return {"classification": walk.result, "step": path[-1], "path": ">".join(path), \
+            "missing": missing, "invalid": invalid, "stale": len(answered - set(path)) > 0, \
+            "loop": False}
+
+
+def test_classify_batch():
+    import pandas as PD
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    records = FieldRecords(tree, 500, seed = 7)
+    data = PD.DataFrame(records, index = PD.RangeIndex(1000, 1000 + len(records)))
+
+    result = tree.ClassifyBatch(data)
+    assert list(result.index) == list(data.index)
+    for (_, row), record in zip(result.iterrows(), records):
+        expected = WalkRecord(tree, record)
+        assert {column: row[column] for column in expected.keys()} == expected, record
+
+    # the compact tree, and an Arrow table, give the same
+    import pyarrow as PA
+    assert tree.Compact().ClassifyBatch(data).equals(result)
+    assert tree.ClassifyBatch(PA.Table.from_pandas(data, preserve_index = True)).equals(result)
+
+
+def test_check_consistency():
+    import pandas as PD
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    compiled = tree.Compile()
+    Tab = lambda step: compiled.Tab(compiled.step_lookup[step])
+    tabs = sorted(set(map(Tab, tree.steps)))
+
+    rng = RND.Random(8)
+    records = FieldRecords(tree, 300, seed = 8)
+    for record in records:
+        for tab in rng.sample(tabs, 2):
+            record[f"showall_tab{tab}"] = rng.choice(["true", "false", "1", "0", "", "maybe"])
+    features, steps = tree.CheckConsistency(PD.DataFrame(records))
+
+    per_step = {}
+    for (_, row), record in zip(features.iterrows(), records):
+        path = WalkRecord(tree, record)["path"].split(">")
+        showall = {column[len("showall_tab"):]: value for column, value in record.items() \
+                   if column.startswith("showall_tab")}
+        answered = [step for step in compiled.steps \
+                    if str(record.get(f"Answer_{step}", "")).strip() != ""]
+        stale = [step for step in answered if step not in path]
+        hidden = [step for step in stale if showall.get(Tab(step), "") not in ("true", "1")]
+        assert row["stale_steps"] == ",".join(stale)
+        assert (row["n_stale"], row["n_hidden"]) == (len(stale), len(hidden))
+        assert row["showall_invalid"] == ",".join(tab for tab in tabs if showall.get(tab, "") == "maybe")
+        entered = set(map(Tab, path))
+        assert row["showall_unused"] == ",".join(tab for tab in tabs \
+                                                 if (showall.get(tab, "") in ("true", "1")) \
+                                                 and (tab not in entered))
+        for step in answered:
+            counts = per_step.setdefault(step, [0, 0, 0])
+            counts[0] += 1
+            counts[1] += step in stale
+            counts[2] += step in hidden
+
+    assert {step: list(counts) for step, counts in steps.iterrows() if counts["n_answered"] > 0} \
+        == per_step
+    assert (features["n_stale"] > 0).any() and (features["showall_unused"] != "").any()
+
+
+#_______________________________________________________________________________
+#                 Compact Tree
+#_______________________________________________________________________________
+
+def test_compact_tree_views():
+    import pickle as PKL
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    compact = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4, compact = True)
+    assert compact == tree.Compact()
+    assert list(compact.keys()) == tree.steps
+    assert compact.root.idx == tree.root.idx
+
+    for step, node in tree.items():
+        view = compact[step]
+        assert (view.idx, view.clade, view["Q"], view.get("I")) \
+            == (node.idx, node.clade, node["Q"], node.get("I"))
+        assert list(view["A"].keys()) == list(node["A"].keys())
+        for answer_idx, answer in node["A"].items():
+            assert [view["A"][answer_idx][field] for field in QGT.CompactTree.answer_fields] \
+                == [answer[field] for field in QGT.CompactTree.answer_fields]
+        assert [(terminal, child["name"] if terminal else child.idx) for terminal, child in view.Traverse()] \
+            == [(terminal, child["name"] if terminal else child.idx) for terminal, child in node.Traverse()]
+        assert str(view) == str(node)
+
+    # pickled as bytes, and frozen again
+    restored = PKL.loads(PKL.dumps(compact))
+    assert (restored == compact) and (hash(restored) == hash(compact))
+    assert str(restored["2"]) == str(compact["2"])
+    try:
+        restored.steps = ()
+        assert False, "a CompactTree should be frozen"
+    except AttributeError:
+        pass
+
+
+#_______________________________________________________________________________
+#                 Compiled Tree
+#_______________________________________________________________________________
+
+def test_compiled_clade_index():
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    compiled = tree.Compile()
+
+    # the compiled tree has its own, read-only clade index
+    assert compiled.clade_index is not tree.clade_index
+    assert compiled.clade_index.Members("50", subclades = True) \
+        == tuple(tree.clade_index.Members("50", subclades = True))
+    try:
+        compiled.clade_index["50"]["members"] = ()
+        assert False, "the clade index should be read-only"
+    except TypeError:
+        pass
+
+    # ... which is part of its content hash
+    tree.clade_index = tree.clade_index.Copy()
+    tree.clade_index.Move("51", old_clade = tree["51"].clade, new_clade = "0")
+    assert tree.Compact() != compiled
+
+
+def test_compiled_derived_once():
+    from concurrent.futures import ThreadPoolExecutor
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+    with ThreadPoolExecutor(max_workers = 8) as pool:
+        indices = list(pool.map(lambda _: tree.Reachability(), range(32)))
+        questions = list(pool.map(lambda _: tree.Compile().QuestionData(0), range(32)))
+    assert all(index is indices[0] for index in indices)
+    assert all(question is questions[0] for question in questions)
+
+
+#_______________________________________________________________________________
+#                 Forests
+#_______________________________________________________________________________
+
+SUBKEY_LINES = ["Key,BOSSEN_STRUWELEN,,,,,,", "Titel,Bossen en struwelen,,,,,,", \
+                "Versie,test,,,,,,", "Auteurs,xxyy,,,,,,", \
+                "STEP,TYPE,NAME,NEXT_STEP,CLASSIFICATION,BWK_CODE,SUBKEY,REMARK", \
+                "0,Q,Boomlaag,,,,,", \
+                "0,A,loofhout,1,,,,", \
+                "0,A,naaldhout,,9190,qb,,", \
+                "1,Q,Ondergroei,,,,,", \
+                "1,A,heide,,9190_hd,qs,,", \
+                "1,A,anders,,rest,x,,"]
+
+def ForestDirectory(tmp_path, subkey_lines = SUBKEY_LINES):
+    # the Heidesleutel, and a small sub key it links to
+    directory = tmp_path / "sleutels"
+    directory.mkdir()
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        (directory / "Heidesleutel.csv").write_text(original.read(), encoding = "utf-8")
+    (directory / "bossen.csv").write_text("\n".join(subkey_lines) + "\n", encoding = "utf-8")
+    return str(directory)
+
+
+def ForestRecords(forest, key, n_records, seed):
+    # answers along walks across keys, sometimes stopped early
+    # (answers in sub keys go to columns `Answer_{sub key}_{step}`)
+    rng = RND.Random(seed)
+    records = []
+    for _ in range(n_records):
+        walk, record = forest.Walk(key), {}
+        while (walk.Question() is not None) and (rng.random() > 0.03):
+            current, step = walk.State()["path"][-1]
+            answer_idx = rng.choice(walk.Question()["answers"])["answer_idx"]
+            record["Answer_" + (f"{current}_" if current != key else "") + step] = str(answer_idx)
+            walk.Answer(answer_idx)
+        records.append(record)
+    return records
+
+
+def WalkForestRecord(forest, key, record):
+    # one record across the keys, with a ForestWalk
+    walk = forest.Walk(key)
+    while walk.Question() is not None:
+        current, step = walk.State()["path"][-1]
+        value = record.get("Answer_" + (f"{current}_" if current != key else "") + step, "")
+        if str(value).strip() == "":
+            break
+        walk.Answer(int(value))
+    state = walk.State()
+    paths = {}
+    for current, step in state["path"]:
+        paths.setdefault(current, []).append(step)
+    return {"key": state["key"], "classification": state["classification"], \
+            "step": state["path"][-1][1], \
+            "path": ">".join(f"{current}:" + ">".join(steps) for current, steps in paths.items())}
+
+
+def test_forest(tmp_path):
+    import pandas as PD
+    directory = ForestDirectory(tmp_path)
+    forest = QGT.DecisionForest(directory, capacity = 1, workers = 0)
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+
+    # keys by their meta info, sub keys regardless of case
+    assert sorted(forest.keys()) == ["BOSSEN_STRUWELEN", "Heidesleutel"]
+    assert forest.Resolve(" bossen_struwelen") == "BOSSEN_STRUWELEN"
+    assert forest.Resolve("GRASLANDEN") is None
+    compiled = tree.Compile()
+    Subkeys = lambda step: [forest.Subkey("Heidesleutel", aid) for aid in compiled.AnswerIds(step)]
+    assert Subkeys("1") == [None, None, "BOSSEN_STRUWELEN"]
+
+    # only `capacity` trees are kept; the others are loaded again on demand
+    assert forest["Heidesleutel"] == compiled
+    assert list(forest.trees.keys()) == ["Heidesleutel"]
+    assert list(forest["BOSSEN_STRUWELEN"].steps) == ["0", "1"]
+    assert list(forest.trees.keys()) == ["BOSSEN_STRUWELEN"]
+
+    # a batch across keys is classified as by a walk per record
+    records = ForestRecords(forest, "Heidesleutel", 300, seed = 11)
+    assert sum(1 for record in records if any("BOSSEN_STRUWELEN_" in column for column in record)) > 10
+    result = forest.ClassifyBatch(PD.DataFrame(records), "Heidesleutel")
+    for (_, row), record in zip(result.iterrows(), records):
+        expected = WalkForestRecord(forest, "Heidesleutel", record)
+        found = {column: row[column] for column in expected.keys()}
+        found["classification"] = None if PD.isna(found["classification"]) else found["classification"]
+        assert found == expected, record
+        assert not row["loop"]
+
+    # links to keys which are not in the forest dangle
+    reports = forest.Validate()
+    dangling = {(step, name) for step, name in reports["Heidesleutel"]["dangling"]}
+    assert {name for _, name in dangling} == {"GRASLANDEN", "GRASLAND_HT6230", "GRASLAND", \
+                                              "WATEREN", "RUIGTEN_PIONIER"}
+    assert ("12B", "GRASLANDEN") in dangling
+    assert not any(name == "BOSSEN_STRUWELEN" for _, name in dangling)
+    assert reports["BOSSEN_STRUWELEN"]["dangling"] == []
+    assert all(report["cycles"] == [] for report in reports.values())
+
+    # loading in a process pool gives the same trees
+    pooled = QGT.DecisionForest(directory, workers = 2)
+    assert all(pooled[key] == forest[key] for key in forest.keys())
+
+
+def test_forest_cycles(tmp_path):
+    # a sub key which links back to the main key
+    subkey_lines = [line.replace("1,A,anders,,rest,x,,", "1,A,anders,SLEUTEL,,,HEIDESLEUTEL,") \
+                    for line in SUBKEY_LINES]
+    forest = QGT.DecisionForest(ForestDirectory(tmp_path, subkey_lines), workers = 0)
+    reports = forest.Validate()
+    for key in forest.keys():
+        assert [sorted(cycle) for cycle in reports[key]["cycles"]] == [["BOSSEN_STRUWELEN", "Heidesleutel"]]
+
+
+#_______________________________________________________________________________
+#                 Forms (headless)
+#_______________________________________________________________________________
+
+def HeadlessModule(name, monkeypatch):
+    # a form script, imported with the pure-Python form model (see HeadlessForms)
+    import importlib as IL
+    import sys as SYS
+    monkeypatch.setenv("QGIS_HEADLESS", "1")
+    monkeypatch.delitem(SYS.modules, name, raising = False)
+    return IL.import_module(name)
+
+
+def test_form_reload_traverses_new_nodes(tmp_path, monkeypatch):
+    AM = HeadlessModule("AssembleMolenheide", monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    key_file = tmp_path / "key.csv"
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_text = original.read()
+    key_file.write_text(key_text, encoding = "utf-8")
+
+    tree = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+    with AM.QgisSession() as session:
+        form = AM.QgisFormDecisionTree(tree = tree, project = session.Project("key.qgs"), name = "key")
+        assert all(node.tree is form for node in form.values())
+
+        # step 2 changes; step 0, which leads there, does not
+        key_file.write_text(key_text.replace("≥ 10 ex. aanwezig", "≥ 12 ex. aanwezig"), encoding = "utf-8")
+        changes = form.Reload()
+        assert changes["changed"] == ["2"]
+
+        children = [child for terminal, child in form["0"].Traverse() if not terminal]
+        assert any(child is form["2"] for child in children)
+        assert "≥ 12 ex. aanwezig" in str(form["2"])
+
+    # the tree the form was built from stays as it was
+    assert tree["2"].tree is tree
+    assert "≥ 10 ex. aanwezig" in str(tree["2"])
+
+
+def test_session_joins_running_application(tmp_path, monkeypatch):
+    QS = HeadlessModule("QgisSessions", monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    with QS.QgisSession() as session:
+        assert session.owner and (QS.QgsApplication.instance() is session.app)
+
+        # a second session joins the application, and only closes its own projects
+        with QS.QgisSession() as inner:
+            assert (inner.app is session.app) and not inner.owner
+            inner.Project("inner.qgs")
+            assert len(inner.projects) == 1
+        assert len(inner.projects) == 0
+        assert QS.QgsApplication.instance() is session.app
+
+        # one application per process
+        try:
+            QS.QgsApplication([], False)
+            assert False, "a second QgsApplication should fail"
+        except RuntimeError:
+            pass
+
+    assert QS.QgsApplication.instance() is None
+
+
+def test_batch_projects(tmp_path, monkeypatch):
+    # one project per key, in one session; each holds only its own layers,
+    # and is written as if it had been built alone
+    AM = HeadlessModule("AssembleMolenheide", monkeypatch)
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_text = original.read()
+    for name in ["alone", "batch"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "geodata").symlink_to(OS.path.join(REPO_DIR, "geodata"))
+        (tmp_path / name / "heide.csv").write_text(key_text, encoding = "utf-8")
+    (tmp_path / "batch" / "bossen.csv").write_text("\n".join(SUBKEY_LINES) + "\n", encoding = "utf-8")
+
+    initialized = []
+    monkeypatch.setattr(AM.QgsApplication, "initQgis", lambda app: initialized.append(app))
+    LayerNames = lambda path: RE.findall(r"<layername>([^<]*)</layername>", path.read_text(encoding = "utf-8"))
+
+    monkeypatch.chdir(tmp_path / "batch")
+    with AM.QgisSession() as session:
+        project_files = AM.AssembleKeyProjects(session, ["bossen.csv", "heide.csv"])
+        assert [str(path) for path in project_files] == ["bossen.qgs", "heide.qgs"]
+        assert session.projects == []
+    assert len(initialized) == 1
+    assert AM.QgsApplication.instance() is None
+    for name in ["bossen", "heide"]:
+        assert sorted(LayerNames(tmp_path / "batch" / f"{name}.qgs")) \
+            == sorted(["Google Satellite", "buildings", "points", name])
+
+    monkeypatch.chdir(tmp_path / "alone")
+    with AM.QgisSession() as session:
+        AM.AssembleKeyProjects(session, ["heide.csv"])
+    assert (tmp_path / "alone" / "heide.qgs").read_bytes() == (tmp_path / "batch" / "heide.qgs").read_bytes()
+
+    # an error in the session still closes the projects and the application
+    try:
+        with AM.QgisSession() as session:
+            session.Project("broken.qgs")
+            raise ValueError("broken")
+    except ValueError:
+        pass
+    assert session.projects == []
+    assert AM.QgsApplication.instance() is None
+
+
+def EvaluateVisibility(expression, record):
+    # evaluate a visibility expression (see AnyEquals, AnsweredCount, NoOtherAnswered)
+    # for one record (of field values), by translation to python
+    python = RE.sub(r"\"(\w+)\"|\b(showall_tab\d+)\b", \
+                    lambda match: f"values.get({(match.group(1) or match.group(2))!r})", expression)
+    for qgis, replacement in ((" IS NULL", " is None"), (" <> ", " != "), (" = ", " == "), \
+                              (" IN ", " in "), (" AND ", " and "), (" OR ", " or "), \
+                              ("TRUE", "True"), ("if(", "IF(")):
+        python = python.replace(qgis, replacement)
+    return eval(python, {"IF": lambda condition, yes, no: yes if condition else no, "values": record})
+
+
+def test_compact_form_expressions(tmp_path, monkeypatch):
+    # the compact form shows the same containers, with less text per container
+    AM = HeadlessModule("AssembleMolenheide", monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    tree = QGT.DecisionTree.from_csv(KEY_FILE, sep = ",", header = 4)
+
+    def Visibilities(form):
+        containers = {f"Q{idx}": block.container for idx, block in form.question_blocks.items()}
+        containers.update({f"tab{tab}": container for tab, container in form.containers.items()})
+        containers.update({f"C{nr}": container for nr, container \
+                           in enumerate(form.containers["besluit"].children())})
+        return {key: container.visibilityExpression().data().expression() \
+                for key, container in containers.items() \
+                if container.visibilityExpression().enabled()}
+
+    with AM.QgisSession() as session:
+        plain, compact = [AM.QgisFormDecisionTree(tree = tree, project = session.Project(f"{name}.qgs"), \
+                                                  name = name, compact_expressions = is_compact) \
+                          for name, is_compact in (("plain", False), ("compact", True))]
+        plain_expressions, compact_expressions = Visibilities(plain), Visibilities(compact)
+        hidden = {field.name(): expression for field, expression in compact.layer.expression_fields}
+
+    assert plain_expressions.keys() == compact_expressions.keys()
+    assert len(plain.layer.expression_fields) == 0
+    assert {name for name in hidden if name.startswith("decided_tab")}
+    assert RE.fullmatch(r"\(\"decided_tab\d+\" = TRUE\)( OR \(\"decided_tab\d+\" = TRUE\))*", \
+                        compact_expressions["tabbesluit"])
+
+    # measured on the Heidesleutel (characters of expression text):
+    #     plain:   8211 in the containers (besluit alone: 2181)
+    #     compact: 5641 in the containers (besluit: 275), and 2716 in hidden fields,
+    #              which are evaluated once per edit rather than per container
+    plain_length = sum(map(len, plain_expressions.values()))
+    compact_length = sum(map(len, compact_expressions.values()))
+    hidden_length = sum(map(len, hidden.values()))
+    print(f"container text: {plain_length} -> {compact_length} (+ {hidden_length} in hidden fields)")
+    assert compact_length < 0.7 * plain_length
+    assert len(compact_expressions["tabbesluit"]) < 0.2 * len(plain_expressions["tabbesluit"])
+    assert compact_length + hidden_length < 1.05 * plain_length
+
+    # same visibility, on records along the paths of the tree (and some off them)
+    rng = RND.Random(5)
+    compiled = tree.Compile()
+    for nr in range(200):
+        walk, record = QGT.TreeWalk(compiled), {}
+        while (walk.Question() is not None) and (rng.random() > 0.05):
+            answer_idx = rng.choice(walk.Question()["answers"])["answer_idx"]
+            record[f"Answer_{walk.State()['path'][-1]}"] = int(answer_idx)
+            walk.Answer(answer_idx)
+        if nr % 4 == 0:
+            for step in rng.sample(list(tree.keys()), 3):
+                record[f"Answer_{step}"] = int(rng.choice(list(tree[step]["A"].keys())))
+        if nr % 7 == 0:
+            record[f"showall_tab{rng.choice(list(plain.tabs))}"] = True
+
+        # (the hidden fields first)
+        compact_record = {**record, **{name: EvaluateVisibility(expression, record) \
+                                       for name, expression in hidden.items()}}
+        for key, expression in plain_expressions.items():
+            assert EvaluateVisibility(expression, record) \
+                == EvaluateVisibility(compact_expressions[key], compact_record), (key, record)
+
+
+def QuadraticVisibilities(tree):
+    # the question visibility expressions as the form built them before the
+    # predecessor index: every question scans the answers of all others in its tab
+    compiled = tree.Compile()
+    expressions = {}
+    for idx in tree.steps:
+        this_tab = compiled.Tab(compiled.step_lookup[idx])
+        successor_indices, null_indices = [], []
+        for idx2, node2 in tree.GetCladeMembers(this_tab).items():
+            if idx2 == idx:
+                continue
+            successor = None
+            for answer_idx2, answer2 in node2["A"].items():
+                if answer2["next_step"] == idx:
+                    successor = answer_idx2
+            if successor is not None:
+                successor_indices.append((idx2, successor))
+            else:
+                null_indices.append(idx2)
+
+        if len(successor_indices) == 0:
+            expression = " AND ".join(f"(\"Answer_{idx2}\" IS NULL)" for idx2 in null_indices) or "TRUE"
+        else:
+            expression = " OR ".join(f"(\"Answer_{idx2}\" = {successor})" \
+                                     for idx2, successor in successor_indices)
+        expressions[idx] = f"(showall_tab{this_tab} = TRUE) OR ({expression})"
+    return expressions
+
+
+def test_question_visibilities(tmp_path, monkeypatch):
+    # the visibility of each question, from the predecessor index,
+    # is the text which scanning the tab gives; also after a reload
+    AM = HeadlessModule("AssembleMolenheide", monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    key_file = tmp_path / "key.csv"
+    with open(KEY_FILE, encoding = "utf-8") as original:
+        key_text = original.read()
+    key_file.write_text(key_text, encoding = "utf-8")
+
+    QuestionVisibilities = lambda form: {idx: block.container.visibilityExpression().data().expression() \
+                                         for idx, block in form.question_blocks.items()}
+    tree = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+    with AM.QgisSession() as session:
+        form = AM.QgisFormDecisionTree(tree = tree, project = session.Project("key.qgs"), name = "key")
+        assert QuestionVisibilities(form) == QuadraticVisibilities(tree)
+
+        # step 14 no longer leads to 16, but to a new step 17B, in the same tab
+        key_file.write_text(key_text.replace("14,A,Anders,16,", "14,A,Anders,17B,") \
+                            + ",,,,,,,\n17B,Q,Nieuwe vraag,,,,,\n17B,A,ja,16,,,,\n17B,A,nee,,9999,xx,,\n", \
+                            encoding = "utf-8")
+        changes = form.Reload()
+        assert changes["added"] == ["17B"]
+        fresh = QGT.DecisionTree.from_csv(str(key_file), sep = ",", header = 4)
+        assert QuestionVisibilities(form) == QuadraticVisibilities(fresh)
+
+
+FORM_FIXTURE = OS.path.join(REPO_DIR, "fixtures", "form_qgis-3.40.qgs")
+
+# the form sections of a layer (see HeadlessForms.WriteForm)
+FORM_SECTIONS = ["fieldConfiguration", "defaults", "expressionfields", \
+                 "editform", "editorlayout", "attributeEditorForm", "labelOnTop"]
+
+def SampleForm(Q, project):
+    # a small form, with the elements of the decision tree forms, built with
+    # the classes of `Q` (qgis.core, or HeadlessForms)
+    layer = Q.QgsVectorLayer("Point", "form", "memory")
+    layer.dataProvider().addAttributes([Q.QgsField("Answer_0", Q.QMetaType.Type.Int), \
+                                        Q.QgsField("classification", Q.QMetaType.Type.QString), \
+                                        Q.QgsField("showall_tab0", Q.QMetaType.Type.Bool)])
+    layer.updateFields()
+    layer.addExpressionField("if(\"Answer_0\" IS NULL, 0, 1)", \
+                             Q.QgsField("answered_tab0", Q.QMetaType.Type.Int))
+
+    layer.setEditorWidgetSetup(0, Q.QgsEditorWidgetSetup("ValueMap", \
+                                                         {"map": [{"ja (1)": 1}, {"nee & <2>": 2}]}))
+    layer.setEditorWidgetSetup(1, Q.QgsEditorWidgetSetup("TextEdit", \
+                                                         {"IsMultiline": False, "UseHtml": False}))
+    layer.setEditorWidgetSetup(2, Q.QgsEditorWidgetSetup("CheckBox", \
+                                                         {"CheckedState": "", "UncheckedState": "", \
+                                                          "TextDisplayMethod": 0}))
+    layer.setEditorWidgetSetup(3, Q.QgsEditorWidgetSetup("Hidden", {}))
+    layer.setDefaultValueDefinition(1, Q.QgsDefaultValue("if(\"Answer_0\" = 1, 'heide', NULL)", True))
+
+    config = layer.editFormConfig()
+    config.setLayout(Q.Qgis.AttributeFormLayout.DragAndDrop)
+    root = config.invisibleRootContainer()
+    root.clear()
+
+    tab = Q.QgsAttributeEditorContainer("Tab 0", root)
+    tab.setType(Q.Qgis.AttributeEditorContainerType.Tab)
+    tab.setVisibilityExpression(Q.QgsOptionalExpression( \
+        Q.QgsExpression("(\"showall_tab0\" = TRUE) OR (\"answered_tab0\" = 0)")))
+    question = Q.QgsAttributeEditorContainer("Question 0", tab)
+    question.setType(Q.Qgis.AttributeEditorContainerType.GroupBox)
+    info = Q.QgsAttributeEditorTextElement("info", question)
+    info.setText("Is er \"heide\"?\n(≥ 10 ex.)")
+    question.addChildElement(info)
+    question.addChildElement(Q.QgsAttributeEditorField("Answer_0", 0, question))
+    tab.addChildElement(question)
+    tab.addChildElement(Q.QgsAttributeEditorField("showall_tab0", 2, tab))
+    root.addChildElement(tab)
+    config.setLabelOnTop(2, True)
+    layer.setEditFormConfig(config)
+
+    project.addMapLayer(layer)
+    return layer
+
+
+def FormSections(path):
+    # the form sections of the (first) layer of a project, normalized:
+    # attributes unordered, whitespace between elements dropped,
+    # and without the label styles QGIS adds (where they override nothing)
+    import xml.etree.ElementTree as ET
+    layer = ET.parse(path).getroot().find("projectlayers/maplayer")
+
+    def Normalized(element):
+        children = [Normalized(child) for child in element \
+                    if not ((child.tag == "labelStyle") \
+                            and (child.get("overrideLabelColor") == "0") \
+                            and (child.get("overrideLabelFont") == "0"))]
+        return (element.tag, sorted(element.attrib.items()), (element.text or "").strip(), children)
+
+    return {tag: [Normalized(element) for element in layer.findall(tag)] for tag in FORM_SECTIONS}
+
+
+def test_headless_form_sections(tmp_path, monkeypatch):
+    # the form sections of the headless model, against the fixture
+    # (in the format of QGIS 3.40; see its header)
+    HF = HeadlessModule("HeadlessForms", monkeypatch)
+    project = HF.QgsProject()
+    project.setCrs(HF.QgsCoordinateReferenceSystem.fromEpsgId(31370))
+    SampleForm(HF, project)
+    project.write(str(tmp_path / "headless.qgs"))
+
+    headless, fixture = FormSections(tmp_path / "headless.qgs"), FormSections(FORM_FIXTURE)
+    for tag in FORM_SECTIONS:
+        assert len(fixture[tag]) == 1, tag
+        assert headless[tag] == fixture[tag], tag
+
+
+def test_qgis_form_sections(tmp_path):
+    # the same, against QGIS itself (where it is installed)
+    import pytest
+    QC = pytest.importorskip("qgis.core")
+    import HeadlessForms as HF
+
+    application = QC.QgsApplication.instance()
+    if application is None:
+        application = QC.QgsApplication([], False)
+        application.initQgis()
+    written = {}
+    for name, Q in (("qgis", QC), ("headless", HF)):
+        project = Q.QgsProject()
+        project.setCrs(Q.QgsCoordinateReferenceSystem.fromEpsgId(31370))
+        SampleForm(Q, project)
+        project.write(str(tmp_path / f"{name}.qgs"))
+        written[name] = FormSections(tmp_path / f"{name}.qgs")
+
+    assert written["headless"] == written["qgis"]